@@ -6,18 +6,34 @@ import os
 from dotenv import load_dotenv
 import logging
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import Unicode, text
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
 import time
-from azure.storage.blob import BlobServiceClient, BlobSasPermissions, generate_blob_sas
 import mimetypes
-import pyodbc
 from functools import wraps
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 import sys
-from werkzeug.utils import secure_filename
+from werkzeug.utils import safe_join, secure_filename
 import uuid
-from models import db, Message, User
+import re
+from urllib.parse import quote
+from models import db, Message, User, MediaUpload, Room, FavoriteRoom, RoomMember, RoomMessage, conversation_filter, conversation_key
+from cache import TTLCache
+from user_directory import UserDirectory
+from socket_queue import move_sockets, socketio_queue_options
+from green import install_green_dbapi
+from media_store import hash_stream_to_file, hash_file, store_media, acquire_media
+from thumbnails import ThumbnailPipeline
+from blob_replication import BlobReplicator
+from inbox import record_message, mark_read, inbox_page, unread_total
+from search import SearchIndex
+from upload_sessions import MAX_PENDING_UPLOADS, open_upload_count, partial_upload_folder
+from group_commit import GroupCommitter
+from serializers import (RawJSON, SocketJSON, json_response, message_rows, message_row_dict,
+                         room_message_rows, room_message_row_dict)
+from logging_config import configure_logging
+from metrics import Metrics, instrument_app, instrument_socketio, timed_queue_pool
+from sqlite_tuning import install_sqlite_pragmas
+from config import ASYNC_WORKER, WORKER_CLASS, blob_container_client, database_config, upload_folder
 
 load_dotenv()
 
@@ -29,12 +45,11 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# Configure logging with more detail
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# LOG_MODE=production logs through a background queue; see logging_config.py
+configure_logging()
 logger = logging.getLogger(__name__)
+# Per-request logs, sampled with LOG_SAMPLE_RATE
+request_logger = logging.getLogger('app.requests')
 
 # Log Azure environment information
 if 'WEBSITE_SITE_NAME' in os.environ:
@@ -44,7 +59,28 @@ if 'WEBSITE_SITE_NAME' in os.environ:
     logger.info(f"Python Version: {os.getenv('PYTHON_VERSION')}")
 
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*", logger=True, engineio_logger=True)
+# Bound to the app by create_app()
+socketio = SocketIO()
+# Share emits between workers/nodes when a message queue is configured
+SOCKETIO_OPTIONS = dict(
+    cors_allowed_origins="*",
+    async_mode=WORKER_CLASS if ASYNC_WORKER else None,
+    # Levels come from logging_config (INFO in debug mode, WARNING in production)
+    logger=logging.getLogger('socketio.server'),
+    engineio_logger=logging.getLogger('engineio.server'),
+    # Payloads encoded once with RawJSON go out to every recipient as is
+    json=SocketJSON,
+    **socketio_queue_options(os.getenv('SOCKETIO_MESSAGE_QUEUE'))
+)
+
+# Prometheus-style metrics on /metrics. METRICS_DIR (set by gunicorn.conf.py)
+# is where workers share their values so any worker can report them all
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+# Who may scrape /metrics when METRICS_TOKEN is not set
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+metrics = Metrics(directory=os.getenv('METRICS_DIR') or None,
+                  flush_interval=float(os.getenv('METRICS_FLUSH_INTERVAL', 5)))
 
 # Custom Jinja filter for datetime formatting
 @app.template_filter('datetime')
@@ -55,109 +91,185 @@ def format_datetime(value):
         value = datetime.fromisoformat(value.replace('Z', '+00:00'))
     return value.strftime('%B %d, %Y at %I:%M %p')
 
-# Get connection string from environment variable
-connection_string = os.getenv('AZURE_SQL_CONNECTIONSTRING')
-if not connection_string:
-    logger.error("AZURE_SQL_CONNECTIONSTRING environment variable is not set!")
-    raise ValueError("Database connection string not found in environment variables")
-
-container_name = "chat-media"  # Name of the container for storing media files
-
-# Format connection string for SQLAlchemy
-try:
-    # Parse the ODBC connection string components
-    params = {}
-    for param in connection_string.split(';'):
-        if '=' in param:
-            key, value = param.split('=', 1)
-            params[key.strip()] = value.strip()
-    
-    # Construct SQLAlchemy URL
-    server = params.get('Server', '').replace('tcp:', '')
-    database = params.get('Database', '')
-    username = params.get('Uid', '')
-    password = params.get('Pwd', '')
-    
-    # Log masked connection info
-    masked_info = f"Server={server}, Database={database}, Username={username}, Password=***"
-    logger.debug(f"Database connection info (masked): {masked_info}")
-    
-    # Format the SQLAlchemy URL
-    connection_string = f"mssql+pyodbc://{username}:{password}@{server}/{database}?driver=ODBC+Driver+17+for+SQL+Server&TrustServerCertificate=yes&connection_timeout=60&command_timeout=60&pool_size=5&pool_timeout=60&pool_pre_ping=true"
-    
-    logger.info("Database connection string configured successfully")
-except Exception as e:
-    logger.error(f"Error configuring database connection string: {str(e)}")
-    raise
-
-app.config['SQLALCHEMY_DATABASE_URI'] = connection_string
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', secrets.token_hex(16))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JSON_AS_ASCII'] = False
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=31)  # Session lasts for 31 days
 app.config['SESSION_REFRESH_EACH_REQUEST'] = True  # Refresh session on each request
 app.config['SESSION_TYPE'] = 'filesystem'  # Use filesystem to store session data
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_size': 5,
-    'pool_timeout': 60,
-    'pool_recycle': 1800,
-    'max_overflow': 2,
-    'connect_args': {
-        'timeout': 60,
-        'connect_timeout': 60
-    }
-}
 app.config['SQLALCHEMY_POOL_PRE_PING'] = True  # Enable connection testing before use
 
 # File upload configuration
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+UPLOAD_FOLDER = upload_folder()
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'webm', 'mov'}
-MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max request size
+
+# Chunked uploads: each chunk is a request below MAX_CONTENT_LENGTH
+PARTIAL_UPLOAD_FOLDER = partial_upload_folder(UPLOAD_FOLDER)
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 512 * 1024 * 1024))
+STREAM_BUFFER_SIZE = 64 * 1024
+
+# Caching and offload for /uploads and /static. Content-addressed files
+# (<sha256>[_thumb].<ext>) never change and are cached as immutable.
+CONTENT_ADDRESSED_RE = re.compile(r'^[0-9a-f]{64}(_thumb)?\.[A-Za-z0-9]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+UPLOAD_MAX_AGE = int(os.getenv('UPLOAD_MAX_AGE', 24 * 60 * 60))
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 60 * 60))
+# '' (serve from Python), 'x-sendfile' (Apache/lighttpd) or 'x-accel-redirect' (nginx)
+MEDIA_OFFLOAD = os.getenv('MEDIA_OFFLOAD', '')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-uploads/')
+
+# Conversation history paging
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+SYNC_PAGE_SIZE = 500
+
+# Background replication of local media to the blob container
+BLOB_REPLICATION_WORKERS = int(os.getenv('BLOB_REPLICATION_WORKERS', 2))
+BLOB_REPLICATION_JOURNAL = os.getenv(
+    'BLOB_REPLICATION_JOURNAL', os.path.join(app.instance_path, 'blob_replication.journal')
+)
+BLOB_SAS_TTL = int(os.getenv('BLOB_SAS_TTL', 60 * 60))  # seconds
+
+# Inbox (conversation list) paging
+INBOX_PAGE_SIZE = 50
+MAX_INBOX_PAGE_SIZE = 200
+
+# Group room paging
+ROOM_PAGE_SIZE = 50
+MAX_ROOM_PAGE_SIZE = 200
+MAX_ROOM_NAME_LENGTH = 100
+
+# Message search paging
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# User directory paging
+USER_PAGE_SIZE = 50
+MAX_USER_PAGE_SIZE = 200
+USER_DIRECTORY_TTL = int(os.getenv('USER_DIRECTORY_TTL', 30))  # seconds
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
-
-# Ensure upload folder exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+app.config['USE_X_SENDFILE'] = MEDIA_OFFLOAD == 'x-sendfile'
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def upload_to_blob_storage(file_data, content_type):
-    if not BLOB_STORAGE_ENABLED:
-        return None
-        
-    try:
-        # Generate unique filename
-        file_extension = content_type.split('/')[-1]
-        blob_name = f"{uuid.uuid4()}.{file_extension}"
-        
-        # Upload to blob storage
-        blob_client = container_client.get_blob_client(blob_name)
-        blob_client.upload_blob(file_data, blob_type="BlockBlob", content_settings={"content_type": content_type})
-        
-        # Return the URL
-        return blob_client.url
-    except Exception as e:
-        print(f"Error uploading to blob storage: {str(e)}")
-        return None
+# Session user validation cache
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))  # seconds
+
+# Endpoints that only need a session cookie, not a database check
+USER_CHECK_EXEMPT_ENDPOINTS = {'serve_file', 'serve_static'}
+
+# Per-user favorites list; dropped on toggle, and entirely when any room changes
+FAVORITES_CACHE_TTL = int(os.getenv('FAVORITES_CACHE_TTL', 60))  # seconds
+
+user_exists_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+user_directory = UserDirectory(ttl=USER_DIRECTORY_TTL)
+favorite_rooms_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=FAVORITES_CACHE_TTL)
+# Responses to recent sends by (sender, client_id), so retries skip the database
+IDEMPOTENCY_CACHE_TTL = int(os.getenv('IDEMPOTENCY_CACHE_TTL', 10 * 60))  # seconds
+MAX_CLIENT_ID_LENGTH = 64
+recent_sends_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=IDEMPOTENCY_CACHE_TTL)
+
+@event.listens_for(User, 'after_delete')
+def invalidate_deleted_user(mapper, connection, target):
+    user_exists_cache.pop(target.id)
+    user_directory.remove(target.username)
+    favorite_rooms_cache.pop(target.id)
+
+@event.listens_for(Room, 'after_update')
+@event.listens_for(Room, 'after_delete')
+def invalidate_changed_room(mapper, connection, target):
+    favorite_rooms_cache.clear()
+
+def directory_entry(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'created_at': user.created_at.isoformat() if user.created_at else None
+    }
 
-# Initialize extensions
-db = SQLAlchemy(app)
+def refresh_user_directory():
+    """Bring the in-memory user directory up to date with the users table.
+
+    Normally only users with ids above the last seen one are read. If the
+    row count still disagrees afterwards (deletes, or ids committed out of
+    order by another worker) the directory is reloaded in full.
+    """
+    if not user_directory.is_stale():
+        return
+    columns = (User.id, User.username, User.created_at)
+    total = db.session.query(db.func.count(User.id)).scalar()
+    if total != len(user_directory):
+        new_users = db.session.query(*columns).filter(
+            User.id > user_directory.max_id
+        ).order_by(User.id.asc()).all()
+        for user in new_users:
+            user_directory.add(directory_entry(user))
+        if new_users:
+            user_directory.max_id = new_users[-1].id
+
+        if total != len(user_directory):
+            users = db.session.query(*columns).all()
+            user_directory.replace_all([directory_entry(user) for user in users])
+            user_directory.max_id = max((user.id for user in users), default=0)
+    user_directory.mark_loaded()
+
+# Background workers; they only start threads once given work
+blob_replicator = BlobReplicator(
+    app, BLOB_REPLICATION_JOURNAL, max_workers=BLOB_REPLICATION_WORKERS, sas_ttl=BLOB_SAS_TTL
+)
+thumbnail_pipeline = ThumbnailPipeline(
+    app,
+    max_workers=int(os.getenv('THUMBNAIL_WORKERS', 2)),
+    on_ready=blob_replicator.submit_files
+)
+
+search_index = SearchIndex()
+
+# Group commit: coalesce concurrent message inserts into one transaction
+GROUP_COMMIT = os.getenv('GROUP_COMMIT', '').lower() in ('1', 'true', 'yes')
+GROUP_COMMIT_WINDOW_MS = float(os.getenv('GROUP_COMMIT_WINDOW_MS', 5))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv('GROUP_COMMIT_MAX_BATCH', 100))
+
+group_committer = GroupCommitter(
+    db.session,
+    enabled=GROUP_COMMIT,
+    window=GROUP_COMMIT_WINDOW_MS / 1000,
+    max_batch=GROUP_COMMIT_MAX_BATCH
+)
+
+def replication_job(media_object):
+    """Arguments for blob_replicator.submit(), captured while `media_object` is loaded."""
+    if media_object is None or media_object.blob_status == 'replicated':
+        return None
+    return media_object.filename, media_object.content_type, media_object.content_hash
 
 @app.before_request
 def before_request():
+    # Resumes pending blob uploads in each freshly forked worker
+    blob_replicator.ensure_started()
+
     # Log the request details
-    logger.debug(f"Request: {request.method} {request.url}")
-    logger.debug(f"Session: {session}")
+    request_logger.debug("Request: %s %s (user %s)", request.method, request.path, session.get('username'))
     
     # Check if user is not logged in and trying to access protected routes
-    if request.endpoint and request.endpoint not in ['login', 'register', 'static']:
+    if request.endpoint and request.endpoint not in ['login', 'register', 'static', 'metrics_endpoint']:
         if 'user_id' not in session:
             logger.debug("Unauthorized access attempt, redirecting to login")
             session.clear()  # Clear any existing session data
             return redirect(url_for('login'))
         else:
+            if request.endpoint in USER_CHECK_EXEMPT_ENDPOINTS:
+                return None
+            if user_exists_cache.get(session['user_id']):
+                return None
+
             # Validate that the user still exists in the database
             try:
                 user = User.query.get(session['user_id'])
@@ -165,6 +277,7 @@ def before_request():
                     logger.debug("User not found in database, clearing session")
                     session.clear()
                     return redirect(url_for('login'))
+                user_exists_cache.set(user.id, True)
             except Exception as e:
                 logger.error(f"Error validating user session: {str(e)}")
                 session.clear()
@@ -177,8 +290,17 @@ def index():
         return redirect(url_for('login'))
     
     try:
-        users = User.query.all()
-        return render_template('index.html', users=users)
+        refresh_user_directory()
+        users, next_cursor = user_directory.page(limit=USER_PAGE_SIZE)
+        conversations, inbox_cursor = inbox_page(session['username'], limit=INBOX_PAGE_SIZE)
+        return render_template(
+            'index.html',
+            users=users,
+            users_count=len(user_directory),
+            users_cursor=next_cursor,
+            conversations=[summary.to_dict() for summary in conversations],
+            inbox_cursor=inbox_cursor
+        )
     except Exception as e:
         logger.error(f"Error in index route: {str(e)}")
         logger.exception("Full traceback:")
@@ -192,14 +314,14 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         
-        logger.debug(f"Login attempt for username: {username}")
+        logger.debug("Login attempt for username: %s", username)
         
         if not username or not password:
             flash('Please provide both username and password')
             return redirect(url_for('login'))
         
         user = User.query.filter_by(username=username).first()
-        logger.debug(f"Found user: {user is not None}")
+        logger.debug("Found user: %s", user is not None)
         
         if user:
             try:
@@ -246,6 +368,11 @@ def register():
         if not username or not password:
             flash('Please provide both username and password')
             return redirect(url_for('register'))
+
+        # Control characters (including the conversation key separator) are not allowed
+        if not username.isprintable():
+            flash('Username contains invalid characters')
+            return redirect(url_for('register'))
         
         if User.query.filter_by(username=username).first():
             flash('Username already exists')
@@ -257,6 +384,8 @@ def register():
         try:
             db.session.add(user)
             db.session.commit()
+            user_exists_cache.set(user.id, True)
+            user_directory.add(directory_entry(user))
             session['user_id'] = user.id
             session['username'] = user.username
             session.permanent = True
@@ -274,6 +403,169 @@ def logout():
     session.clear()
     return redirect(url_for('login'))
 
+def get_owned_upload(upload_id):
+    upload = MediaUpload.query.get(upload_id)
+    if not upload or upload.owner_username != session.get('username'):
+        return None
+    return upload
+
+def partial_upload_path(upload_id):
+    return os.path.join(PARTIAL_UPLOAD_FOLDER, upload_id)
+
+@app.route('/upload-sessions', methods=['POST'])
+@login_required
+def create_upload_session():
+    """Start a chunked upload; the file is then sent with PUT /upload-sessions/<id>."""
+    try:
+        filename = request.form.get('filename', '')
+        total_size = request.form.get('size', type=int)
+
+        if not allowed_file(filename):
+            return jsonify({'success': False, 'error': 'File type not allowed'}), 400
+        if not total_size or total_size <= 0:
+            return jsonify({'success': False, 'error': 'File size is required'}), 400
+        if total_size > MAX_UPLOAD_SIZE:
+            return jsonify({'success': False, 'error': 'File is too large'}), 413
+        # Each open upload holds a partial file until it is finished or expires
+        if open_upload_count(session['username']) >= MAX_PENDING_UPLOADS:
+            return jsonify({'success': False, 'error': 'Too many uploads in progress'}), 429
+
+        extension = filename.rsplit('.', 1)[1].lower()
+        upload = MediaUpload(
+            id=uuid.uuid4().hex,
+            owner_username=session['username'],
+            original_filename=secure_filename(filename) or f'upload.{extension}',
+            content_type=request.form.get('content_type') or mimetypes.guess_type(filename)[0],
+            total_size=total_size
+        )
+        open(partial_upload_path(upload.id), 'wb').close()
+        db.session.add(upload)
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'upload': upload.to_dict(received_size=0),
+            'chunk_size': UPLOAD_CHUNK_SIZE
+        })
+    except Exception as e:
+        logger.error(f"Error creating upload session: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to start upload'}), 500
+
+@app.route('/upload-sessions/<upload_id>', methods=['GET'])
+@login_required
+def get_upload_session(upload_id):
+    """Report how much of an upload has been received, for resuming."""
+    upload = get_owned_upload(upload_id)
+    if not upload:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+
+    received_size = None
+    if upload.status == 'pending':
+        path = partial_upload_path(upload_id)
+        received_size = os.path.getsize(path) if os.path.exists(path) else 0
+    return jsonify({
+        'success': True,
+        'upload': upload.to_dict(received_size=received_size),
+        'chunk_size': UPLOAD_CHUNK_SIZE
+    })
+
+@app.route('/upload-sessions/<upload_id>', methods=['PUT'])
+@login_required
+def append_upload_chunk(upload_id):
+    """Write the request body at `offset` of the upload.
+
+    The body is streamed to disk in small blocks, never held in memory.
+    Re-sending a chunk that was already received (a retry) simply rewrites
+    the same bytes; an offset past the received size is rejected with the
+    offset to resume from.
+    """
+    try:
+        upload = get_owned_upload(upload_id)
+        if not upload:
+            return jsonify({'success': False, 'error': 'Upload not found'}), 404
+        if upload.status != 'pending':
+            return jsonify({'success': False, 'error': 'Upload already finished'}), 409
+
+        path = partial_upload_path(upload_id)
+        received_size = os.path.getsize(path)
+        offset = request.args.get('offset', type=int)
+        if offset is None or offset < 0 or offset > received_size:
+            return jsonify({
+                'success': False,
+                'error': 'Unexpected offset',
+                'upload': upload.to_dict(received_size=received_size)
+            }), 409
+
+        remaining = upload.total_size - offset
+        with open(path, 'r+b') as partial:
+            partial.seek(offset)
+            while True:
+                block = request.stream.read(STREAM_BUFFER_SIZE)
+                if not block:
+                    break
+                if len(block) > remaining:
+                    partial.truncate(received_size)
+                    return jsonify({'success': False, 'error': 'Chunk exceeds declared file size'}), 413
+                partial.write(block)
+                remaining -= len(block)
+            received_size = max(received_size, partial.tell())
+
+        return jsonify({'success': True, 'upload': upload.to_dict(received_size=received_size)})
+    except Exception as e:
+        logger.error(f"Error appending upload chunk: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to store chunk'}), 500
+
+@app.route('/upload-sessions/<upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_upload_session(upload_id):
+    """Move a fully received upload into place so messages can reference it."""
+    try:
+        upload = get_owned_upload(upload_id)
+        if not upload:
+            return jsonify({'success': False, 'error': 'Upload not found'}), 404
+        if upload.status == 'complete':
+            return jsonify({'success': True, 'upload': upload.to_dict()})
+
+        path = partial_upload_path(upload_id)
+        received_size = os.path.getsize(path)
+        if received_size != upload.total_size:
+            return jsonify({
+                'success': False,
+                'error': 'Upload is incomplete',
+                'upload': upload.to_dict(received_size=received_size)
+            }), 409
+
+        # Chunks may arrive out of band and be re-sent, so hash the assembled file
+        extension = upload.original_filename.rsplit('.', 1)[1]
+        media_object = store_media(
+            path, hash_file(path), extension, upload.content_type, received_size,
+            app.config['UPLOAD_FOLDER']
+        )
+        thumbnail_pipeline.submit(media_object)
+
+        upload.status = 'complete'
+        upload.media_filename = media_object.filename
+        db.session.commit()
+        logger.info(f"Chunked upload finished: {media_object.filename}")
+
+        return jsonify({'success': True, 'upload': upload.to_dict()})
+    except Exception as e:
+        logger.error(f"Error finalizing upload: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to finalize upload'}), 500
+
+def find_sent_message(sender, client_id):
+    """Return the serialized message `sender` already sent with `client_id`, if any."""
+    message_data = recent_sends_cache.get((sender, client_id))
+    if message_data is None:
+        message = Message.query.filter_by(sender_username=sender, client_message_id=client_id).first()
+        if message is None:
+            return None
+        message_data = message.to_dict()
+        recent_sends_cache.set((sender, client_id), message_data)
+    return message_data
+
 @app.route('/send_message', methods=['POST'])
 @login_required
 def send_message():
@@ -285,69 +577,104 @@ def send_message():
         receiver = request.form.get('receiver')
         content = request.form.get('content', '')
         media = request.files.get('media')
+        upload_id = request.form.get('upload_id')
+        client_id = request.form.get('client_id') or None
         
         if not receiver:
             return jsonify({'success': False, 'error': 'Receiver is required'}), 400
+        if client_id and len(client_id) > MAX_CLIENT_ID_LENGTH:
+            return jsonify({'success': False, 'error': 'client_id is too long'}), 400
+
+        # A retry of a send that already went through gets the original
+        # message back, before any media is saved again
+        if client_id:
+            original = find_sent_message(sender, client_id)
+            if original:
+                return jsonify({'success': True, 'message': original, 'duplicate': True})
 
         has_media = False
         media_type = None
         media_url = None
         media_filename = None
 
+        # Media uploaded beforehand through /upload-sessions
+        if upload_id:
+            upload = get_owned_upload(upload_id)
+            if not upload or upload.status != 'complete':
+                return jsonify({'success': False, 'error': 'Upload not found or not finished'}), 400
+            has_media = True
+            media_type = upload.content_type
+            media_url = f'/uploads/{upload.media_filename}'
+            media_filename = upload.media_filename
+
         # Handle file upload if present
-        if media and allowed_file(media.filename):
+        elif media and allowed_file(media.filename):
             try:
-                # Generate unique filename
-                filename = secure_filename(media.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                unique_filename = f"{timestamp}_{filename}"
-                
-                # Save file locally
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                media.save(file_path)
+                # Stream to a temporary file while hashing, then store by content hash
+                temp_path = partial_upload_path(uuid.uuid4().hex)
+                content_hash, size = hash_stream_to_file(media.stream, temp_path)
+                extension = media.filename.rsplit('.', 1)[1]
+                media_object = store_media(
+                    temp_path, content_hash, extension, media.content_type, size,
+                    app.config['UPLOAD_FOLDER']
+                )
+                thumbnail_pipeline.submit(media_object)
                 
                 has_media = True
-                media_type = media.content_type
-                media_url = f'/uploads/{unique_filename}'
-                media_filename = unique_filename
+                media_type = media_object.content_type
+                media_url = f'/uploads/{media_object.filename}'
+                media_filename = media_object.filename
                 
-                logger.info(f"File uploaded successfully: {unique_filename}")
+                logger.info(f"File uploaded successfully: {media_filename}")
             except Exception as e:
                 logger.error(f"Error saving file: {str(e)}")
                 return jsonify({'success': False, 'error': 'Failed to save file'}), 500
 
-        # Create and save the message
-        try:
+        # Create and save the message; with GROUP_COMMIT this shares a
+        # transaction with concurrent sends, so only plain data comes back
+        def save_message():
             message = Message(
                 sender_username=sender,
                 receiver_username=receiver,
+                conversation_key=conversation_key(sender, receiver),
                 content=content,
                 has_media=has_media,
                 media_type=media_type,
                 media_url=media_url,
-                media_filename=media_filename
+                media_filename=media_filename,
+                client_message_id=client_id
             )
             db.session.add(message)
-            db.session.commit()
-            
-            # Prepare message data for socket emission
-            message_data = message.to_dict()
-            socketio.emit('new_message', message_data, room=sender)
-            socketio.emit('new_message', message_data, room=receiver)
+            if media_filename:
+                acquire_media(media_filename)
+            record_message(message)
+            search_index.index_message(message)
+            return message.to_dict(), replication_job(message.media_object)
+
+        try:
+            try:
+                message_data, replication = group_committer.run(save_message)
+            except IntegrityError:
+                # A concurrent retry with the same client_id won the insert
+                db.session.rollback()
+                original = find_sent_message(sender, client_id) if client_id else None
+                if not original:
+                    raise
+                return jsonify({'success': True, 'message': original, 'duplicate': True})
+            if client_id:
+                recent_sends_cache.set((sender, client_id), message_data)
+            # Copy the media to shared storage once the message is safely stored
+            if replication:
+                blob_replicator.submit(*replication)
             
-            return jsonify({
-                'success': True,
-                'message': message_data
-            })
+            # Encoded once for both participants and the response
+            payload = RawJSON.encode(message_data)
+            socketio.emit('new_message', payload, room=[sender, receiver])
+
+            return json_response({'success': True}, message=payload)
             
         except Exception as e:
             logger.error(f"Error saving message to database: {str(e)}")
-            if has_media and media_filename:
-                # Clean up uploaded file if message save fails
-                try:
-                    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], media_filename))
-                except:
-                    pass
             return jsonify({'success': False, 'error': 'Failed to save message'}), 500
             
     except Exception as e:
@@ -357,33 +684,209 @@ def send_message():
 @app.route('/messages/<username>')
 @login_required
 def get_messages(username):
+    """Return one page of the conversation with `username`.
+
+    Pages are keyed on message id: `before_id` walks back through older
+    history, `after_id` walks forward from a known message. Without either
+    the newest page is returned. Messages are always in ascending id order.
+    """
     try:
         current_user = session['username']
-        messages = Message.query.filter(
-            ((Message.sender_username == current_user) & (Message.receiver_username == username)) |
-            ((Message.sender_username == username) & (Message.receiver_username == current_user))
-        ).order_by(Message.created_at.asc()).all()
-        
-        return jsonify({'success': True, 'messages': [msg.to_dict() for msg in messages]})
+        before_id = request.args.get('before_id', type=int)
+        after_id = request.args.get('after_id', type=int)
+        limit = request.args.get('limit', MESSAGE_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+
+        # Plain column tuples: large pages skip building ORM instances
+        query = message_rows().filter(conversation_filter(current_user, username))
+        if after_id is not None:
+            query = query.filter(Message.id > after_id).order_by(Message.id.asc())
+        else:
+            if before_id is not None:
+                query = query.filter(Message.id < before_id)
+            query = query.order_by(Message.id.desc())
+
+        # Fetch one extra row to know whether another page exists
+        messages = query.limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if after_id is None:
+            messages.reverse()
+
+        next_cursor = None
+        if has_more and messages:
+            next_cursor = messages[-1].id if after_id is not None else messages[0].id
+
+        return json_response({
+            'success': True,
+            'messages': [message_row_dict(row) for row in messages],
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        })
     except Exception as e:
         logger.error(f"Error in get_messages: {str(e)}")
         return jsonify({'success': False, 'error': 'Failed to retrieve messages'}), 500
 
+@app.route('/sync')
+@login_required
+def sync_messages():
+    """Return messages in any of the current user's conversations newer than `since`.
+
+    Messages come back in ascending id order together with a high-water mark
+    the client passes as `since` on its next sync. Without `since` no messages
+    are returned, only the current mark to start syncing from.
+    """
+    try:
+        current_user = session['username']
+        since = request.args.get('since', type=int)
+        limit = request.args.get('limit', SYNC_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, SYNC_PAGE_SIZE))
+
+        participant = (Message.sender_username == current_user) | (Message.receiver_username == current_user)
+
+        if since is None:
+            high_water_mark = db.session.query(db.func.max(Message.id)).filter(participant).scalar() or 0
+            return jsonify({
+                'success': True,
+                'messages': [],
+                'has_more': False,
+                'high_water_mark': high_water_mark
+            })
+
+        messages = message_rows().filter(
+            participant,
+            Message.id > since
+        ).order_by(Message.id.asc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+
+        return json_response({
+            'success': True,
+            'messages': [message_row_dict(row) for row in messages],
+            'has_more': has_more,
+            'high_water_mark': messages[-1].id if messages else since
+        })
+    except Exception as e:
+        logger.error(f"Error in sync_messages: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to sync messages'}), 500
+
+@app.route('/inbox')
+@login_required
+def get_inbox():
+    """Return the current user's conversations, most recent first, with unread counts.
+
+    Pages are keyed on the last message id; pass `next_cursor` back as `before`.
+    """
+    try:
+        current_user = session['username']
+        before = request.args.get('before', type=int)
+        limit = request.args.get('limit', INBOX_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_INBOX_PAGE_SIZE))
+
+        conversations, next_cursor = inbox_page(current_user, before_id=before, limit=limit)
+        return jsonify({
+            'success': True,
+            'conversations': [summary.to_dict() for summary in conversations],
+            'unread_total': unread_total(current_user),
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        logger.error(f"Error in get_inbox: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to load inbox'}), 500
+
+@app.route('/inbox/<username>/read', methods=['POST'])
+@login_required
+def mark_conversation_read(username):
+    """Mark messages from `username` as read, up to `message_id` if given."""
+    try:
+        current_user = session['username']
+        data = request.get_json(silent=True) or {}
+        message_id = data.get('message_id', request.form.get('message_id'))
+        if message_id is not None:
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'error': 'Invalid message_id'}), 400
+
+        summary = mark_read(current_user, username, message_id)
+        if summary is None:
+            return jsonify({'success': False, 'error': 'Conversation not found'}), 404
+        db.session.commit()
+
+        conversation = summary.to_dict()
+        # Clear the badge in the user's other tabs and devices
+        socketio.emit('conversation_read', conversation, room=current_user)
+        return jsonify({'success': True, 'conversation': conversation})
+    except Exception as e:
+        logger.error(f"Error marking conversation read: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to mark conversation read'}), 500
+
+@app.route('/search')
+@login_required
+def search_messages():
+    """Full-text search over the current user's conversations, newest first.
+
+    `q` must match every word; `with` limits the search to one conversation.
+    Pages are keyed on message id; pass `next_cursor` back as `before`.
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'success': False, 'error': 'Search query is required'}), 400
+        partner = request.args.get('with')
+        before = request.args.get('before', type=int)
+        limit = request.args.get('limit', SEARCH_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_SEARCH_PAGE_SIZE))
+
+        messages, next_cursor = search_index.search(
+            session['username'], query, partner=partner, before_id=before, limit=limit
+        )
+        return jsonify({
+            'success': True,
+            'messages': [msg.to_dict() for msg in messages],
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        logger.error(f"Error in search_messages: {str(e)}")
+        return jsonify({'success': False, 'error': 'Search failed'}), 500
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text format metrics for every worker of this instance.
+
+    With METRICS_TOKEN set, scrapers send it as a bearer token; without
+    it only loopback clients are served, and everyone else gets a 404.
+    """
+    if not METRICS_ENABLED:
+        return "Metrics are disabled", 404
+    if METRICS_TOKEN:
+        if request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+            return "Unauthorized", 401
+    elif request.remote_addr not in LOOPBACK_ADDRESSES:
+        return "Not Found", 404
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/users')
 @login_required
 def get_users():
+    """Return one page of users whose name starts with `prefix`.
+
+    `cursor` is the `next_cursor` of the previous page; matching is
+    case-insensitive and results are ordered by username.
+    """
     try:
-        users = User.query.all()
-        user_list = []
-        for user in users:
-            user_list.append({
-                'id': user.id,
-                'username': user.username,
-                'created_at': user.created_at.isoformat() if user.created_at else None
-            })
+        prefix = request.args.get('prefix', '')
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit', USER_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_USER_PAGE_SIZE))
+
+        refresh_user_directory()
+        users, next_cursor = user_directory.page(prefix=prefix, cursor=cursor, limit=limit)
         return jsonify({
             'success': True,
-            'users': user_list
+            'users': users,
+            'next_cursor': next_cursor
         })
     except Exception as e:
         logger.error(f"Error getting users list: {str(e)}")
@@ -396,7 +899,7 @@ def get_users():
 @login_required
 def toggle_favorite_room():
     try:
-        logger.debug(f"Starting favorite room toggle for user {session.get('user_id')}")
+        logger.debug("Starting favorite room toggle for user %s", session.get('user_id'))
         room_id = request.form.get('room_id')
         
         if not room_id:
@@ -404,30 +907,31 @@ def toggle_favorite_room():
             return jsonify({'success': False, 'message': 'Room ID required'}), 400
 
         room_id = int(room_id)
-        logger.debug(f"Checking if room {room_id} exists")
+        logger.debug("Checking if room %s exists", room_id)
         room = Room.query.get(room_id)
         if not room:
             logger.warning(f"Toggle favorite failed: Room {room_id} not found")
             return jsonify({'success': False, 'message': 'Room not found'}), 404
 
-        logger.debug(f"Checking existing favorite for user {session['user_id']} and room {room_id}")
+        logger.debug("Checking existing favorite for user %s and room %s", session['user_id'], room_id)
         favorite = FavoriteRoom.query.filter_by(
             user_id=session['user_id'],
             room_id=room_id
         ).first()
 
         if favorite:
-            logger.debug(f"Removing favorite for room {room_id}")
+            logger.debug("Removing favorite for room %s", room_id)
             db.session.delete(favorite)
             is_favorite = False
         else:
-            logger.debug(f"Adding favorite for room {room_id}")
+            logger.debug("Adding favorite for room %s", room_id)
             favorite = FavoriteRoom(user_id=session['user_id'], room_id=room_id)
             db.session.add(favorite)
             is_favorite = True
 
         logger.debug("Committing changes to database")
         db.session.commit()
+        favorite_rooms_cache.pop(session['user_id'])
         logger.info(f"Successfully {'added' if is_favorite else 'removed'} room {room_id} {'to' if is_favorite else 'from'} favorites for user {session['user_id']}")
         
         return jsonify({
@@ -456,26 +960,32 @@ def toggle_favorite_room():
 @login_required
 def get_favorite_rooms():
     try:
-        logger.debug(f"Fetching favorite rooms for user {session.get('user_id')}")
-        favorites = FavoriteRoom.query.filter_by(user_id=session['user_id']).all()
-        favorite_rooms = []
-        
-        logger.debug(f"Found {len(favorites)} favorite rooms")
-        for fav in favorites:
-            logger.debug(f"Processing favorite room {fav.room_id}")
-            room = Room.query.get(fav.room_id)
-            if room:
-                favorite_rooms.append({
-                    'room_id': room.id,
-                    'room_name': room.name,
-                    'room': {
-                        'is_private': room.is_private
-                    }
-                })
-            else:
-                logger.warning(f"Found orphaned favorite for non-existent room {fav.room_id}")
-                
-        logger.info(f"Successfully retrieved {len(favorite_rooms)} favorite rooms for user {session['user_id']}")
+        user_id = session['user_id']
+        favorite_rooms = favorite_rooms_cache.get(user_id)
+        if favorite_rooms is not None:
+            return jsonify({'success': True, 'favorites': favorite_rooms})
+
+        logger.debug("Fetching favorite rooms for user %s", user_id)
+        # One joined query; favorites of deleted rooms simply drop out
+        rooms = db.session.query(Room.id, Room.name, Room.is_private).join(
+            FavoriteRoom, FavoriteRoom.room_id == Room.id
+        ).filter(
+            FavoriteRoom.user_id == user_id
+        ).order_by(FavoriteRoom.created_at.asc(), Room.id.asc()).all()
+
+        favorite_rooms = [
+            {
+                'room_id': room.id,
+                'room_name': room.name,
+                'room': {
+                    'is_private': room.is_private
+                }
+            }
+            for room in rooms
+        ]
+        favorite_rooms_cache.set(user_id, favorite_rooms)
+
+        logger.debug("Retrieved %d favorite rooms for user %s", len(favorite_rooms), user_id)
         return jsonify({
             'success': True,
             'favorites': favorite_rooms
@@ -488,6 +998,233 @@ def get_favorite_rooms():
             'message': 'Error retrieving favorites'
         }), 500
 
+def room_channel(room_id):
+    """Socket.IO room that every connected member of group room `room_id` is in."""
+    return f"room:{room_id}"
+
+def is_room_member(room_id, username):
+    # A primary key lookup, deliberately uncached: a per-process cache would
+    # keep letting a member who left read and post through other workers
+    return RoomMember.query.filter_by(room_id=room_id, username=username).first() is not None
+
+def add_room_member(room, username, role='member'):
+    """Add `username` to `room`; returns False if they already were a member."""
+    try:
+        with db.session.begin_nested():
+            db.session.add(RoomMember(room_id=room.id, username=username, role=role))
+    except IntegrityError:
+        return False
+    Room.query.filter_by(id=room.id).update(
+        {Room.member_count: Room.member_count + 1}, synchronize_session=False
+    )
+    return True
+
+@app.route('/rooms', methods=['POST'])
+@login_required
+def create_room():
+    """Create a group room with the current user as its owner."""
+    try:
+        name = (request.form.get('name') or '').strip()
+        is_private = request.form.get('is_private', '').lower() in ('1', 'true', 'on')
+        password = request.form.get('password')
+        if not name or len(name) > MAX_ROOM_NAME_LENGTH:
+            return jsonify({'success': False, 'error': f'Room name must be 1-{MAX_ROOM_NAME_LENGTH} characters'}), 400
+        if Room.query.filter_by(name=name).first():
+            return jsonify({'success': False, 'error': 'Room name already taken'}), 409
+
+        room = Room(name=name, is_private=is_private, created_by=session['username'])
+        if is_private and password:
+            room.set_password(password)
+        db.session.add(room)
+        db.session.flush()
+        add_room_member(room, session['username'], role='owner')
+        db.session.commit()
+        db.session.refresh(room)
+        logger.info(f"Room {room.id} ({name}) created by {session['username']}")
+
+        return jsonify({'success': True, 'room': room.to_dict()}), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Room name already taken'}), 409
+    except Exception as e:
+        logger.error(f"Error creating room: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to create room'}), 500
+
+@app.route('/rooms')
+@login_required
+def get_my_rooms():
+    """Return the rooms the current user is a member of, by name."""
+    try:
+        rooms = Room.query.join(RoomMember, RoomMember.room_id == Room.id).filter(
+            RoomMember.username == session['username']
+        ).order_by(Room.name.asc()).all()
+        return jsonify({'success': True, 'rooms': [room.to_dict() for room in rooms]})
+    except Exception as e:
+        logger.error(f"Error listing rooms: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to load rooms'}), 500
+
+@app.route('/rooms/public')
+@login_required
+def get_public_rooms():
+    """Page through public rooms in id order; pass `next_cursor` back as `cursor`."""
+    try:
+        cursor = request.args.get('cursor', type=int)
+        limit = request.args.get('limit', ROOM_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_ROOM_PAGE_SIZE))
+
+        query = Room.query.filter(Room.is_private.is_(False))
+        if cursor is not None:
+            query = query.filter(Room.id > cursor)
+        rooms = query.order_by(Room.id.asc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(rooms) > limit:
+            rooms = rooms[:limit]
+            next_cursor = rooms[-1].id
+
+        return jsonify({
+            'success': True,
+            'rooms': [room.to_dict() for room in rooms],
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        logger.error(f"Error listing public rooms: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to load rooms'}), 500
+
+@app.route('/rooms/<int:room_id>/join', methods=['POST'])
+@login_required
+def join_group_room(room_id):
+    try:
+        room = Room.query.get(room_id)
+        if not room:
+            return jsonify({'success': False, 'error': 'Room not found'}), 404
+        # Private rooms without a password cannot be joined from outside
+        if room.is_private and not room.check_password(request.form.get('password') or ''):
+            return jsonify({'success': False, 'error': 'Incorrect room password'}), 403
+
+        username = session['username']
+        joined = add_room_member(room, username)
+        db.session.commit()
+        db.session.refresh(room)
+        # Subscribe every open socket of this user, on whichever worker holds it
+        move_sockets(socketio.server, 'enter', username, room_channel(room_id))
+        socketio.emit('room_joined', {'room': room.to_dict()}, room=username)
+        return jsonify({'success': True, 'joined': joined, 'room': room.to_dict()})
+    except Exception as e:
+        logger.error(f"Error joining room {room_id}: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to join room'}), 500
+
+@app.route('/rooms/<int:room_id>/leave', methods=['POST'])
+@login_required
+def leave_group_room(room_id):
+    try:
+        username = session['username']
+        removed = RoomMember.query.filter_by(room_id=room_id, username=username).delete(synchronize_session=False)
+        if not removed:
+            return jsonify({'success': False, 'error': 'Not a member of this room'}), 404
+        Room.query.filter_by(id=room_id).update(
+            {Room.member_count: Room.member_count - 1}, synchronize_session=False
+        )
+        db.session.commit()
+        # Unsubscribe every open socket of this user, on whichever worker holds it
+        move_sockets(socketio.server, 'leave', username, room_channel(room_id))
+        socketio.emit('room_left', {'room_id': room_id}, room=username)
+        return jsonify({'success': True})
+    except Exception as e:
+        logger.error(f"Error leaving room {room_id}: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to leave room'}), 500
+
+@app.route('/rooms/<int:room_id>/messages', methods=['POST'])
+@login_required
+def send_to_room(room_id):
+    """Store one message for the room and fan it out with a single room emit."""
+    try:
+        sender = session['username']
+        if not is_room_member(room_id, sender):
+            return jsonify({'success': False, 'error': 'Not a member of this room'}), 403
+
+        content = request.form.get('content', '')
+        upload_id = request.form.get('upload_id')
+        media = {}
+        if upload_id:
+            upload = get_owned_upload(upload_id)
+            if not upload or upload.status != 'complete':
+                return jsonify({'success': False, 'error': 'Upload not found or not finished'}), 400
+            media = {
+                'has_media': True,
+                'media_type': upload.content_type,
+                'media_url': f'/uploads/{upload.media_filename}',
+                'media_filename': upload.media_filename
+            }
+        elif not content.strip():
+            return jsonify({'success': False, 'error': 'Message is empty'}), 400
+
+        def save_room_message():
+            message = RoomMessage(room_id=room_id, sender_username=sender, content=content, **media)
+            db.session.add(message)
+            if message.media_filename:
+                acquire_media(message.media_filename)
+            db.session.flush()
+            return message.to_dict(), replication_job(message.media_object)
+
+        message_data, replication = group_committer.run(save_room_message)
+        if replication:
+            blob_replicator.submit(*replication)
+
+        payload = RawJSON.encode(message_data)
+        socketio.emit('room_message', payload, room=room_channel(room_id))
+        return json_response({'success': True}, message=payload)
+    except Exception as e:
+        logger.error(f"Error sending to room {room_id}: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Failed to send message'}), 500
+
+@app.route('/rooms/<int:room_id>/messages')
+@login_required
+def get_room_messages(room_id):
+    """Return one page of room history; same paging as /messages/<username>."""
+    try:
+        room = Room.query.get(room_id)
+        if not room:
+            return jsonify({'success': False, 'error': 'Room not found'}), 404
+        if room.is_private and not is_room_member(room_id, session['username']):
+            return jsonify({'success': False, 'error': 'Not a member of this room'}), 403
+
+        before_id = request.args.get('before_id', type=int)
+        after_id = request.args.get('after_id', type=int)
+        limit = request.args.get('limit', MESSAGE_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+
+        query = room_message_rows().filter(RoomMessage.room_id == room_id)
+        if after_id is not None:
+            query = query.filter(RoomMessage.id > after_id).order_by(RoomMessage.id.asc())
+        else:
+            if before_id is not None:
+                query = query.filter(RoomMessage.id < before_id)
+            query = query.order_by(RoomMessage.id.desc())
+
+        messages = query.limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if after_id is None:
+            messages.reverse()
+
+        next_cursor = None
+        if has_more and messages:
+            next_cursor = messages[-1].id if after_id is not None else messages[0].id
+
+        return json_response({
+            'success': True,
+            'messages': [room_message_row_dict(row) for row in messages],
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        logger.error(f"Error in get_room_messages: {str(e)}")
+        return jsonify({'success': False, 'error': 'Failed to retrieve messages'}), 500
+
 @socketio.on('connect')
 def handle_connect():
     try:
@@ -497,12 +1234,17 @@ def handle_connect():
             logger.warning("No username in session during connect")
             return False
             
-        logger.debug(f"User {username} connected")
+        logger.debug("User %s connected", username)
         join_room(username)  # Join a room named after the username
+        # Subscribe to every group room the user belongs to
+        memberships = db.session.query(RoomMember.room_id).filter(RoomMember.username == username).all()
+        for membership in memberships:
+            join_room(room_channel(membership.room_id))
         emit('connection_established', {
             'username': username,
             'status': 'connected'
         })
+        metrics.add_gauge('socketio_connected_clients', 1)
         return True
         
     except Exception as e:
@@ -514,24 +1256,93 @@ def handle_connect():
 def handle_disconnect():
     try:
         logger.debug("=== Starting handle_disconnect ===")
+        metrics.add_gauge('socketio_connected_clients', -1)
         username = session.get('username')
         if username:
-            logger.debug(f"User {username} disconnected")
+            logger.debug("User %s disconnected", username)
             leave_room(username)
             emit('user_disconnected', {'username': username}, broadcast=True)
     except Exception as e:
         logger.error(f"Error in handle_disconnect: {str(e)}")
         logger.exception("Full traceback:")
 
+@socketio.on('enter_room')
+def handle_enter_room(data):
+    """Subscribe this socket to a group room the user has just joined."""
+    username = session.get('username')
+    room_id = (data or {}).get('room_id')
+    if not username or not isinstance(room_id, int) or not is_room_member(room_id, username):
+        return {'success': False}
+    join_room(room_channel(room_id))
+    return {'success': True}
+
+@socketio.on('exit_room')
+def handle_exit_room(data):
+    room_id = (data or {}).get('room_id')
+    if isinstance(room_id, int):
+        leave_room(room_channel(room_id))
+    return {'success': True}
+
+def accel_redirect_response(filename, etag, max_age):
+    """Hand the file to nginx via X-Accel-Redirect; Python only answers 304s."""
+    path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+    if path is None or not os.path.isfile(path):
+        return "File not found", 404
+
+    response = app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    response.headers['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX + quote(filename)
+    if etag:
+        response.set_etag(etag)
+    else:
+        stat = os.stat(path)
+        response.set_etag(f"{stat.st_mtime}-{stat.st_size}")
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
 @app.route('/uploads/<path:filename>')
 def serve_file(filename):
-    """Serve uploaded files."""
+    """Serve uploaded files.
+
+    Responses carry an ETag and honour If-None-Match and Range (video
+    seeking). Content-addressed files use their name as a strong ETag and
+    are cached as immutable for a year; with MEDIA_OFFLOAD set the bytes
+    are sent by the front-end server instead of the worker.
+
+    A file this instance does not have locally (stored by another
+    instance) redirects to a fresh SAS URL for its blob, so message
+    payloads and client caches only ever hold this stable URL. Local
+    copies are always served here, so revalidations stay cheap 304s.
+    """
     try:
-        return send_from_directory(
-            app.config['UPLOAD_FOLDER'],
-            filename,
-            as_attachment=False
-        )
+        content_addressed = CONTENT_ADDRESSED_RE.match(filename) is not None
+        etag = filename if content_addressed else None
+        max_age = IMMUTABLE_MAX_AGE if content_addressed else UPLOAD_MAX_AGE
+
+        path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+        if blob_replicator.enabled and path is not None and not os.path.isfile(path):
+            response = redirect(blob_replicator.sas_url(filename))
+            # The SAS URL expires, so the redirect itself must not be reused
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        if MEDIA_OFFLOAD == 'x-accel-redirect':
+            response = accel_redirect_response(filename, etag, max_age)
+        else:
+            response = send_from_directory(
+                app.config['UPLOAD_FOLDER'],
+                filename,
+                as_attachment=False,
+                etag=etag or True,
+                max_age=max_age
+            )
+
+        # Media is only visible to logged-in users, so keep it out of shared caches
+        if isinstance(response, app.response_class) and response.status_code in (200, 206, 304):
+            cache_control = f"private, max-age={max_age}"
+            if content_addressed:
+                cache_control += ", immutable"
+            response.headers['Cache-Control'] = cache_control
+        return response
     except Exception as e:
         logger.error(f"Error serving file {filename}: {str(e)}")
         return "File not found", 404
@@ -539,93 +1350,61 @@ def serve_file(filename):
 # Initialize blob storage
 def initialize_blob_storage():
     try:
-        global BLOB_STORAGE_ENABLED, container_client
-        BLOB_STORAGE_ENABLED = False
-        container_client = None
-        
-        # Check if Azure storage connection string is available
-        storage_connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
-        if storage_connection_string:
-            # Initialize blob service client
-            blob_service_client = BlobServiceClient.from_connection_string(storage_connection_string)
-            container_client = blob_service_client.get_container_client(container_name)
-            BLOB_STORAGE_ENABLED = True
+        # Only configured storage pulls in the Azure SDK
+        container_client = blob_container_client()
+        if container_client is not None:
             logger.info("Azure Blob Storage initialized successfully")
-            return True
+            blob_replicator.start(container_client)
         else:
             logger.warning("Azure Blob Storage connection string not found. Using local storage only.")
-            return True
     except Exception as e:
         logger.error(f"Error initializing blob storage: {str(e)}")
-        return True  # Return True to allow the app to run with local storage only
+    # Always True so the app can run with local storage only
+    return True
 
-def initialize_database():
-    try:
-        logger.info("Initializing database...")
-        with app.app_context():
-            # Get database engine
-            engine = db.engine
-            
-            # Create tables if they don't exist
-            with engine.begin() as connection:
-                # Check if tables exist
-                tables_exist = connection.execute(text("""
-                    SELECT COUNT(*) 
-                    FROM INFORMATION_SCHEMA.TABLES 
-                    WHERE TABLE_NAME IN ('users', 'messages')
-                """)).scalar()
-                
-                if not tables_exist:
-                    logger.info("Creating database tables...")
-                    # Create tables with explicit schema
-                    connection.execute(text("""
-                        IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'users') AND type in (N'U'))
-                        CREATE TABLE users (
-                            id INTEGER IDENTITY(1,1) PRIMARY KEY,
-                            username NVARCHAR(80) UNIQUE NOT NULL,
-                            password_hash NVARCHAR(256) NOT NULL,
-                            created_at DATETIME DEFAULT GETDATE()
-                        );
-                        
-                        IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'messages') AND type in (N'U'))
-                        CREATE TABLE messages (
-                            id INTEGER IDENTITY(1,1) PRIMARY KEY,
-                            sender_username NVARCHAR(80) NOT NULL,
-                            receiver_username NVARCHAR(80) NOT NULL,
-                            content NTEXT,
-                            created_at DATETIME DEFAULT GETDATE(),
-                            has_media BIT DEFAULT 0,
-                            media_type NVARCHAR(50),
-                            media_url NVARCHAR(500),
-                            media_filename NVARCHAR(255),
-                            FOREIGN KEY (sender_username) REFERENCES users(username),
-                            FOREIGN KEY (receiver_username) REFERENCES users(username)
-                        );
-                    """))
-                    
-                    # Create admin user if it doesn't exist
-                    admin_exists = connection.execute(text("SELECT COUNT(*) FROM users WHERE username = 'admin'")).scalar()
-                    if not admin_exists:
-                        connection.execute(
-                            text("INSERT INTO users (username, password_hash, created_at) VALUES (:username, :password_hash, GETDATE())"),
-                            {"username": "admin", "password_hash": generate_password_hash('admin')}
-                        )
-                        logger.info("Admin user created successfully")
-                    
-                    logger.info("Database tables created successfully")
-                else:
-                    logger.info("Database tables already exist")
-            
-    except Exception as e:
-        logger.error(f"Error initializing database: {str(e)}")
-        raise
+def create_app(config=None):
+    """Bind the database, Socket.IO, metrics and blob storage to the app and return it.
+
+    Importing this module only declares routes and settings; nothing
+    connects or starts until this runs, so tools that import it stay
+    cheap (maintenance tasks use commands.py instead). `config` overrides
+    settings, e.g. SQLALCHEMY_DATABASE_URI in tests. Routes live on the
+    module-level app, so there is one app per process and later calls
+    return it unchanged. Serve with ``gunicorn 'app:create_app()'``.
+    """
+    if 'sqlalchemy' in app.extensions:
+        return app
+
+    settings = dict(config or {})
+    if 'SQLALCHEMY_DATABASE_URI' not in settings:
+        poolclass = timed_queue_pool(metrics) if METRICS_ENABLED else None
+        settings = {**database_config(poolclass=poolclass), **settings}
+    app.config.update(settings)
+
+    if ASYNC_WORKER:
+        install_green_dbapi(WORKER_CLASS)
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        install_sqlite_pragmas()
+
+    # Ensure upload folders exist
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(PARTIAL_UPLOAD_FOLDER, exist_ok=True)
+
+    db.init_app(app)
+    socketio.init_app(app, **SOCKETIO_OPTIONS)
+    if METRICS_ENABLED:
+        instrument_app(app, metrics)
+        instrument_socketio(socketio, metrics)
+    initialize_blob_storage()
+    return app
 
 # Add this route near the top of your routes
 @app.route('/static/<path:filename>')
 def serve_static(filename):
-    return send_from_directory('static', filename)
+    return send_from_directory('static', filename, max_age=STATIC_MAX_AGE)
 
 if __name__ == '__main__':
+    create_app()
     port = int(os.environ.get('PORT', 8181))
     app.logger.info(f"Starting application on port {port}")
     socketio.run(app, host='0.0.0.0', port=port, debug=False) 
\ No newline at end of file
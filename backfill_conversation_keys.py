@@ -0,0 +1,77 @@
+from models import db, Message, conversation_key
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+def ensure_conversation_key_schema():
+    """Add the conversation_key column and its index if they are missing."""
+    engine = db.engine
+    columns = [column['name'] for column in inspect(engine).get_columns('messages')]
+    if 'conversation_key' not in columns:
+        logger.info("Adding conversation_key column to messages")
+        # Typed from the model, so SQL Server gets NVARCHAR like a fresh create_all
+        column_ddl = CreateColumn(Message.__table__.c.conversation_key).compile(dialect=engine.dialect)
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE messages ADD {column_ddl}"))
+
+    for index in Message.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+def backfill_conversation_keys(batch_size=BATCH_SIZE, session=None, only_missing=True):
+    """Fill in conversation_key for existing messages, one id-ordered batch at a time.
+
+    Uses `session` when given (migrations bind one to their connection and
+    have already added the column); otherwise db.session, after adding the
+    column and index if missing. With `only_missing=False` every message is
+    checked and keys in an older format are rewritten.
+    """
+    if session is None:
+        session = db.session
+        ensure_conversation_key_schema()
+
+    updated_count = 0
+    last_id = 0
+    while True:
+        query = session.query(
+            Message.id, Message.sender_username, Message.receiver_username, Message.conversation_key
+        ).filter(Message.id > last_id)
+        if only_missing:
+            query = query.filter(Message.conversation_key.is_(None))
+        rows = query.order_by(Message.id.asc()).limit(batch_size).all()
+
+        if not rows:
+            break
+
+        updates = [
+            {'id': row.id, 'conversation_key': key}
+            for row, key in ((row, conversation_key(row.sender_username, row.receiver_username)) for row in rows)
+            if key != row.conversation_key
+        ]
+        try:
+            session.bulk_update_mappings(Message, updates)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+        last_id = rows[-1].id
+        updated_count += len(updates)
+        logger.info(f"Backfilled {updated_count} messages (up to id {last_id})")
+
+    return updated_count
+
+if __name__ == "__main__":
+    from commands import create_cli_app
+
+    print("Starting conversation key backfill...")
+    with create_cli_app().app_context():
+        try:
+            updated = backfill_conversation_keys()
+            print(f"Successfully backfilled {updated} messages")
+        except Exception as e:
+            print(f"Error during backfill: {str(e)}")
@@ -0,0 +1,50 @@
+import base64
+import os
+from types import SimpleNamespace
+
+class LocalBlobClient:
+    def __init__(self, container, name):
+        self.container = container
+        self.name = name
+        self.path = os.path.join(container.root, name)
+        self.url = f"{container.url}/{name}"
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def upload_blob(self, data, blob_type=None, overwrite=False, content_settings=None):
+        if not overwrite and self.exists():
+            raise FileExistsError(self.name)
+        if hasattr(data, 'read'):
+            data = data.read()
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, self.path)
+        self.container.uploads += 1
+
+class LocalContainerClient:
+    """Filesystem stand-in for the parts of azure ContainerClient the app uses.
+
+    Blobs are files under `root`; SAS URLs are generated with a dummy key,
+    so everything up to the network call behaves as in production.
+    """
+
+    account_name = 'localbench'
+    container_name = 'chat-media'
+    credential = SimpleNamespace(account_key=base64.b64encode(b'local-benchmark-key').decode())
+
+    def __init__(self, root):
+        self.root = root
+        self.url = f"file://{os.path.abspath(root)}"
+        self.uploads = 0
+        os.makedirs(root, exist_ok=True)
+
+    def get_blob_client(self, name):
+        return LocalBlobClient(self, name)
+
+    def list_blobs(self):
+        return [
+            SimpleNamespace(name=name) for name in sorted(os.listdir(self.root))
+            if not name.endswith('.tmp')
+        ]
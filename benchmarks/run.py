@@ -0,0 +1,109 @@
+"""Benchmark the chat app against SQLite and a local blob stand-in.
+
+    python -m benchmarks.run --save benchmarks/baselines/local.json
+    python -m benchmarks.run --compare benchmarks/baselines/local.json
+
+Exits with status 1 when --compare finds a regression.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+def configure_environment(workdir, database_url=None):
+    """Point the app at throwaway storage; must run before `app` is imported."""
+    os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    os.environ['BLOB_REPLICATION_JOURNAL'] = os.path.join(workdir, 'blob_replication.journal')
+    os.environ.pop('AZURE_STORAGE_CONNECTION_STRING', None)
+
+def print_results(results):
+    columns = ('requests', 'errors', 'throughput_rps', 'p50_ms', 'p99_ms', 'queries_per_request')
+    print(f"{'scenario':<12}" + ''.join(f"{column:>21}" for column in columns))
+    for scenario, result in results.items():
+        print(f"{scenario:<12}" + ''.join(f"{result[column]:>21}" for column in columns))
+        if 'deliveries' in result:
+            print(f"{'':<12}{result['deliveries']} socket deliveries to {result['sockets']} clients, "
+                  f"{result['deliveries_per_second']}/s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the chat app benchmark suite against a local database.")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--history', type=int, default=5000, help="Messages in the deepest conversation")
+    parser.add_argument('--requests', type=int, default=400, help="Requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--sockets', type=int, default=20, help="Connected Socket.IO clients in the fanout scenario")
+    parser.add_argument('--scenarios', default=None, help="Comma-separated subset of scenarios to run")
+    parser.add_argument('--database-url', default=None, help="Defaults to a fresh SQLite file")
+    parser.add_argument('--save', help="Write results as JSON to this path")
+    parser.add_argument('--compare', help="Baseline JSON to check the results against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed latency/throughput change")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='chat-bench-')
+    configure_environment(workdir, args.database_url)
+
+    from app import create_app, blob_replicator, thumbnail_pipeline
+    from benchmarks.local_blob import LocalContainerClient
+    from migrations import upgrade
+    from benchmarks.workloads import SCENARIOS, compare, run_suite, seed
+
+    # Request and packet logging would dominate the measurements
+    logging.disable(logging.INFO)
+    scenarios = args.scenarios.split(',') if args.scenarios else list(SCENARIOS)
+
+    app = create_app()
+    container_client = LocalContainerClient(os.path.join(workdir, 'blobs'))
+    blob_replicator.start(container_client)
+    try:
+        with app.app_context():
+            upgrade()
+            users = seed(args.users, args.history)
+            results = run_suite(users, scenarios, args.concurrency, args.requests, args.sockets)
+        thumbnail_pipeline._executor.shutdown(wait=True)
+        blob_replicator.shutdown(wait=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+
+    report = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+            'users': args.users,
+            'history': args.history,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'sockets': args.sockets,
+            'blob_uploads': container_client.uploads
+        },
+        'results': results
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline['results'], results, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
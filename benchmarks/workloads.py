@@ -0,0 +1,282 @@
+import io
+import itertools
+import math
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import app, db, socketio, search_index
+from inbox import rebuild_summaries
+from models import Message, User, conversation_key
+
+SCENARIOS = ('history', 'sync', 'inbox', 'send', 'fanout', 'send_media')
+
+class QueryCounter:
+    """Count SQL statements issued while a thread is inside `measuring()`.
+
+    Statements from background threads (thumbnails, replication) are not
+    attributed to requests.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._local = threading.local()
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._local, 'count', None) is not None:
+            self._local.count += 1
+
+    def install(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+
+    def remove(self):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+    @contextmanager
+    def measuring(self):
+        self._local.count = 0
+        try:
+            yield self._local
+        finally:
+            self._local.count = None
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values` (which need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+def summarize(samples, wall_time):
+    latencies = [latency for latency, _, _ in samples]
+    queries = [count for _, count, _ in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'throughput_rps': round(len(samples) / wall_time, 1) if wall_time else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else 0.0
+    }
+
+def seed(users, history, password='benchpass'):
+    """Create `users` users, `history` messages between the first two and a few per other pair.
+
+    Returns {username: user id}. Inbox summaries and the search index are rebuilt
+    afterwards, as they would be on a migrated production database.
+    """
+    password_hash = generate_password_hash(password)
+    usernames = [f'user{i:04d}' for i in range(users)]
+    db.session.bulk_insert_mappings(User, [
+        {'username': username, 'password_hash': password_hash} for username in usernames
+    ])
+
+    def exchange(a, b, count):
+        key = conversation_key(a, b)
+        return [
+            {
+                'sender_username': a if i % 2 == 0 else b,
+                'receiver_username': b if i % 2 == 0 else a,
+                'conversation_key': key,
+                'content': f'seed message {i} between {a} and {b}'
+            }
+            for i in range(count)
+        ]
+
+    rows = exchange(usernames[0], usernames[1], history)
+    for a, b in zip(usernames[1:], usernames[2:]):
+        rows.extend(exchange(a, b, min(history, 20)))
+    for start in range(0, len(rows), 1000):
+        db.session.bulk_insert_mappings(Message, rows[start:start + 1000])
+    db.session.commit()
+
+    rebuild_summaries()
+    search_index.rebuild()
+    return dict(db.session.query(User.username, User.id).filter(User.username.in_(usernames)).all())
+
+def client_for(users, username):
+    """A test client logged in as `username`; `users` maps usernames to ids."""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = users[username]
+        sess['username'] = username
+    return client
+
+def _is_success(response):
+    if response.status_code >= 400:
+        return False
+    if response.is_json:
+        return response.get_json().get('success', True)
+    return True
+
+def run_workers(counter, concurrency, requests, make_worker):
+    """Run `requests` calls spread over `concurrency` threads; returns (samples, wall_time).
+
+    `make_worker(index)` is called on the worker thread and returns the
+    function that issues one request and returns its response.
+    """
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0)
+                  for i in range(concurrency)]
+
+    def work(index):
+        issue = make_worker(index)
+        samples = []
+        for _ in range(per_worker[index]):
+            with counter.measuring() as measured:
+                start = time.perf_counter()
+                response = issue()
+                elapsed = time.perf_counter() - start
+                queries = measured.count
+            samples.append((elapsed, queries, _is_success(response)))
+        return samples
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        # In the caller's thread, which matters for in-memory SQLite
+        results = [work(0)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(work, range(concurrency)))
+    wall_time = time.perf_counter() - start
+    return list(itertools.chain.from_iterable(results)), wall_time
+
+def history_worker(users):
+    """Walk the deep conversation back page by page, restarting at the newest."""
+    usernames = sorted(users)
+
+    def make_worker(index):
+        client = client_for(users, usernames[index % 2])
+        partner = usernames[(index + 1) % 2]
+        cursor = {'before_id': None}
+
+        def issue():
+            query = f'?before_id={cursor["before_id"]}' if cursor['before_id'] else ''
+            response = client.get(f'/messages/{partner}{query}')
+            data = response.get_json() or {}
+            cursor['before_id'] = data.get('next_cursor')
+            return response
+        return issue
+    return make_worker
+
+def sync_worker(users):
+    usernames = sorted(users)
+
+    def make_worker(index):
+        username = usernames[index % len(usernames)]
+        client = client_for(users, username)
+        return lambda: client.get('/sync?since=0')
+    return make_worker
+
+def inbox_worker(users):
+    usernames = sorted(users)
+
+    def make_worker(index):
+        client = client_for(users, usernames[index % len(usernames)])
+        return lambda: client.get('/inbox')
+    return make_worker
+
+def send_worker(users, media=None):
+    usernames = sorted(users)
+
+    def make_worker(index):
+        sender = usernames[index % len(usernames)]
+        client = client_for(users, sender)
+        rng = random.Random(index)
+
+        def issue():
+            receiver = rng.choice(usernames)
+            data = {'receiver': receiver, 'content': 'benchmark message', 'client_id': uuid.uuid4().hex}
+            if media is not None:
+                data['media'] = (io.BytesIO(media()), 'bench.png', 'image/png')
+            return client.post('/send_message', data=data, content_type='multipart/form-data')
+        return issue
+    return make_worker
+
+def random_png(size=64):
+    """A small PNG with random pixels, so every upload is new content."""
+    from PIL import Image
+
+    image = Image.frombytes('RGB', (size, size), random.randbytes(size * size * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def run_fanout(counter, users, concurrency, requests, sockets):
+    """Sends between users with connected Socket.IO clients and counts the deliveries."""
+    receivers = {username: users[username] for username in sorted(users)[:max(sockets, 1)]}
+    socket_clients = [
+        socketio.test_client(app, flask_test_client=client_for(users, username)) for username in receivers
+    ]
+    for socket_client in socket_clients:
+        socket_client.get_received()
+    try:
+        samples, wall_time = run_workers(counter, concurrency, requests, send_worker(receivers))
+        delivered = sum(
+            1 for socket_client in socket_clients
+            for packet in socket_client.get_received() if packet['name'] == 'new_message'
+        )
+    finally:
+        for socket_client in socket_clients:
+            socket_client.disconnect()
+
+    result = summarize(samples, wall_time)
+    # Every successful send reaches the sender and the receiver, once if they are the same user
+    result['sockets'] = len(socket_clients)
+    result['deliveries'] = delivered
+    result['deliveries_per_second'] = round(delivered / wall_time, 1) if wall_time else 0.0
+    return result
+
+def run_suite(users, scenarios=SCENARIOS, concurrency=4, requests=200, sockets=10):
+    """Run each scenario against the seeded database and return their results by name."""
+    counter = QueryCounter(db.engine)
+    counter.install()
+    try:
+        results = {}
+        for scenario in scenarios:
+            if scenario == 'fanout':
+                results[scenario] = run_fanout(counter, users, concurrency, requests, sockets)
+                continue
+            make_worker = {
+                'history': lambda: history_worker(users),
+                'sync': lambda: sync_worker(users),
+                'inbox': lambda: inbox_worker(users),
+                'send': lambda: send_worker(users),
+                'send_media': lambda: send_worker(users, media=random_png),
+            }[scenario]()
+            results[scenario] = summarize(*run_workers(counter, concurrency, requests, make_worker))
+        return results
+    finally:
+        counter.remove()
+
+def compare(baseline, current, tolerance=0.25):
+    """Return human-readable regressions of `current` results against `baseline`.
+
+    Latency may grow and throughput may drop by `tolerance` (a fraction)
+    before it counts. Queries per request do not depend on the machine, so
+    any growth beyond noise from send ordering (0.1) counts.
+    """
+    regressions = []
+    for scenario, before in baseline.items():
+        after = current.get(scenario)
+        if after is None:
+            continue
+        for metric in ('p50_ms', 'p99_ms'):
+            if after[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{scenario}: {metric} {before[metric]} -> {after[metric]}")
+        if after['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append(
+                f"{scenario}: throughput_rps {before['throughput_rps']} -> {after['throughput_rps']}")
+        if after['queries_per_request'] > before['queries_per_request'] + 0.1:
+            regressions.append(
+                f"{scenario}: queries_per_request {before['queries_per_request']} -> {after['queries_per_request']}")
+        if after['errors'] > before['errors']:
+            regressions.append(f"{scenario}: errors {before['errors']} -> {after['errors']}")
+    return regressions
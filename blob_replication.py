@@ -0,0 +1,269 @@
+import fcntl
+import json
+import logging
+import mimetypes
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+from cache import TTLCache
+from models import db, MediaObject
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_BLOB_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+class ReplicationJournal:
+    """Append-only on-disk log of blob uploads that have not finished yet.
+
+    Each line is a JSON record: ``queued`` when a file is handed to the
+    replicator and ``done`` once it is in blob storage. Whatever is queued
+    but not done when a worker starts is picked up again, so a crash or
+    deploy never loses an upload. Workers of one instance share the file;
+    appends and compaction are serialised with a lock file.
+    """
+
+    def __init__(self, path, compact_after=1000):
+        self.path = path
+        self.compact_after = compact_after
+        self._lock_path = f"{path}.lock"
+        self._thread_lock = threading.Lock()
+        self._appended = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _locked(self):
+        lock_file = open(self._lock_path, 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _read(self):
+        records = []
+        try:
+            with open(self.path) as journal:
+                for line in journal:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A torn final line from a crash mid-write
+                        continue
+        except FileNotFoundError:
+            pass
+        return records
+
+    def append(self, record):
+        line = json.dumps(record) + '\n'
+        with self._thread_lock:
+            with self._locked():
+                with open(self.path, 'a') as journal:
+                    journal.write(line)
+                    journal.flush()
+                    os.fsync(journal.fileno())
+            self._appended += 1
+            should_compact = self._appended >= self.compact_after
+        if should_compact:
+            self.compact()
+
+    def queued(self, filename, content_type, content_hash=None):
+        self.append({'op': 'queued', 'filename': filename,
+                     'content_type': content_type, 'content_hash': content_hash})
+
+    def done(self, filename):
+        self.append({'op': 'done', 'filename': filename})
+
+    @staticmethod
+    def _replay(records):
+        pending = {}
+        for record in records:
+            if record.get('op') == 'queued':
+                pending[record['filename']] = record
+            elif record.get('op') == 'done':
+                pending.pop(record.get('filename'), None)
+        return list(pending.values())
+
+    def pending(self):
+        """Return the queued records that have no later ``done``, oldest first."""
+        with self._locked():
+            return self._replay(self._read())
+
+    def compact(self):
+        """Rewrite the journal keeping only pending records."""
+        with self._thread_lock:
+            self._appended = 0
+            with self._locked():
+                pending = self._replay(self._read())
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, 'w') as journal:
+                    for record in pending:
+                        journal.write(json.dumps(record) + '\n')
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                os.replace(temp_path, self.path)
+
+class BlobReplicator:
+    """Copy locally stored media to blob storage in the background.
+
+    Requests only wait for the local disk write; the upload to the
+    container happens on a thread pool afterwards. Until a MediaObject is
+    marked ``replicated`` it is served from the local upload folder, after
+    that /uploads redirects to a short-lived read-only SAS URL, which also
+    lets other instances serve files they never saw locally.
+
+    The thread pool belongs to one process: it is created on first use in
+    each process, so gunicorn workers forked from a preloading master
+    never inherit the master's threads, and each process resumes the
+    journal once (see ensure_started).
+    """
+
+    def __init__(self, app, journal_path, max_workers=2, sas_ttl=3600, retries=3):
+        self.app = app
+        self.journal = ReplicationJournal(journal_path)
+        self.sas_ttl = sas_ttl
+        self.retries = retries
+        self.max_workers = max_workers
+        self.container_client = None
+        self._executor = None
+        self._executor_pid = None
+        self._started_pid = None
+        self._lock = threading.Lock()
+        # Reuse a SAS URL for half its lifetime so browsers can cache the media
+        self._sas_urls = TTLCache(maxsize=10000, ttl=max(sas_ttl // 2, 1))
+
+    @property
+    def enabled(self):
+        return self.container_client is not None
+
+    def start(self, container_client):
+        """Enable replication. Nothing runs until ensure_started() in the serving process."""
+        self.container_client = container_client
+
+    def _get_executor(self):
+        pid = os.getpid()
+        if self._executor_pid != pid:
+            with self._lock:
+                if self._executor_pid != pid:
+                    # An executor inherited across fork never runs new jobs
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='blob-replication')
+                    self._executor_pid = pid
+        return self._executor
+
+    def ensure_started(self):
+        """Resume uploads left over from previous runs, once per process.
+
+        Cheap after the first call; the app calls it on every request.
+        """
+        pid = os.getpid()
+        if self._started_pid == pid or not self.enabled:
+            return []
+        with self._lock:
+            if self._started_pid == pid:
+                return []
+            self._started_pid = pid
+        pending = self.journal.pending()
+        if pending:
+            logger.info(f"Resuming {len(pending)} pending blob uploads")
+        executor = self._get_executor()
+        return [
+            executor.submit(self._process, record['filename'],
+                            record.get('content_type'), record.get('content_hash'))
+            for record in pending
+        ]
+
+    def shutdown(self, wait=True):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+
+    def submit(self, filename, content_type=None, content_hash=None):
+        """Journal `filename` and queue its upload. No-op without blob storage."""
+        if not self.enabled:
+            return None
+        content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.journal.queued(filename, content_type, content_hash)
+        return self._get_executor().submit(self._process, filename, content_type, content_hash)
+
+    def replicate(self, media_object):
+        """Queue a stored media file unless it is already in blob storage."""
+        if media_object is None or media_object.blob_status == 'replicated':
+            return None
+        return self.submit(media_object.filename, media_object.content_type, media_object.content_hash)
+
+    def submit_files(self, filenames):
+        """Queue derived files (e.g. thumbnails) that have no MediaObject of their own."""
+        return [self.submit(filename) for filename in filenames]
+
+    def sas_url(self, filename):
+        url = self._sas_urls.get(filename)
+        if url is None:
+            # Imported here so processes without blob storage never load the SDK
+            from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+            token = generate_blob_sas(
+                account_name=self.container_client.account_name,
+                container_name=self.container_client.container_name,
+                blob_name=filename,
+                account_key=self.container_client.credential.account_key,
+                permission=BlobSasPermissions(read=True),
+                expiry=datetime.utcnow() + timedelta(seconds=self.sas_ttl)
+            )
+            url = f"{self.container_client.url}/{quote(filename)}?{token}"
+            self._sas_urls.set(filename, url)
+        return url
+
+    def _upload(self, filename, content_type):
+        from azure.storage.blob import ContentSettings
+
+        path = os.path.join(self.app.config['UPLOAD_FOLDER'], filename)
+        blob_client = self.container_client.get_blob_client(filename)
+        # Content-addressed names are never reused, so an existing blob is the same file
+        if blob_client.exists():
+            return
+        with open(path, 'rb') as data:
+            blob_client.upload_blob(
+                data,
+                blob_type="BlockBlob",
+                overwrite=True,
+                content_settings=ContentSettings(
+                    content_type=content_type,
+                    cache_control=IMMUTABLE_BLOB_CACHE_CONTROL
+                )
+            )
+
+    def _process(self, filename, content_type, content_hash=None):
+        path = os.path.join(self.app.config['UPLOAD_FOLDER'], filename)
+        if not os.path.exists(path):
+            logger.warning(f"Skipping blob upload of {filename}: local file is gone")
+            self.journal.done(filename)
+            return False
+
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._upload(filename, content_type)
+                break
+            except Exception as e:
+                logger.error(f"Error uploading {filename} to blob storage (attempt {attempt}): {str(e)}")
+                if attempt == self.retries:
+                    # Left in the journal; the next worker start retries it
+                    return False
+                time.sleep(2 ** attempt)
+
+        if content_hash:
+            with self.app.app_context():
+                try:
+                    MediaObject.query.filter_by(content_hash=content_hash).update(
+                        {MediaObject.blob_status: 'replicated'},
+                        synchronize_session=False
+                    )
+                    db.session.commit()
+                except Exception as e:
+                    logger.error(f"Error marking {filename} as replicated: {str(e)}")
+                    db.session.rollback()
+                    return False
+                finally:
+                    db.session.remove()
+
+        self.journal.done(filename)
+        logger.info(f"Replicated {filename} to blob storage")
+        return True
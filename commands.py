@@ -0,0 +1,119 @@
+"""Maintenance commands that only set up what they use.
+
+    FLASK_APP=commands flask --help
+    FLASK_APP=commands flask upgrade-db
+    FLASK_APP=commands flask list-blobs
+    FLASK_APP=commands flask reconcile-media --dry-run
+    FLASK_APP=commands flask expire-uploads
+
+None of them import app.py: database commands get a bare app with just
+the database bound, and list-blobs does not touch the database at all.
+"""
+import logging
+
+import click
+from flask import Flask
+from flask.cli import FlaskGroup
+
+from config import blob_container_client, database_config, upload_folder
+
+def create_cli_app(config=None):
+    """A bare app with only the database bound, for maintenance tasks."""
+    from models import db
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    settings = dict(config or {})
+    if 'SQLALCHEMY_DATABASE_URI' not in settings:
+        settings = {**database_config(), **settings}
+    app.config.update(settings)
+    app.config['UPLOAD_FOLDER'] = upload_folder()
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        from sqlite_tuning import install_sqlite_pragmas
+        install_sqlite_pragmas()
+    db.init_app(app)
+    return app
+
+@click.group(cls=FlaskGroup, create_app=create_cli_app, add_default_commands=False)
+def cli():
+    """Chat maintenance commands."""
+    logging.basicConfig(level=logging.INFO)
+
+@cli.command('upgrade-db')
+def upgrade_db_command():
+    """Apply pending schema migrations (see migrations.py)."""
+    from migrations import upgrade
+
+    applied = upgrade()
+    click.echo(f"Applied migrations: {', '.join(map(str, applied)) or 'none'}")
+
+@cli.command('schema-sql', with_appcontext=False)
+@click.option('--dialect', default='sqlite', help="SQLAlchemy dialect name, e.g. sqlite, mssql, postgresql")
+def schema_sql_command(dialect):
+    """Print the DDL that models.py compiles to."""
+    from migrations import schema_sql
+
+    click.echo(schema_sql(dialect), nl=False)
+
+@cli.command('list-blobs', with_appcontext=False)
+def list_blobs_command():
+    """List every blob in the media container."""
+    from list_blobs import list_all_blobs
+
+    list_all_blobs(blob_container_client())
+
+@cli.command('backfill-conversation-keys')
+def backfill_conversation_keys_command():
+    """Fill in conversation_key for messages stored before it existed."""
+    from backfill_conversation_keys import backfill_conversation_keys
+
+    updated = backfill_conversation_keys()
+    click.echo(f"Successfully backfilled {updated} messages")
+
+@cli.command('rebuild-inbox')
+def rebuild_inbox_command():
+    """Recreate conversation summaries (inbox and unread counts) from messages."""
+    from inbox import rebuild_summaries
+
+    rebuilt = rebuild_summaries()
+    click.echo(f"Successfully rebuilt {rebuilt} conversation summaries")
+
+@cli.command('rebuild-search')
+def rebuild_search_command():
+    """Index every existing message for /search."""
+    from search import SearchIndex
+
+    search_index = SearchIndex()
+    indexed = search_index.rebuild()
+    click.echo(f"Successfully indexed {indexed} messages with the {search_index.backend()} backend")
+
+@cli.command('reconcile-media')
+@click.option('--batch-size', type=int, default=None)
+@click.option('--checkpoint', default=None, help="Progress file used to resume an interrupted run")
+@click.option('--reset', is_flag=True, help="Ignore any saved checkpoint and start over")
+@click.option('--dry-run', is_flag=True, help="Report what would change without writing")
+def reconcile_media_command(batch_size, checkpoint, reset, dry_run):
+    """Reconcile media messages with blob storage and local uploads."""
+    from flask import current_app
+    from reconcile_media import BATCH_SIZE, CHECKPOINT_PATH, reconcile_media
+
+    messages_fixed, objects_fixed = reconcile_media(
+        blob_container_client(), current_app.config['UPLOAD_FOLDER'], checkpoint or CHECKPOINT_PATH,
+        batch_size or BATCH_SIZE, dry_run, reset
+    )
+    action = "Would fix" if dry_run else "Fixed"
+    click.echo(f"{action} {messages_fixed} messages and {objects_fixed} media objects")
+
+@cli.command('expire-uploads')
+@click.option('--dry-run', is_flag=True, help="Report what would be removed without deleting")
+def expire_uploads_command(dry_run):
+    """Delete chunked uploads that were never finished, and their partial files."""
+    from flask import current_app
+    from upload_sessions import expire_upload_sessions
+
+    sessions, files = expire_upload_sessions(current_app.config['UPLOAD_FOLDER'], dry_run=dry_run)
+    action = "Would expire" if dry_run else "Expired"
+    click.echo(f"{action} {sessions} upload sessions and {files} partial files")
+
+if __name__ == '__main__':
+    cli()
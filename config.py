@@ -0,0 +1,111 @@
+"""Settings read from the environment, without importing database or Azure drivers.
+
+Shared by the web app (app.create_app) and the maintenance commands
+(commands.py), which only build the parts they use.
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+CONTAINER_NAME = "chat-media"  # Name of the container for storing media files
+DEFAULT_UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+
+# Serving mode: "sync", or "eventlet"/"gevent" for async workers (see gunicorn.conf.py)
+WORKER_CLASS = os.getenv('WORKER_CLASS', 'sync')
+ASYNC_WORKER = WORKER_CLASS in ('eventlet', 'gevent')
+
+def database_uri(environ=os.environ):
+    """SQLAlchemy URL from DATABASE_URL, or built from the Azure SQL ODBC string.
+
+    DATABASE_URL (any SQLAlchemy URL, e.g. sqlite:///chat.db) replaces the
+    Azure SQL connection for local runs, tests and benchmarks.
+    """
+    database_url = environ.get('DATABASE_URL')
+    if database_url:
+        logger.info(f"Using {database_url.split(':', 1)[0]} database from DATABASE_URL")
+        return database_url
+
+    connection_string = environ.get('AZURE_SQL_CONNECTIONSTRING')
+    if not connection_string:
+        logger.error("AZURE_SQL_CONNECTIONSTRING environment variable is not set!")
+        raise ValueError("Database connection string not found in environment variables")
+
+    # Parse the ODBC connection string components
+    params = {}
+    for param in connection_string.split(';'):
+        if '=' in param:
+            key, value = param.split('=', 1)
+            params[key.strip()] = value.strip()
+
+    server = params.get('Server', '').replace('tcp:', '')
+    database = params.get('Database', '')
+    username = params.get('Uid', '')
+    password = params.get('Pwd', '')
+
+    # Log masked connection info
+    logger.debug("Database connection info (masked): Server=%s, Database=%s, Username=%s, Password=***",
+                 server, database, username)
+    logger.info("Database connection string configured successfully")
+    return f"mssql+pyodbc://{username}:{password}@{server}/{database}?driver=ODBC+Driver+17+for+SQL+Server&TrustServerCertificate=yes&connection_timeout=60&command_timeout=60&pool_size=5&pool_timeout=60&pool_pre_ping=true"
+
+def engine_options(uri, environ=os.environ, poolclass=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for `uri`.
+
+    In async mode the pool bounds how many greenlets talk to the database
+    at once; the rest wait up to pool_timeout for a connection.
+    """
+    pool_timeout = int(environ.get('DB_POOL_TIMEOUT', 60))
+    if uri.startswith('sqlite'):
+        from sqlite_tuning import is_memory_database
+
+        if is_memory_database(uri):
+            return {}
+        # Keep file connections open (and their pragmas applied) instead of
+        # reconnecting per checkout; lock waits come from busy_timeout
+        from sqlalchemy.pool import QueuePool
+
+        return {
+            'poolclass': poolclass or QueuePool,
+            'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': pool_timeout,
+            'connect_args': {'check_same_thread': False}
+        }
+    options = {
+        'pool_size': int(environ.get('DB_POOL_SIZE', 20 if ASYNC_WORKER else 5)),
+        'pool_timeout': pool_timeout,
+        'pool_recycle': 1800,
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10 if ASYNC_WORKER else 2)),
+        'connect_args': {
+            'timeout': 60,
+            'connect_timeout': 60
+        }
+    }
+    if poolclass is not None:
+        options['poolclass'] = poolclass
+    return options
+
+def database_config(environ=os.environ, poolclass=None):
+    uri = database_uri(environ)
+    return {
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options(uri, environ, poolclass),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    }
+
+def upload_folder(environ=os.environ):
+    return environ.get('UPLOAD_FOLDER', DEFAULT_UPLOAD_FOLDER)
+
+def blob_container_client(environ=os.environ):
+    """Client for the media container, or None without AZURE_STORAGE_CONNECTION_STRING.
+
+    The Azure SDK is only imported when storage is configured.
+    """
+    storage_connection_string = environ.get('AZURE_STORAGE_CONNECTION_STRING')
+    if not storage_connection_string:
+        return None
+    from azure.storage.blob import BlobServiceClient
+
+    blob_service_client = BlobServiceClient.from_connection_string(storage_connection_string)
+    return blob_service_client.get_container_client(CONTAINER_NAME)
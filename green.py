@@ -0,0 +1,67 @@
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+class ThreadPoolProxy:
+    """Proxy a DB-API object so every method call runs through `run`.
+
+    `run(func, *args, **kwargs)` executes `func` in a native thread pool and
+    blocks only the calling greenlet. Objects returned by a call whose type
+    is in `wrap_types` (e.g. the cursor from ``connection.cursor()``) are
+    proxied as well.
+    """
+
+    def __init__(self, obj, run, wrap_types=()):
+        object.__setattr__(self, '_obj', obj)
+        object.__setattr__(self, '_run', run)
+        object.__setattr__(self, '_wrap_types', wrap_types)
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = self._run(attr, *args, **kwargs)
+            if self._wrap_types and isinstance(result, self._wrap_types):
+                return ThreadPoolProxy(result, self._run, self._wrap_types)
+            return result
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._obj, name, value)
+
+def _threadpool_runner(worker_class):
+    if worker_class == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute
+    if worker_class == 'gevent':
+        from gevent import get_hub
+
+        def run(func, *args, **kwargs):
+            return get_hub().threadpool.apply(func, args, kwargs)
+        return run
+    raise ValueError(f"Unsupported async worker class: {worker_class}")
+
+def install_green_dbapi(worker_class, dialects=('mssql',)):
+    """Run blocking DB-API drivers off the event loop for async workers.
+
+    pyodbc is a C extension, so monkey patching cannot make its network I/O
+    cooperative; without this one slow query stalls every greenlet in the
+    worker. Connections for the given dialects are wrapped so connect,
+    execute and fetch calls run in the hub's native thread pool.
+    """
+    run = _threadpool_runner(worker_class)
+
+    @event.listens_for(Engine, 'do_connect')
+    def connect_in_threadpool(dialect, conn_rec, cargs, cparams):
+        if dialect.name not in dialects:
+            return None
+        dbapi = dialect.dbapi
+        connection = run(dbapi.connect, *cargs, **cparams)
+        return ThreadPoolProxy(connection, run, wrap_types=(dbapi.Cursor,))
+
+    logger.info(f"Database calls for {', '.join(dialects)} will run in the {worker_class} thread pool")
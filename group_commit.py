@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Result of a job whose batch was interrupted before it ran or committed
+_NOT_RUN = object()
+
+class _Pending:
+    __slots__ = ('job', 'done', 'result', 'error', 'promoted')
+
+    def __init__(self, job):
+        self.job = job
+        self.done = threading.Event()
+        self.result = _NOT_RUN
+        self.error = None
+        self.promoted = False
+
+class GroupCommitter:
+    """Coalesce writes from concurrent requests into shared transactions.
+
+    `run(job)` calls `job()` inside a transaction and returns its result
+    once committed. With batching enabled, the first caller becomes the
+    leader: it waits `window` seconds for other callers to queue up, runs
+    every queued job on its own session and commits them together, so a
+    burst of N messages costs one commit instead of N. If the batch fails,
+    each job is retried in a transaction of its own so one bad write only
+    fails its own request.
+
+    Jobs run on the leader's thread and session, so they must build their
+    objects themselves and return plain data (e.g. a to_dict() result),
+    not ORM instances. Batching only helps when a process serves requests
+    concurrently (threads or eventlet/gevent workers).
+    """
+
+    def __init__(self, session, enabled=False, window=0.005, max_batch=100):
+        self.session = session
+        self.enabled = enabled
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._queue = []
+        self._leader_active = False
+
+    def run(self, job):
+        if not self.enabled:
+            return self._run_alone(job)
+
+        pending = _Pending(job)
+        with self._lock:
+            self._queue.append(pending)
+            lead = not self._leader_active
+            self._leader_active = True
+
+        if lead:
+            self._lead(pending)
+        pending.done.wait()
+        while pending.promoted:
+            # The previous leader handed over a non-empty queue
+            pending.promoted = False
+            pending.done.clear()
+            self._lead(pending)
+            pending.done.wait()
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run_alone(self, job):
+        try:
+            result = job()
+            self.session.commit()
+            return result
+        except Exception:
+            self.session.rollback()
+            raise
+
+    def _lead(self, own):
+        """Commit one batch, then pass leadership on even if interrupted."""
+        try:
+            # Let concurrent requests join this batch
+            time.sleep(self.window)
+            with self._lock:
+                batch = self._queue[:self.max_batch]
+                del self._queue[:self.max_batch]
+
+            self._commit_batch(batch)
+        finally:
+            with self._lock:
+                if own in self._queue:
+                    # Interrupted before taking the batch: nobody waits for this job any more
+                    self._queue.remove(own)
+                if self._queue:
+                    # Leadership moves on so this request is not stuck draining the queue
+                    successor = self._queue[0]
+                    successor.promoted = True
+                    successor.done.set()
+                else:
+                    self._leader_active = False
+
+    def _commit_batch(self, batch):
+        try:
+            results = [pending.job() for pending in batch]
+            self.session.commit()
+        except Exception as e:
+            self.session.rollback()
+            logger.warning(f"Group commit of {len(batch)} writes failed, retrying one by one: {str(e)}")
+            for pending in batch:
+                try:
+                    pending.result = self._run_alone(pending.job)
+                except Exception as job_error:
+                    pending.error = job_error
+        else:
+            for pending, result in zip(batch, results):
+                pending.result = result
+            if len(batch) > 1:
+                logger.debug("Group-committed %d writes", len(batch))
+        finally:
+            for pending in batch:
+                if pending.error is None and pending.result is _NOT_RUN:
+                    # The leader was interrupted (e.g. its greenlet was killed)
+                    pending.error = RuntimeError("Group commit was interrupted")
+                pending.done.set()
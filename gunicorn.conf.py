@@ -1,11 +1,46 @@
 import os
 
+# Serving mode: "sync", or "eventlet"/"gevent" to serve thousands of
+# concurrent sockets per worker. The app reads the same variable to pick
+# its Socket.IO async mode and database pool size.
+WORKER_CLASS = os.getenv('WORKER_CLASS', 'sync')
+ASYNC_WORKER = WORKER_CLASS in ('eventlet', 'gevent')
+
 bind = f"0.0.0.0:{os.getenv('WEBSITES_PORT', '8000')}"
-workers = 4
-timeout = 600
-preload_app = True
-worker_class = "sync"
+worker_class = {
+    'eventlet': 'eventlet',
+    'gevent': 'geventwebsocket.gunicorn.workers.GeventWebSocketWorker',
+}.get(WORKER_CLASS, WORKER_CLASS)
+# Socket.IO long-polling needs sticky sessions, so async mode runs one
+# worker per instance and scales out through SOCKETIO_MESSAGE_QUEUE
+workers = int(os.getenv('GUNICORN_WORKERS', 1 if ASYNC_WORKER else 4))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60 if ASYNC_WORKER else 600))
+# Async workers monkey-patch the standard library when they start, which
+# has to happen before the app (and its locks and sockets) is imported
+preload_app = not ASYNC_WORKER
 accesslog = "-"
 errorlog = "-"
 capture_output = True
-loglevel = "info" 
\ No newline at end of file
+loglevel = "info"
+
+# Queue-based logging at INFO unless LOG_MODE says otherwise (see logging_config.py)
+os.environ.setdefault('LOG_MODE', 'production')
+
+# Workers share metrics through this directory so /metrics covers all of them
+METRICS_DIR = os.environ.setdefault('METRICS_DIR', f"/tmp/chat-metrics-{bind.rsplit(':', 1)[1]}")
+
+def on_starting(server):
+    from metrics import clear_directory
+    clear_directory(METRICS_DIR)
+
+    # Run the local Socket.IO broker in the master so every worker can reach it
+    queue_url = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+    if queue_url.startswith('unix://'):
+        from socket_queue import UnixSocketBroker
+        UnixSocketBroker(queue_url[len('unix://'):]).start()
+
+def child_exit(server, worker):
+    # Keep the dead worker's request totals, but not its connected-client gauge
+    from metrics import mark_process_dead
+    mark_process_dead(METRICS_DIR, worker.pid)
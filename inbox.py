@@ -0,0 +1,207 @@
+import logging
+
+from sqlalchemy import bindparam, case, func
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ConversationSummary, Message, conversation_key
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_LENGTH = 100
+REBUILD_BATCH_SIZE = 1000
+
+def message_preview(message):
+    content = (message.content or '').strip()
+    if content:
+        return content[:PREVIEW_LENGTH]
+    if message.has_media and message.media_type:
+        return f"[{message.media_type.split('/')[0]}]"
+    return ''
+
+def _if_newer(message_id, value, column):
+    """SET expression that only takes `value` when `message_id` is the newest seen.
+
+    Messages can commit out of id order, so an older one must not overwrite
+    the summary of a newer one.
+    """
+    return case((ConversationSummary.last_message_id < message_id, value), else_=column)
+
+def _summary_values(message, is_sender):
+    values = {
+        ConversationSummary.last_message_id: _if_newer(
+            message.id, message.id, ConversationSummary.last_message_id),
+        ConversationSummary.last_sender_username: _if_newer(
+            message.id, message.sender_username, ConversationSummary.last_sender_username),
+        ConversationSummary.last_preview: _if_newer(
+            message.id, message_preview(message), ConversationSummary.last_preview),
+        ConversationSummary.last_message_at: _if_newer(
+            message.id, message.created_at, ConversationSummary.last_message_at),
+    }
+    if is_sender:
+        # Replying means the sender has read everything up to here
+        values[ConversationSummary.last_read_message_id] = _if_newer(
+            message.id, message.id, ConversationSummary.last_read_message_id)
+        values[ConversationSummary.unread_count] = _if_newer(
+            message.id, 0, ConversationSummary.unread_count)
+    else:
+        values[ConversationSummary.unread_count] = ConversationSummary.unread_count + 1
+    return values
+
+def record_message(message):
+    """Fold a new message into both participants' summaries.
+
+    Runs in the caller's transaction so the message and the counters commit
+    together; the message is flushed first to get its id.
+    """
+    db.session.flush()
+    key = message.conversation_key or conversation_key(message.sender_username, message.receiver_username)
+    participants = [(message.sender_username, message.receiver_username)]
+    if message.receiver_username != message.sender_username:
+        participants.append((message.receiver_username, message.sender_username))
+
+    for username, partner in participants:
+        is_sender = username == message.sender_username
+        summary_query = ConversationSummary.query.filter_by(username=username, conversation_key=key)
+        if summary_query.update(_summary_values(message, is_sender), synchronize_session=False):
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.add(ConversationSummary(
+                    username=username,
+                    conversation_key=key,
+                    partner_username=partner,
+                    last_message_id=message.id,
+                    last_sender_username=message.sender_username,
+                    last_preview=message_preview(message),
+                    last_message_at=message.created_at,
+                    last_read_message_id=message.id if is_sender else 0,
+                    unread_count=0 if is_sender else 1
+                ))
+        except IntegrityError:
+            # A concurrent first message created the row; fold into it instead
+            summary_query.update(_summary_values(message, is_sender), synchronize_session=False)
+
+def mark_read(username, partner, up_to_id=None):
+    """Mark `partner`'s messages to `username` read up to `up_to_id` (default: all).
+
+    Returns the updated summary, or None when the two have never talked.
+    The caller commits.
+    """
+    key = conversation_key(username, partner)
+    summary = ConversationSummary.query.filter_by(
+        username=username, conversation_key=key
+    ).with_for_update().first()
+    if summary is None:
+        return None
+
+    up_to = summary.last_message_id if up_to_id is None else min(up_to_id, summary.last_message_id)
+    if up_to <= summary.last_read_message_id:
+        return summary
+
+    # Counted on the conversation index rather than trusted from the counter,
+    # so a partial read leaves exactly the newer messages unread
+    summary.unread_count = Message.query.filter(
+        Message.conversation_key == key,
+        Message.sender_username == partner,
+        Message.receiver_username == username,
+        Message.id > up_to
+    ).count()
+    summary.last_read_message_id = up_to
+    return summary
+
+def inbox_page(username, before_id=None, limit=50):
+    """Return (summaries, next_cursor) for `username`, most recent conversation first."""
+    query = ConversationSummary.query.filter(ConversationSummary.username == username)
+    if before_id is not None:
+        query = query.filter(ConversationSummary.last_message_id < before_id)
+    summaries = query.order_by(ConversationSummary.last_message_id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(summaries) > limit:
+        summaries = summaries[:limit]
+        next_cursor = summaries[-1].last_message_id
+    return summaries, next_cursor
+
+def unread_total(username):
+    return db.session.query(
+        func.coalesce(func.sum(ConversationSummary.unread_count), 0)
+    ).filter(ConversationSummary.username == username).scalar()
+
+def rebuild_summaries(batch_size=REBUILD_BATCH_SIZE, session=None):
+    """Recreate every summary from the messages table, treating history as read.
+
+    Runs on db.session unless given another `session` (e.g. one bound to a
+    migration's connection).
+    """
+    session = session or db.session
+    latest = {}
+    last_id = 0
+    while True:
+        rows = session.query(
+            Message.id, Message.sender_username, Message.receiver_username, Message.content,
+            Message.has_media, Message.media_type, Message.created_at
+        ).filter(Message.id > last_id).order_by(Message.id.asc()).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            key = conversation_key(row.sender_username, row.receiver_username)
+            latest[(row.sender_username, key)] = (row.receiver_username, row)
+            latest[(row.receiver_username, key)] = (row.sender_username, row)
+        last_id = rows[-1].id
+        logger.info(f"Scanned messages up to id {last_id}")
+
+    try:
+        session.query(ConversationSummary).delete(synchronize_session=False)
+        session.bulk_insert_mappings(ConversationSummary, [
+            {
+                'username': username,
+                'conversation_key': key,
+                'partner_username': partner,
+                'last_message_id': row.id,
+                'last_sender_username': row.sender_username,
+                'last_preview': message_preview(row),
+                'last_message_at': row.created_at,
+                'last_read_message_id': row.id,
+                'unread_count': 0
+            }
+            for (username, key), (partner, row) in latest.items()
+        ])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return len(latest)
+
+def rekey_summaries(session=None):
+    """Rewrite summary keys in an older format, keeping read positions and counts."""
+    session = session or db.session
+    table = ConversationSummary.__table__
+    updates = [
+        {'old_username': row.username, 'old_key': row.conversation_key,
+         'new_key': conversation_key(row.username, row.partner_username)}
+        for row in session.query(
+            ConversationSummary.username, ConversationSummary.conversation_key, ConversationSummary.partner_username
+        )
+        if row.conversation_key != conversation_key(row.username, row.partner_username)
+    ]
+    if updates:
+        session.execute(
+            table.update().where(
+                table.c.username == bindparam('old_username'), table.c.conversation_key == bindparam('old_key')
+            ).values(conversation_key=bindparam('new_key')),
+            updates
+        )
+        session.commit()
+    return len(updates)
+
+if __name__ == '__main__':
+    from commands import create_cli_app
+
+    logging.basicConfig(level=logging.INFO)
+    print("Rebuilding conversation summaries...")
+    with create_cli_app().app_context():
+        try:
+            rebuilt = rebuild_summaries()
+            print(f"Successfully rebuilt {rebuilt} conversation summaries")
+        except Exception as e:
+            print(f"Error during rebuild: {str(e)}")
@@ -1,10 +1,13 @@
-from app import container_client
+from config import blob_container_client
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def list_all_blobs():
+def list_all_blobs(container_client):
+    if container_client is None:
+        print("Blob storage is not configured (AZURE_STORAGE_CONNECTION_STRING is not set)")
+        return
     try:
         print("\nListing all blobs in container:")
         print("-" * 50)
@@ -20,4 +23,4 @@ def list_all_blobs():
         print(f"Error listing blobs: {str(e)}")
 
 if __name__ == "__main__":
-    list_all_blobs() 
\ No newline at end of file
+    list_all_blobs(blob_container_client())
\ No newline at end of file
@@ -0,0 +1,154 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Loggers that fire per request or per Socket.IO packet
+DEFAULT_SAMPLED_LOGGERS = 'app.requests,socketio,engineio'
+DEFAULT_PRODUCTION_LEVELS = 'socketio=WARNING,engineio=WARNING,sqlalchemy=WARNING,azure=WARNING'
+
+# The production-mode queue listener of this process, replaced in forked children
+_listener = None
+_hooks_registered = False
+
+class SamplingFilter(logging.Filter):
+    """Pass only a `rate` fraction of records below WARNING from the given loggers.
+
+    Warnings and errors always pass. Sampling is random rather than every
+    Nth record so concurrent workers do not all keep the same requests.
+    """
+
+    def __init__(self, prefixes, rate):
+        super().__init__()
+        self.prefixes = tuple(prefixes)
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        if not record.name.startswith(self.prefixes):
+            return True
+        return random.random() < self.rate
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock handler formats every record on the logging thread so it can
+    be pickled; this queue never leaves the process.
+    """
+
+    def prepare(self, record):
+        return record
+
+def stop_listener(listener):
+    """Flush queued records and stop the writer thread; safe to call twice."""
+    if listener._thread is not None:
+        listener.stop()
+
+def _stop_current_listener():
+    if _listener is not None:
+        stop_listener(_listener)
+
+def _restart_after_fork():
+    """Give a forked worker its own queue and writer thread.
+
+    The child inherits the parent's queue, whose lock may be held by a
+    thread that was not copied, and the parent would never see records
+    put on it here anyway.
+    """
+    global _listener
+    parent_listener = _listener
+    if parent_listener is None or parent_listener._thread is None:
+        return
+    root = logging.getLogger()
+    log_queue = queue.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *parent_listener.handlers,
+                                              respect_handler_level=parent_listener.respect_handler_level)
+    for parent_handler in list(root.handlers):
+        if isinstance(parent_handler, DeferredQueueHandler) and parent_handler.queue is parent_listener.queue:
+            handler = DeferredQueueHandler(log_queue)
+            handler.setLevel(parent_handler.level)
+            for log_filter in parent_handler.filters:
+                handler.addFilter(log_filter)
+            root.removeHandler(parent_handler)
+            root.addHandler(handler)
+    # The parent's thread was not copied; drop the reference so it is never joined
+    parent_listener._thread = None
+    _listener = listener
+    listener.start()
+
+def _register_hooks():
+    global _hooks_registered
+    if _hooks_registered:
+        return
+    os.register_at_fork(after_in_child=_restart_after_fork)
+    atexit.register(_stop_current_listener)
+    _hooks_registered = True
+
+def parse_levels(spec):
+    """'socketio=WARNING,app=INFO' -> {'socketio': 'WARNING', 'app': 'INFO'}."""
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def configure_logging(environ=os.environ):
+    """Set up logging from LOG_MODE, LOG_LEVEL, LOG_LEVELS and LOG_SAMPLE_RATE.
+
+    - ``debug`` (default): synchronous stderr logging at DEBUG.
+    - ``production``: records are put on an in-memory queue and written by
+      a listener thread, so requests never wait on log I/O. Defaults to
+      INFO with Socket.IO, Engine.IO, SQLAlchemy and Azure at WARNING.
+
+    LOG_LEVELS sets per-logger levels (``name=LEVEL,...``) on top of the
+    mode's defaults. LOG_SAMPLE_RATE keeps that fraction of sub-WARNING
+    records from the LOG_SAMPLED loggers (per-request and packet logs).
+    Returns the queue listener in production mode, otherwise None.
+    """
+    global _listener
+    _stop_current_listener()
+    _listener = None
+
+    mode = environ.get('LOG_MODE', 'debug').lower()
+    production = mode == 'production'
+    level = environ.get('LOG_LEVEL', 'INFO' if production else 'DEBUG').upper()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(level)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    sample_rate = float(environ.get('LOG_SAMPLE_RATE', 1))
+    sampled = [name.strip() for name in environ.get('LOG_SAMPLED', DEFAULT_SAMPLED_LOGGERS).split(',') if name.strip()]
+
+    listener = None
+    if production:
+        # queue.Queue rather than SimpleQueue: it cooperates with eventlet/gevent patching
+        log_queue = queue.Queue()
+        handler = DeferredQueueHandler(log_queue)
+        listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        listener.start()
+        # Forked gunicorn workers get a queue and writer thread of their own
+        _listener = listener
+        _register_hooks()
+    else:
+        handler = stream_handler
+    if sample_rate < 1 and sampled:
+        # On the handler that takes the record, so dropped records cost no queue or I/O work
+        handler.addFilter(SamplingFilter(sampled, sample_rate))
+    root.addHandler(handler)
+
+    levels = parse_levels(DEFAULT_PRODUCTION_LEVELS) if production else {'socketio': 'INFO', 'engineio': 'INFO'}
+    levels.update(parse_levels(environ.get('LOG_LEVELS')))
+    for name, logger_level in levels.items():
+        logging.getLogger(name).setLevel(logger_level)
+    return listener
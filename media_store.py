@@ -0,0 +1,73 @@
+import hashlib
+import os
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, MediaObject
+from thumbnails import image_dimensions
+
+HASH_BUFFER_SIZE = 64 * 1024
+
+def hash_stream_to_file(stream, path, buffer_size=HASH_BUFFER_SIZE):
+    """Copy `stream` to `path`, hashing it on the way. Returns (sha256 hex, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as out:
+        while True:
+            block = stream.read(buffer_size)
+            if not block:
+                break
+            digest.update(block)
+            out.write(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+def hash_file(path, buffer_size=HASH_BUFFER_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(buffer_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def content_filename(content_hash, extension):
+    return f"{content_hash}.{extension.lower()}"
+
+def store_media(temp_path, content_hash, extension, content_type, size, upload_folder):
+    """Move a freshly written file into content-addressed storage.
+
+    If the same content is already stored, the new copy is discarded and
+    the existing MediaObject is returned. The caller takes a reference with
+    `acquire_media` when a message starts pointing at the file.
+    """
+    media_object = MediaObject.query.get(content_hash)
+    if media_object is None:
+        filename = content_filename(content_hash, extension)
+        path = os.path.join(upload_folder, filename)
+        os.replace(temp_path, path)
+        width, height = image_dimensions(path, content_type) or (None, None)
+        media_object = MediaObject(
+            content_hash=content_hash,
+            filename=filename,
+            content_type=content_type,
+            size=size,
+            width=width,
+            height=height
+        )
+        db.session.add(media_object)
+        try:
+            db.session.commit()
+            return media_object
+        except IntegrityError:
+            # Another request stored the same content first
+            db.session.rollback()
+            media_object = MediaObject.query.get(content_hash)
+    elif os.path.exists(temp_path):
+        os.remove(temp_path)
+    return media_object
+
+def acquire_media(filename):
+    """Count one more message referencing `filename`; part of the caller's transaction."""
+    MediaObject.query.filter_by(filename=filename).update(
+        {MediaObject.ref_count: MediaObject.ref_count + 1},
+        synchronize_session=False
+    )
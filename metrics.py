@@ -0,0 +1,333 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Seconds; also used for emit and pool waits
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+ARCHIVE_FILE = 'archive.json'
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+class Metrics:
+    """Counters, gauges and histograms for one process, merged across workers on scrape.
+
+    Recording is an in-memory update under a lock. With a `directory`, a
+    background thread writes this process's values to ``<pid>.json`` every
+    `flush_interval` seconds and `collect()` adds up every worker's file,
+    so whichever gunicorn worker serves /metrics reports the whole
+    instance. The thread starts with the first value recorded in each
+    process; values recorded before a fork are dropped in the child.
+    """
+
+    def __init__(self, directory=None, flush_interval=5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        self._reset()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _instances.add(self)
+
+    def _reset(self):
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def _after_fork(self):
+        # The parent's lock may be held by a thread that does not exist
+        # here, and its values and flush thread are not this worker's
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        self._reset()
+
+    def inc(self, name, value=1, **labels):
+        if self._flusher_pid is None:
+            self._start_flusher()
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_gauge(self, name, delta, **labels):
+        if self._flusher_pid is None:
+            self._start_flusher()
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def set_gauge(self, name, value, **labels):
+        if self._flusher_pid is None:
+            self._start_flusher()
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        if self._flusher_pid is None:
+            self._start_flusher()
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts (not cumulative), then +Inf, then the sum
+                histogram = self._histograms[key] = [buckets, [0] * (len(buckets) + 1), 0.0]
+            histogram[1][bisect_left(histogram[0], value)] += 1
+            histogram[2] += value
+
+    @contextmanager
+    def timer(self, name, buckets=LATENCY_BUCKETS, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, buckets, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                'gauges': [[name, dict(labels), value] for (name, labels), value in self._gauges.items()],
+                'histograms': [
+                    [name, dict(labels), list(buckets), list(counts), total]
+                    for (name, labels), (buckets, counts, total) in self._histograms.items()
+                ]
+            }
+
+    def _start_flusher(self):
+        """Start this process's flush thread, once; `_after_fork` re-arms it."""
+        with self._lock:
+            if self._flusher_pid is not None:
+                return
+            self._flusher_pid = os.getpid()
+        if self.directory:
+            threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Failed to write metrics: {str(e)}")
+
+    def flush(self):
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temp_path, path)
+
+    def collect(self):
+        """Every worker's values added up; this process's are always current."""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            own = f'{os.getpid()}.json'
+            for name in os.listdir(self.directory):
+                if name.endswith('.json') and name != own:
+                    snapshot = _read_snapshot(os.path.join(self.directory, name))
+                    if snapshot:
+                        snapshots.append(snapshot)
+        return merge_snapshots(snapshots)
+
+    def render(self):
+        return render_prometheus(self.collect())
+
+# Every Metrics object, so a forked worker can reset them all
+_instances = weakref.WeakSet()
+
+def _reset_after_fork():
+    for metrics in list(_instances):
+        metrics._after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def merge_snapshots(snapshots):
+    counters = {}
+    gauges = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get('counters', []):
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot.get('gauges', []):
+            key = _key(name, labels)
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, buckets, counts, total in snapshot.get('histograms', []):
+            key = _key(name, labels)
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = [list(buckets), list(counts), total]
+            elif merged[0] == list(buckets):
+                merged[1] = [a + b for a, b in zip(merged[1], counts)]
+                merged[2] += total
+    return {
+        'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+        'gauges': [[name, dict(labels), value] for (name, labels), value in gauges.items()],
+        'histograms': [
+            [name, dict(labels), buckets, counts, total]
+            for (name, labels), (buckets, counts, total) in histograms.items()
+        ]
+    }
+
+def mark_process_dead(directory, pid):
+    """Fold a dead worker's counters and histograms into the archive; drop its gauges.
+
+    Keeps instance totals from going backwards when gunicorn replaces a worker.
+    """
+    path = os.path.join(directory, f'{pid}.json')
+    snapshot = _read_snapshot(path)
+    if snapshot is None:
+        return
+    with open(os.path.join(directory, 'archive.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        archive_path = os.path.join(directory, ARCHIVE_FILE)
+        archive = _read_snapshot(archive_path) or {}
+        merged = merge_snapshots([archive, snapshot])
+        merged['gauges'] = []
+        temp_path = f'{archive_path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(merged, f)
+        os.replace(temp_path, archive_path)
+        os.remove(path)
+
+def clear_directory(directory):
+    """Remove metrics left by a previous run of the server."""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(directory, name))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels, extra=None):
+    items = sorted(labels.items())
+    if extra:
+        items.append(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_prometheus(snapshot):
+    """Prometheus text exposition format for a (merged) snapshot."""
+    lines = []
+
+    def samples(kind, entries):
+        typed = set()
+        for entry in sorted(entries, key=lambda entry: (entry[0], sorted(entry[1].items()))):
+            name = entry[0]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+            yield entry
+
+    for name, labels, value in samples('counter', snapshot['counters']):
+        lines.append(f'{name}{_labels(labels)} {_number(value)}')
+    for name, labels, value in samples('gauge', snapshot['gauges']):
+        lines.append(f'{name}{_labels(labels)} {_number(value)}')
+    for name, labels, buckets, counts, total in samples('histogram', snapshot['histograms']):
+        cumulative = 0
+        for bound, count in zip(list(buckets) + [float('inf')], counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, ("le", _number(bound)))} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+        lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+def timed_queue_pool(metrics):
+    """QueuePool class that records how long checkouts wait for a connection."""
+    class TimedQueuePool(QueuePool):
+        def _do_get(self):
+            with metrics.timer('db_pool_checkout_seconds'):
+                return super()._do_get()
+    return TimedQueuePool
+
+def instrument_app(app, metrics):
+    """Record latency per route and SQL statements and time per request."""
+    def start_request():
+        g.metrics_start = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    def finish_request(error=None):
+        # A request context kept by the test client can outlive its app context
+        if not has_app_context():
+            return
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = g.pop('metrics_status', 500)
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - start,
+                        endpoint=endpoint, method=request.method)
+        metrics.inc('http_requests_total', endpoint=endpoint, method=request.method, status=str(status))
+        metrics.observe('http_request_sql_statements', g.pop('sql_statements', 0), COUNT_BUCKETS,
+                        endpoint=endpoint)
+        metrics.observe('http_request_sql_seconds', g.pop('sql_seconds', 0.0), endpoint=endpoint)
+
+    # First, so redirects from the login check are measured too
+    app.before_request_funcs.setdefault(None, []).insert(0, start_request)
+    app.after_request(record_status)
+    app.teardown_request(finish_request)
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_statement_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def finish_statement(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_statement_start'].pop()
+        metrics.inc('db_statements_total')
+        if has_app_context() and 'metrics_start' in g:
+            g.sql_statements += 1
+            g.sql_seconds += elapsed
+
+    @event.listens_for(Engine, 'handle_error')
+    def fail_statement(context):
+        starts = context.connection.info.get('metrics_statement_start') if context.connection else None
+        if starts:
+            starts.pop()
+
+def instrument_socketio(socketio, metrics):
+    """Time every emit, including the handler-level emit() helpers."""
+    emit = socketio.emit
+
+    @wraps(emit)
+    def timed_emit(event, *args, **kwargs):
+        with metrics.timer('socketio_emit_seconds', event=event):
+            return emit(event, *args, **kwargs)
+
+    socketio.emit = timed_emit
@@ -0,0 +1,205 @@
+"""Versioned schema migrations derived from models.py.
+
+    FLASK_APP=commands flask upgrade-db
+    FLASK_APP=commands flask schema-sql --dialect sqlite > schema.sql
+
+The schema is whatever models.py declares, compiled by SQLAlchemy for the
+database in use (SQL Server, SQLite, ...). Each migration runs once per
+database, in order, and is recorded in schema_migrations. To change the
+schema, edit models.py and append a migration: usually sync_models again,
+plus any data backfill the change needs.
+"""
+from collections import namedtuple
+from datetime import datetime
+import logging
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, Unicode, inspect, select, text
+from sqlalchemy.dialects import registry
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+from werkzeug.security import generate_password_hash
+
+from models import db, ConversationSummary, User
+
+logger = logging.getLogger(__name__)
+
+schema_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', schema_metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', Unicode(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+# `transactional=False` runs the migration in autocommit mode, for DDL that
+# the server refuses inside a transaction
+Migration = namedtuple('Migration', 'version description migrate transactional')
+
+def add_missing_columns(connection, table, existing):
+    """ALTER TABLE ... ADD every column of `table` not in `existing`."""
+    preparer = connection.dialect.identifier_preparer
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+        logger.info(f"Adding column {table.name}.{column.name}")
+        connection.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD {column_ddl}"))
+
+def sync_models(connection):
+    """Create the tables, columns and indexes in models.py that the database lacks.
+
+    Never drops or alters anything that already exists.
+    """
+    db.metadata.create_all(bind=connection, checkfirst=True)
+    inspector = inspect(connection)
+    for table in db.metadata.sorted_tables:
+        add_missing_columns(connection, table, {column['name'] for column in inspector.get_columns(table.name)})
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+def initial_schema(connection):
+    sync_models(connection)
+    # First deployment: create the admin account
+    if connection.execute(select(User.__table__.c.id).limit(1)).first() is None:
+        connection.execute(User.__table__.insert().values(
+            username='admin', password_hash=generate_password_hash('admin'), created_at=datetime.utcnow()
+        ))
+        logger.info("Admin user created successfully")
+
+def mssql_fulltext_index(connection):
+    """Full-text index for /search where SQL Server supports it.
+
+    Elsewhere search uses SQLite FTS5 or the message_terms table (see search.py).
+    SQL Server rejects CREATE FULLTEXT CATALOG/INDEX inside a user
+    transaction, so this migration is registered with transactional=False.
+    """
+    if connection.dialect.name != 'mssql':
+        return
+    connection.execute(text("""
+        IF FULLTEXTSERVICEPROPERTY('IsFullTextInstalled') = 1
+           AND NOT EXISTS (SELECT * FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID(N'messages'))
+        BEGIN
+            IF NOT EXISTS (SELECT * FROM sys.fulltext_catalogs WHERE name = 'chat_search')
+                CREATE FULLTEXT CATALOG chat_search;
+            DECLARE @pk SYSNAME = (
+                SELECT name FROM sys.indexes
+                WHERE object_id = OBJECT_ID(N'messages') AND is_primary_key = 1
+            );
+            EXEC('CREATE FULLTEXT INDEX ON messages (content) KEY INDEX ' + @pk
+                 + ' ON chat_search WITH CHANGE_TRACKING AUTO');
+        END
+    """))
+
+def fill_conversation_keys(connection):
+    """conversation_key for messages stored before the column existed."""
+    from backfill_conversation_keys import backfill_conversation_keys
+
+    with Session(bind=connection) as session:
+        updated = backfill_conversation_keys(session=session)
+    logger.info(f"Backfilled conversation_key for {updated} messages")
+
+def build_conversation_summaries(connection):
+    """Inbox rows and unread counts for messages stored before summaries existed.
+
+    Skipped when summaries already exist (e.g. built earlier with `flask
+    rebuild-inbox`), since a rebuild marks every conversation as read.
+    """
+    from inbox import rebuild_summaries
+
+    with Session(bind=connection) as session:
+        if session.query(ConversationSummary.username).first() is not None:
+            return
+        rebuilt = rebuild_summaries(session=session)
+    logger.info(f"Built {rebuilt} conversation summaries")
+
+def rekey_conversations(connection):
+    """Conversation keys joined with a separator usernames cannot contain."""
+    from backfill_conversation_keys import backfill_conversation_keys
+    from inbox import rekey_summaries
+
+    with Session(bind=connection) as session:
+        messages = backfill_conversation_keys(session=session, only_missing=False)
+        summaries = rekey_summaries(session=session)
+    logger.info(f"Rewrote conversation keys of {messages} messages and {summaries} summaries")
+
+def build_search_index(connection):
+    """Search index for messages stored before search existed.
+
+    The FTS5 table is otherwise only created along with the messages table.
+    """
+    from search import SearchIndex, create_search_table
+
+    create_search_table(connection)
+    with Session(bind=connection) as session:
+        indexed = SearchIndex().rebuild(session=session)
+    logger.info(f"Indexed {indexed} messages for search")
+
+MIGRATIONS = [
+    Migration(1, 'Tables, columns and indexes from models.py; admin user', initial_schema, True),
+    Migration(2, 'SQL Server full-text index on messages.content', mssql_fulltext_index, False),
+    Migration(3, 'Indexes for open and abandoned media uploads', sync_models, True),
+    Migration(4, 'Conversation keys for existing messages', fill_conversation_keys, True),
+    Migration(5, 'Conversation summaries for existing messages', build_conversation_summaries, True),
+    Migration(6, 'Unambiguous conversation keys', rekey_conversations, True),
+    Migration(7, 'Search index for existing messages', build_search_index, True),
+]
+
+def applied_versions(connection):
+    return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+def upgrade(engine=None, migrations=MIGRATIONS):
+    """Apply pending migrations in order; returns the versions applied."""
+    engine = engine or db.engine
+    schema_metadata.create_all(bind=engine, checkfirst=True)
+    with engine.connect() as connection:
+        done = applied_versions(connection)
+
+    applied = []
+    for migration in migrations:
+        if migration.version in done:
+            continue
+        logger.info(f"Applying migration {migration.version}: {migration.description}")
+        if migration.transactional:
+            with engine.begin() as connection:
+                migration.migrate(connection)
+                record_migration(connection, migration)
+        else:
+            with engine.connect() as connection:
+                migration.migrate(connection.execution_options(isolation_level='AUTOCOMMIT'))
+            with engine.begin() as connection:
+                record_migration(connection, migration)
+        applied.append(migration.version)
+    if not applied:
+        logger.info("Database schema is up to date")
+    return applied
+
+def record_migration(connection, migration):
+    connection.execute(schema_migrations.insert().values(
+        version=migration.version, description=migration.description, applied_at=datetime.utcnow()
+    ))
+
+def schema_sql(dialect_name='sqlite'):
+    """The DDL models.py compiles to for a dialect, as one script."""
+    dialect = registry.load(dialect_name)()
+    statements = []
+    for table in db.metadata.sorted_tables:
+        statements.append(CreateTable(table).compile(dialect=dialect))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            statements.append(CreateIndex(index).compile(dialect=dialect))
+    script = ';\n\n'.join('\n'.join(line.rstrip() for line in str(statement).strip().splitlines())
+                           for statement in statements)
+    return (f"-- {dialect.name} schema generated from models.py by `flask schema-sql`; do not edit.\n"
+            f"-- Databases are created and upgraded with `flask upgrade-db` (migrations.py).\n\n"
+            f"{script};\n")
+
+if __name__ == '__main__':
+    from commands import create_cli_app
+
+    logging.basicConfig(level=logging.INFO)
+    print("Upgrading database schema...")
+    with create_cli_app().app_context():
+        try:
+            applied = upgrade()
+            print(f"Applied migrations: {applied or 'none'}")
+        except Exception as e:
+            print(f"Error during upgrade: {str(e)}")
@@ -4,11 +4,38 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+# Joins the two usernames of a conversation key. /register rejects control
+# characters, so no username contains it and ('a|b', 'c') and ('a', 'b|c')
+# get different keys
+CONVERSATION_KEY_SEPARATOR = '\x1f'
+
+def conversation_key(user_a, user_b):
+    """Order-independent key identifying the conversation between two users."""
+    return CONVERSATION_KEY_SEPARATOR.join(sorted((user_a, user_b)))
+
+def conversation_filter(user_a, user_b):
+    """Messages between exactly these two users, in either direction.
+
+    The key lookup uses the conversation index; the sender/receiver pair
+    guards against usernames registered before the separator was rejected.
+    """
+    return db.and_(
+        Message.conversation_key == conversation_key(user_a, user_b),
+        db.or_(
+            db.and_(Message.sender_username == user_a, Message.receiver_username == user_b),
+            db.and_(Message.sender_username == user_b, Message.receiver_username == user_a)
+        )
+    )
+
+def _default_conversation_key(context):
+    params = context.get_current_parameters()
+    return conversation_key(params['sender_username'], params['receiver_username'])
+
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(256), nullable=False)
+    username = db.Column(db.Unicode(80), unique=True, nullable=False)
+    password_hash = db.Column(db.Unicode(256), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, password):
@@ -26,18 +53,41 @@ class User(db.Model):
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Serves keyset-paginated history lookups as a single range scan
+        db.Index('ix_messages_conversation_id', 'conversation_key', 'id'),
+        # Serve delta sync over every conversation a user takes part in
+        db.Index('ix_messages_sender_id', 'sender_username', 'id'),
+        db.Index('ix_messages_receiver_id', 'receiver_username', 'id'),
+        # Retried sends carry the same client id and must not insert twice
+        db.Index(
+            'ux_messages_sender_client_id', 'sender_username', 'client_message_id',
+            unique=True,
+            mssql_where=db.text('client_message_id IS NOT NULL')
+        ),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    sender_username = db.Column(db.String(80), db.ForeignKey('users.username'), nullable=False)
-    receiver_username = db.Column(db.String(80), db.ForeignKey('users.username'), nullable=False)
-    content = db.Column(db.Text)
+    sender_username = db.Column(db.Unicode(80), db.ForeignKey('users.username'), nullable=False)
+    receiver_username = db.Column(db.Unicode(80), db.ForeignKey('users.username'), nullable=False)
+    conversation_key = db.Column(db.Unicode(161), default=_default_conversation_key)
+    content = db.Column(db.UnicodeText)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     has_media = db.Column(db.Boolean, default=False)
-    media_type = db.Column(db.String(50))
-    media_url = db.Column(db.String(500))
-    media_filename = db.Column(db.String(255))
+    media_type = db.Column(db.Unicode(50))
+    media_url = db.Column(db.Unicode(500))
+    media_filename = db.Column(db.Unicode(255))
+    # Idempotency key chosen by the sending client
+    client_message_id = db.Column(db.Unicode(64))
+    # Stored media details (thumbnails, dimensions), loaded with the message
+    media_object = db.relationship(
+        'MediaObject',
+        primaryjoin='foreign(Message.media_filename) == MediaObject.filename',
+        viewonly=True,
+        lazy='joined'
+    )
 
     def to_dict(self):
-        return {
+        data = {
             'id': self.id,
             'sender': self.sender_username,
             'receiver': self.receiver_username,
@@ -46,5 +96,194 @@ class Message(db.Model):
             'has_media': self.has_media,
             'media_type': self.media_type,
             'media_url': self.media_url,
+            'media_filename': self.media_filename,
+            'client_id': self.client_message_id
+        }
+        if self.media_object is not None:
+            data.update(self.media_object.preview_dict())
+        return data
+
+class Room(db.Model):
+    __tablename__ = 'rooms'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.Unicode(100), unique=True, nullable=False)
+    is_private = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Only set for password-protected private rooms
+    password_hash = db.Column(db.Unicode(256))
+    created_by = db.Column(db.Unicode(80), db.ForeignKey('users.username'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Kept in step with room_members so listings never count rows
+    member_count = db.Column(db.Integer, nullable=False, default=0, server_default=db.text('0'))
+
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
+
+    def check_password(self, password):
+        return self.password_hash is not None and check_password_hash(self.password_hash, password)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'is_private': self.is_private,
+            'member_count': self.member_count,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class FavoriteRoom(db.Model):
+    __tablename__ = 'favorite_rooms'
+    __table_args__ = (
+        # Cascading room deletes look favorites up by room
+        db.Index('ix_favorite_rooms_room_id', 'room_id'),
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id', ondelete='CASCADE'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class RoomMember(db.Model):
+    __tablename__ = 'room_members'
+    __table_args__ = (
+        # "Which rooms is this user in", e.g. to subscribe their sockets
+        db.Index('ix_room_members_username', 'username', 'room_id'),
+    )
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id', ondelete='CASCADE'), primary_key=True)
+    username = db.Column(db.Unicode(80), db.ForeignKey('users.username'), primary_key=True)
+    role = db.Column(db.Unicode(20), nullable=False, default='member', server_default='member')
+    joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# A message to a group room: stored once, whatever the member count
+class RoomMessage(db.Model):
+    __tablename__ = 'room_messages'
+    __table_args__ = (
+        db.Index('ix_room_messages_room_id', 'room_id', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id', ondelete='CASCADE'), nullable=False)
+    sender_username = db.Column(db.Unicode(80), db.ForeignKey('users.username'), nullable=False)
+    content = db.Column(db.UnicodeText)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    has_media = db.Column(db.Boolean, default=False)
+    media_type = db.Column(db.Unicode(50))
+    media_url = db.Column(db.Unicode(500))
+    media_filename = db.Column(db.Unicode(255))
+    media_object = db.relationship(
+        'MediaObject',
+        primaryjoin='foreign(RoomMessage.media_filename) == MediaObject.filename',
+        viewonly=True,
+        lazy='joined'
+    )
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'room_id': self.room_id,
+            'sender': self.sender_username,
+            'content': self.content,
+            'timestamp': self.created_at.isoformat() if self.created_at else None,
+            'has_media': self.has_media,
+            'media_type': self.media_type,
+            'media_url': self.media_url,
+            'media_filename': self.media_filename
+        }
+        if self.media_object is not None:
+            data.update(self.media_object.preview_dict())
+        return data
+
+# Inverted index for message search on databases without native full-text
+# search: one row per distinct term of a message
+class MessageTerm(db.Model):
+    __tablename__ = 'message_terms'
+    term = db.Column(db.Unicode(64), primary_key=True)
+    message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), primary_key=True)
+
+# A resumable, chunked media upload; messages reference it once complete
+class MediaUpload(db.Model):
+    __tablename__ = 'media_uploads'
+    __table_args__ = (
+        # Per-user cap on open uploads, and expiry of abandoned ones
+        db.Index('ix_media_uploads_owner_status', 'owner_username', 'status', 'created_at'),
+        db.Index('ix_media_uploads_status_created', 'status', 'created_at'),
+    )
+    id = db.Column(db.Unicode(32), primary_key=True)
+    owner_username = db.Column(db.Unicode(80), db.ForeignKey('users.username'), nullable=False)
+    original_filename = db.Column(db.Unicode(255), nullable=False)
+    content_type = db.Column(db.Unicode(50))
+    total_size = db.Column(db.BigInteger, nullable=False)
+    status = db.Column(db.Unicode(20), nullable=False, default='pending', server_default='pending')
+    media_filename = db.Column(db.Unicode(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self, received_size=None):
+        return {
+            'upload_id': self.id,
+            'filename': self.original_filename,
+            'content_type': self.content_type,
+            'total_size': self.total_size,
+            'received_size': self.total_size if self.status == 'complete' else received_size,
+            'status': self.status,
+            'media_url': f'/uploads/{self.media_filename}' if self.media_filename else None,
             'media_filename': self.media_filename
-        }
\ No newline at end of file
+        }
+
+# Stored media keyed by content hash; identical files are kept once and
+# ref_count tracks how many messages point at them
+class MediaObject(db.Model):
+    __tablename__ = 'media_objects'
+    content_hash = db.Column(db.Unicode(64), primary_key=True)
+    filename = db.Column(db.Unicode(255), unique=True, nullable=False)
+    content_type = db.Column(db.Unicode(50))
+    size = db.Column(db.BigInteger)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default=db.text('0'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Image previews: None for non-images, then 'ready' or 'failed'
+    thumbnail_status = db.Column(db.Unicode(20))
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    thumbnail_width = db.Column(db.Integer)
+    thumbnail_height = db.Column(db.Integer)
+    # None while only on local disk, 'replicated' once copied to blob storage
+    blob_status = db.Column(db.Unicode(20))
+
+    def preview_dict(self):
+        # Dimensions are known from upload; thumbnails once the pipeline is done
+        data = {}
+        if self.width and self.height:
+            data['width'] = self.width
+            data['height'] = self.height
+        if self.thumbnail_status == 'ready':
+            base = f'/uploads/{self.content_hash}_thumb'
+            data['thumbnail_url'] = f'{base}.jpg'
+            data['thumbnail_webp_url'] = f'{base}.webp'
+            data['thumbnail_width'] = self.thumbnail_width
+            data['thumbnail_height'] = self.thumbnail_height
+        return data
+
+# One row per participant of a conversation, kept up to date as messages are
+# sent and read, so the inbox is a single indexed read
+class ConversationSummary(db.Model):
+    __tablename__ = 'conversation_summaries'
+    __table_args__ = (
+        db.Index('ix_conversation_summaries_user_last', 'username', 'last_message_id'),
+    )
+    username = db.Column(db.Unicode(80), db.ForeignKey('users.username'), primary_key=True)
+    conversation_key = db.Column(db.Unicode(161), primary_key=True)
+    partner_username = db.Column(db.Unicode(80), nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False)
+    last_sender_username = db.Column(db.Unicode(80))
+    last_preview = db.Column(db.Unicode(200))
+    last_message_at = db.Column(db.DateTime)
+    last_read_message_id = db.Column(db.Integer, nullable=False, default=0, server_default=db.text('0'))
+    unread_count = db.Column(db.Integer, nullable=False, default=0, server_default=db.text('0'))
+
+    def to_dict(self):
+        return {
+            'conversation_key': self.conversation_key,
+            'partner': self.partner_username,
+            'last_message_id': self.last_message_id,
+            'last_sender': self.last_sender_username,
+            'last_preview': self.last_preview,
+            'last_timestamp': self.last_message_at.isoformat() if self.last_message_at else None,
+            'last_read_message_id': self.last_read_message_id,
+            'unread_count': self.unread_count
+        }
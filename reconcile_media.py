@@ -0,0 +1,177 @@
+from config import blob_container_client, upload_folder
+from models import db, MediaObject, Message
+from sqlalchemy import or_
+import argparse
+import json
+import logging
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'reconcile_media.checkpoint')
+MISSING_MEDIA_CONTENT = "(Media no longer available - System Upgrade)"
+
+def list_blob_names(container_client):
+    """Return every blob name in the container with a single listing."""
+    if container_client is None:
+        logger.warning("Blob storage is not configured; checking local uploads only")
+        return set()
+    blob_names = {blob.name for blob in container_client.list_blobs()}
+    logger.info(f"Found {len(blob_names)} blobs in storage")
+    return blob_names
+
+def list_local_media(upload_folder):
+    if not os.path.isdir(upload_folder):
+        return set()
+    return {
+        name for name in os.listdir(upload_folder)
+        if os.path.isfile(os.path.join(upload_folder, name))
+    }
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_checkpoint(path, checkpoint):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, path)
+
+def message_fix(row, available):
+    """Return the update mapping that makes `row` match storage, or None."""
+    present = row.media_filename is not None and row.media_filename in available
+    if present and not row.has_media:
+        return {
+            'id': row.id,
+            'has_media': True,
+            'media_url': f'/uploads/{row.media_filename}',
+            'content': '' if row.content == MISSING_MEDIA_CONTENT else row.content
+        }
+    if not present and row.has_media:
+        return {
+            'id': row.id,
+            'has_media': False,
+            'media_url': None,
+            'content': MISSING_MEDIA_CONTENT
+        }
+    return None
+
+def reconcile_messages(available, checkpoint, checkpoint_path, batch_size=BATCH_SIZE, dry_run=False):
+    """Flag messages whose media is gone and restore ones whose media is back."""
+    last_id = checkpoint.get('message_id', 0)
+    fixed_count = 0
+    while True:
+        rows = db.session.query(
+            Message.id, Message.has_media, Message.media_filename, Message.content
+        ).filter(
+            or_(Message.media_filename.isnot(None), Message.has_media.is_(True)),
+            Message.id > last_id
+        ).order_by(Message.id.asc()).limit(batch_size).all()
+
+        if not rows:
+            break
+
+        fixes = [fix for fix in (message_fix(row, available) for row in rows) if fix]
+        if fixes and not dry_run:
+            try:
+                db.session.bulk_update_mappings(Message, fixes)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        last_id = rows[-1].id
+        fixed_count += len(fixes)
+        if not dry_run:
+            checkpoint['message_id'] = last_id
+            save_checkpoint(checkpoint_path, checkpoint)
+        logger.info(f"Checked messages up to id {last_id}, {fixed_count} fixed")
+
+    return fixed_count
+
+def reconcile_media_objects(blob_names, checkpoint, checkpoint_path, batch_size=BATCH_SIZE, dry_run=False):
+    """Make MediaObject.blob_status agree with what the container holds."""
+    last_hash = checkpoint.get('content_hash', '')
+    fixed_count = 0
+    while True:
+        rows = db.session.query(
+            MediaObject.content_hash, MediaObject.filename, MediaObject.blob_status
+        ).filter(
+            MediaObject.content_hash > last_hash
+        ).order_by(MediaObject.content_hash.asc()).limit(batch_size).all()
+
+        if not rows:
+            break
+
+        fixes = []
+        for row in rows:
+            blob_status = 'replicated' if row.filename in blob_names else None
+            if row.blob_status != blob_status:
+                fixes.append({'content_hash': row.content_hash, 'blob_status': blob_status})
+        if fixes and not dry_run:
+            try:
+                db.session.bulk_update_mappings(MediaObject, fixes)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        last_hash = rows[-1].content_hash
+        fixed_count += len(fixes)
+        if not dry_run:
+            checkpoint['content_hash'] = last_hash
+            save_checkpoint(checkpoint_path, checkpoint)
+
+    logger.info(f"Fixed blob status of {fixed_count} media objects")
+    return fixed_count
+
+def reconcile_media(container_client, upload_folder, checkpoint_path=CHECKPOINT_PATH,
+                    batch_size=BATCH_SIZE, dry_run=False, reset=False):
+    """Reconcile messages and media objects with storage, resuming from the last checkpoint."""
+    if reset and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint:
+        logger.info(f"Resuming from checkpoint {checkpoint}")
+
+    # Media is available if either this instance or the container has it
+    blob_names = list_blob_names(container_client)
+    available = blob_names | list_local_media(upload_folder)
+
+    messages_fixed = reconcile_messages(available, checkpoint, checkpoint_path, batch_size, dry_run)
+    # Without a container listing every object would look unreplicated
+    objects_fixed = 0
+    if container_client is not None:
+        objects_fixed = reconcile_media_objects(blob_names, checkpoint, checkpoint_path, batch_size, dry_run)
+
+    if not dry_run and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return messages_fixed, objects_fixed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile media messages with blob storage and local uploads.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH, help="Progress file used to resume an interrupted run")
+    parser.add_argument('--reset', action='store_true', help="Ignore any saved checkpoint and start over")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing")
+    args = parser.parse_args()
+
+    from commands import create_cli_app
+
+    print("Starting media reconciliation...")
+    with create_cli_app().app_context():
+        try:
+            messages_fixed, objects_fixed = reconcile_media(
+                blob_container_client(), upload_folder(), args.checkpoint,
+                args.batch_size, args.dry_run, args.reset
+            )
+            action = "Would fix" if args.dry_run else "Fixed"
+            print(f"{action} {messages_fixed} messages and {objects_fixed} media objects")
+        except Exception as e:
+            print(f"Error during reconciliation: {str(e)}")
@@ -1,6 +1,146 @@
-CREATE TABLE IF NOT EXISTS user_message_status (
-    user_id INTEGER PRIMARY KEY,
-    last_seen_message_id INTEGER,
-    FOREIGN KEY (user_id) REFERENCES users(id),
-    FOREIGN KEY (last_seen_message_id) REFERENCES private_messages(id)
-); 
\ No newline at end of file
+-- sqlite schema generated from models.py by `flask schema-sql`; do not edit.
+-- Databases are created and upgraded with `flask upgrade-db` (migrations.py).
+
+CREATE TABLE media_objects (
+	content_hash VARCHAR(64) NOT NULL,
+	filename VARCHAR(255) NOT NULL,
+	content_type VARCHAR(50),
+	size BIGINT,
+	ref_count INTEGER DEFAULT 0 NOT NULL,
+	created_at DATETIME,
+	thumbnail_status VARCHAR(20),
+	width INTEGER,
+	height INTEGER,
+	thumbnail_width INTEGER,
+	thumbnail_height INTEGER,
+	blob_status VARCHAR(20),
+	PRIMARY KEY (content_hash),
+	UNIQUE (filename)
+);
+
+CREATE TABLE users (
+	id INTEGER NOT NULL,
+	username VARCHAR(80) NOT NULL,
+	password_hash VARCHAR(256) NOT NULL,
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	UNIQUE (username)
+);
+
+CREATE TABLE conversation_summaries (
+	username VARCHAR(80) NOT NULL,
+	conversation_key VARCHAR(161) NOT NULL,
+	partner_username VARCHAR(80) NOT NULL,
+	last_message_id INTEGER NOT NULL,
+	last_sender_username VARCHAR(80),
+	last_preview VARCHAR(200),
+	last_message_at DATETIME,
+	last_read_message_id INTEGER DEFAULT 0 NOT NULL,
+	unread_count INTEGER DEFAULT 0 NOT NULL,
+	PRIMARY KEY (username, conversation_key),
+	FOREIGN KEY(username) REFERENCES users (username)
+);
+
+CREATE INDEX ix_conversation_summaries_user_last ON conversation_summaries (username, last_message_id);
+
+CREATE TABLE media_uploads (
+	id VARCHAR(32) NOT NULL,
+	owner_username VARCHAR(80) NOT NULL,
+	original_filename VARCHAR(255) NOT NULL,
+	content_type VARCHAR(50),
+	total_size BIGINT NOT NULL,
+	status VARCHAR(20) DEFAULT 'pending' NOT NULL,
+	media_filename VARCHAR(255),
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(owner_username) REFERENCES users (username)
+);
+
+CREATE INDEX ix_media_uploads_owner_status ON media_uploads (owner_username, status, created_at);
+
+CREATE INDEX ix_media_uploads_status_created ON media_uploads (status, created_at);
+
+CREATE TABLE messages (
+	id INTEGER NOT NULL,
+	sender_username VARCHAR(80) NOT NULL,
+	receiver_username VARCHAR(80) NOT NULL,
+	conversation_key VARCHAR(161),
+	content TEXT,
+	created_at DATETIME,
+	has_media BOOLEAN,
+	media_type VARCHAR(50),
+	media_url VARCHAR(500),
+	media_filename VARCHAR(255),
+	client_message_id VARCHAR(64),
+	PRIMARY KEY (id),
+	FOREIGN KEY(sender_username) REFERENCES users (username),
+	FOREIGN KEY(receiver_username) REFERENCES users (username)
+);
+
+CREATE INDEX ix_messages_conversation_id ON messages (conversation_key, id);
+
+CREATE INDEX ix_messages_receiver_id ON messages (receiver_username, id);
+
+CREATE INDEX ix_messages_sender_id ON messages (sender_username, id);
+
+CREATE UNIQUE INDEX ux_messages_sender_client_id ON messages (sender_username, client_message_id);
+
+CREATE TABLE rooms (
+	id INTEGER NOT NULL,
+	name VARCHAR(100) NOT NULL,
+	is_private BOOLEAN DEFAULT (0) NOT NULL,
+	password_hash VARCHAR(256),
+	created_by VARCHAR(80),
+	created_at DATETIME,
+	member_count INTEGER DEFAULT 0 NOT NULL,
+	PRIMARY KEY (id),
+	UNIQUE (name),
+	FOREIGN KEY(created_by) REFERENCES users (username)
+);
+
+CREATE TABLE favorite_rooms (
+	user_id INTEGER NOT NULL,
+	room_id INTEGER NOT NULL,
+	created_at DATETIME,
+	PRIMARY KEY (user_id, room_id),
+	FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE,
+	FOREIGN KEY(room_id) REFERENCES rooms (id) ON DELETE CASCADE
+);
+
+CREATE INDEX ix_favorite_rooms_room_id ON favorite_rooms (room_id);
+
+CREATE TABLE message_terms (
+	term VARCHAR(64) NOT NULL,
+	message_id INTEGER NOT NULL,
+	PRIMARY KEY (term, message_id),
+	FOREIGN KEY(message_id) REFERENCES messages (id)
+);
+
+CREATE TABLE room_members (
+	room_id INTEGER NOT NULL,
+	username VARCHAR(80) NOT NULL,
+	role VARCHAR(20) DEFAULT 'member' NOT NULL,
+	joined_at DATETIME,
+	PRIMARY KEY (room_id, username),
+	FOREIGN KEY(room_id) REFERENCES rooms (id) ON DELETE CASCADE,
+	FOREIGN KEY(username) REFERENCES users (username)
+);
+
+CREATE INDEX ix_room_members_username ON room_members (username, room_id);
+
+CREATE TABLE room_messages (
+	id INTEGER NOT NULL,
+	room_id INTEGER NOT NULL,
+	sender_username VARCHAR(80) NOT NULL,
+	content TEXT,
+	created_at DATETIME,
+	has_media BOOLEAN,
+	media_type VARCHAR(50),
+	media_url VARCHAR(500),
+	media_filename VARCHAR(255),
+	PRIMARY KEY (id),
+	FOREIGN KEY(room_id) REFERENCES rooms (id) ON DELETE CASCADE,
+	FOREIGN KEY(sender_username) REFERENCES users (username)
+);
+
+CREATE INDEX ix_room_messages_room_id ON room_messages (room_id, id);
@@ -0,0 +1,215 @@
+import logging
+import os
+import re
+
+from sqlalchemy import DDL, column, event, func, or_, table, text
+
+from models import db, Message, MessageTerm, conversation_filter
+
+logger = logging.getLogger(__name__)
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+BACKFILL_BATCH_SIZE = 1000
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# SQLite FTS5 index over message content; rowid is the message id
+fts_table = table('message_search', column('rowid'), column('message_search'))
+
+FTS5_TABLE_DDL = ("CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5("
+                  "content, tokenize='unicode61 remove_diacritics 2')")
+
+def _sqlite_has_fts5(ddl, target, bind, **kw):
+    options = [row[0] for row in bind.exec_driver_sql('PRAGMA compile_options')]
+    return 'ENABLE_FTS5' in options
+
+event.listen(
+    Message.__table__, 'after_create',
+    DDL(FTS5_TABLE_DDL).execute_if(dialect='sqlite', callable_=_sqlite_has_fts5)
+)
+event.listen(
+    Message.__table__, 'before_drop',
+    DDL("DROP TABLE IF EXISTS message_search").execute_if(dialect='sqlite')
+)
+
+def create_search_table(connection):
+    """Create the FTS5 table where SQLite supports it.
+
+    Databases whose messages table predates search never ran the
+    after_create hook above; migrations.py calls this for them.
+    """
+    if connection.dialect.name == 'sqlite' and _sqlite_has_fts5(None, None, connection):
+        connection.execute(text(FTS5_TABLE_DDL))
+
+def detect_backend(session, dialect):
+    """'fts5', 'mssql' or 'terms': the best index `session`'s database has."""
+    if dialect == 'sqlite':
+        exists = session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_search'"
+        )).first()
+        if exists:
+            return 'fts5'
+    elif dialect == 'mssql':
+        exists = session.execute(text(
+            "SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID(N'messages')"
+        )).first()
+        if exists:
+            return 'mssql'
+    return 'terms'
+
+def tokenize(content):
+    """Return the distinct lower-cased word terms of `content`, in order."""
+    terms = []
+    seen = set()
+    for token in _TOKEN_RE.findall((content or '').lower()):
+        term = token[:MAX_TERM_LENGTH]
+        if term not in seen:
+            seen.add(term)
+            terms.append(term)
+    return terms
+
+class SearchIndex:
+    """Message search over the best index the database offers.
+
+    - ``fts5``: SQLite FTS5 table, written on every insert.
+    - ``mssql``: SQL Server full-text index on messages.content, which the
+      server maintains itself (see migrations.py).
+    - ``terms``: the message_terms inverted index, written on every insert;
+      works on any database.
+
+    The backend is detected on first use unless SEARCH_BACKEND forces one.
+    """
+
+    def __init__(self, backend=None):
+        self.forced_backend = backend or os.getenv('SEARCH_BACKEND') or None
+        self._backends = {}
+
+    def backend(self):
+        if self.forced_backend:
+            return self.forced_backend
+        engine = db.engine
+        backend = self._backends.get(engine)
+        if backend is None:
+            # Through the session, so detection never touches another
+            # connection while the caller's transaction is open
+            backend = self._backends[engine] = detect_backend(db.session, engine.dialect.name)
+            logger.info(f"Message search uses the {backend} backend")
+        return backend
+
+    def index_message(self, message):
+        """Add a flushed message to the index; part of the caller's transaction."""
+        _index_messages(db.session, self.backend(), [message])
+
+    def search(self, username, query, partner=None, before_id=None, limit=20):
+        """Return (messages, next_cursor) matching every word of `query`, newest first.
+
+        Only conversations `username` takes part in are searched, or just the
+        one with `partner` when given. Pages are keyed on message id.
+        """
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return [], None
+
+        if partner:
+            scope = conversation_filter(username, partner)
+        else:
+            scope = or_(Message.sender_username == username, Message.receiver_username == username)
+
+        backend = self.backend()
+        if backend == 'fts5':
+            # Quoted terms so user input is never parsed as FTS5 query syntax
+            match = ' AND '.join(f'"{term}"' for term in terms)
+            q = Message.query.join(fts_table, fts_table.c.rowid == Message.id).filter(
+                fts_table.c.message_search.op('MATCH')(match)
+            )
+            order_column = fts_table.c.rowid
+        elif backend == 'mssql':
+            match = ' AND '.join(f'"{term}"' for term in terms)
+            q = Message.query.filter(text("CONTAINS(messages.content, :fts_query)").bindparams(fts_query=match))
+            order_column = Message.id
+        else:
+            matching = db.session.query(MessageTerm.message_id).filter(
+                MessageTerm.term.in_(terms)
+            ).group_by(MessageTerm.message_id).having(
+                func.count(MessageTerm.term) == len(terms)
+            ).subquery()
+            q = Message.query.join(matching, matching.c.message_id == Message.id)
+            order_column = Message.id
+
+        q = q.filter(scope)
+        if before_id is not None:
+            q = q.filter(order_column < before_id)
+        messages = q.order_by(order_column.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(messages) > limit:
+            messages = messages[:limit]
+            next_cursor = messages[-1].id
+        return messages, next_cursor
+
+    def rebuild(self, batch_size=BACKFILL_BATCH_SIZE, session=None):
+        """Index every existing message from scratch (a no-op for SQL Server).
+
+        Runs on db.session unless given another `session` (e.g. one bound to
+        a migration's connection).
+        """
+        if session is None:
+            session = db.session
+            backend = self.backend()
+        else:
+            backend = self.forced_backend or detect_backend(session, session.get_bind().dialect.name)
+        if backend == 'mssql':
+            return 0
+        if backend == 'fts5':
+            session.execute(text("DELETE FROM message_search"))
+        else:
+            session.query(MessageTerm).delete(synchronize_session=False)
+        session.commit()
+
+        indexed = 0
+        last_id = 0
+        while True:
+            rows = session.query(Message.id, Message.content).filter(
+                Message.id > last_id
+            ).order_by(Message.id.asc()).limit(batch_size).all()
+            if not rows:
+                break
+            try:
+                _index_messages(session, backend, rows)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            last_id = rows[-1].id
+            indexed += len(rows)
+            logger.info(f"Indexed {indexed} messages (up to id {last_id})")
+        return indexed
+
+def _index_messages(session, backend, messages):
+    messages = [message for message in messages if message.content]
+    if backend == 'mssql' or not messages:
+        return
+    if backend == 'fts5':
+        session.execute(
+            text("INSERT INTO message_search (rowid, content) VALUES (:id, :content)"),
+            [{'id': message.id, 'content': message.content} for message in messages]
+        )
+    else:
+        session.bulk_insert_mappings(MessageTerm, [
+            {'term': term, 'message_id': message.id}
+            for message in messages for term in tokenize(message.content)
+        ])
+
+if __name__ == '__main__':
+    from commands import create_cli_app
+
+    logging.basicConfig(level=logging.INFO)
+    print("Rebuilding message search index...")
+    search_index = SearchIndex()
+    with create_cli_app().app_context():
+        try:
+            indexed = search_index.rebuild()
+            print(f"Successfully indexed {indexed} messages with the {search_index.backend()} backend")
+        except Exception as e:
+            print(f"Error during rebuild: {str(e)}")
@@ -0,0 +1,170 @@
+import json
+from datetime import date, datetime
+
+from flask import current_app
+
+from models import db, Message, MediaObject, RoomMessage
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, RawJSON):
+        return json.loads(value.data)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value):
+    """Encode `value` to UTF-8 JSON bytes; datetimes become ISO 8601 strings."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class RawJSON:
+    """An already encoded JSON value that is spliced into output as is.
+
+    Encode a payload once, then hand the same object to the HTTP response
+    and to every Socket.IO emit instead of re-encoding the dict each time.
+    Plain data, so it also pickles through the Socket.IO message queue.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self._text = None
+
+    @classmethod
+    def encode(cls, value):
+        return cls(dumps(value))
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.data.decode('utf-8')
+        return self._text
+
+class SocketJSON:
+    """json module for python-socketio that emits RawJSON arguments verbatim.
+
+    Packets are encoded once per recipient; with a RawJSON payload that is
+    a string join instead of a full encode.
+    """
+
+    @staticmethod
+    def dumps(value, **kwargs):
+        if isinstance(value, list) and any(isinstance(item, RawJSON) for item in value):
+            return '[' + ','.join(
+                item.text if isinstance(item, RawJSON) else json.dumps(item, default=_default, **kwargs)
+                for item in value
+            ) + ']'
+        return json.dumps(value, default=_default, **kwargs)
+
+    @staticmethod
+    def loads(value, **kwargs):
+        return json.loads(value, **kwargs)
+
+def json_response(payload, **raw_fields):
+    """Build a JSON response from `payload` plus already encoded RawJSON fields."""
+    body = dumps(payload)
+    if raw_fields:
+        parts = [body[:-1]]
+        separator = b',' if payload else b''
+        for key, raw in raw_fields.items():
+            parts.append(separator + dumps(key) + b':' + raw.data)
+            separator = b','
+        parts.append(b'}')
+        body = b''.join(parts)
+    return current_app.response_class(body, mimetype='application/json')
+
+# Columns needed to serialize a message without building ORM instances,
+# including the preview fields of its stored media
+_MEDIA_COLUMNS = (
+    MediaObject.content_hash,
+    MediaObject.thumbnail_status,
+    MediaObject.width,
+    MediaObject.height,
+    MediaObject.thumbnail_width,
+    MediaObject.thumbnail_height,
+)
+
+MESSAGE_COLUMNS = (
+    Message.id,
+    Message.sender_username,
+    Message.receiver_username,
+    Message.content,
+    Message.created_at,
+    Message.has_media,
+    Message.media_type,
+    Message.media_url,
+    Message.media_filename,
+    Message.client_message_id,
+) + _MEDIA_COLUMNS
+
+ROOM_MESSAGE_COLUMNS = (
+    RoomMessage.id,
+    RoomMessage.room_id,
+    RoomMessage.sender_username,
+    RoomMessage.content,
+    RoomMessage.created_at,
+    RoomMessage.has_media,
+    RoomMessage.media_type,
+    RoomMessage.media_url,
+    RoomMessage.media_filename,
+) + _MEDIA_COLUMNS
+
+def message_rows():
+    """Query over message rows as plain tuples; filter and order it like Message.query."""
+    return db.session.query(*MESSAGE_COLUMNS).outerjoin(
+        MediaObject, MediaObject.filename == Message.media_filename
+    )
+
+def room_message_rows():
+    return db.session.query(*ROOM_MESSAGE_COLUMNS).outerjoin(
+        MediaObject, MediaObject.filename == RoomMessage.media_filename
+    )
+
+def _add_preview(data, row):
+    if row.width and row.height:
+        data['width'] = row.width
+        data['height'] = row.height
+    if row.thumbnail_status == 'ready':
+        base = f'/uploads/{row.content_hash}_thumb'
+        data['thumbnail_url'] = f'{base}.jpg'
+        data['thumbnail_webp_url'] = f'{base}.webp'
+        data['thumbnail_width'] = row.thumbnail_width
+        data['thumbnail_height'] = row.thumbnail_height
+    return data
+
+def message_row_dict(row):
+    """Same shape as Message.to_dict(), built from a `message_rows()` tuple.
+
+    `timestamp` is left as a datetime; `dumps` encodes it.
+    """
+    return _add_preview({
+        'id': row.id,
+        'sender': row.sender_username,
+        'receiver': row.receiver_username,
+        'content': row.content,
+        'timestamp': row.created_at,
+        'has_media': row.has_media,
+        'media_type': row.media_type,
+        'media_url': row.media_url,
+        'media_filename': row.media_filename,
+        'client_id': row.client_message_id
+    }, row)
+
+def room_message_row_dict(row):
+    """Same shape as RoomMessage.to_dict(), built from a `room_message_rows()` tuple."""
+    return _add_preview({
+        'id': row.id,
+        'room_id': row.room_id,
+        'sender': row.sender_username,
+        'content': row.content,
+        'timestamp': row.created_at,
+        'has_media': row.has_media,
+        'media_type': row.media_type,
+        'media_url': row.media_url,
+        'media_filename': row.media_filename
+    }, row)
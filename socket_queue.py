@@ -0,0 +1,260 @@
+import logging
+import os
+import pickle
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import socketio
+from socketio.pubsub_manager import PubSubManager
+
+logger = logging.getLogger(__name__)
+
+# Frames are a 4-byte big-endian length followed by a pickled payload.
+# A client announces its role with a single byte right after connecting.
+_HEADER = struct.Struct('!I')
+SUBSCRIBE = b'S'
+PUBLISH = b'P'
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("Broker connection closed")
+        buf += chunk
+    return bytes(buf)
+
+def _send_frame(sock, payload):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+def _recv_frame(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return _recv_exact(sock, size)
+
+class UnixSocketBroker:
+    """Relay every published frame to all subscribers over a Unix domain socket.
+
+    This is the local stand-in for Redis: good enough for the workers of a
+    single host and for tests, with no persistence and no delivery
+    guarantees for subscribers that are not connected.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                broker._handle(self.request)
+
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Socket.IO broker listening on {self.path}")
+        return self
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _handle(self, conn):
+        try:
+            role = _recv_exact(conn, 1)
+        except (ConnectionError, OSError):
+            return
+
+        if role == SUBSCRIBE:
+            with self._lock:
+                self._subscribers[conn] = threading.Lock()
+            try:
+                # Subscribers never send anything; wait for them to hang up
+                while conn.recv(1):
+                    pass
+            except OSError:
+                pass
+            finally:
+                with self._lock:
+                    self._subscribers.pop(conn, None)
+        elif role == PUBLISH:
+            try:
+                while True:
+                    self._relay(_recv_frame(conn))
+            except (ConnectionError, OSError):
+                pass
+
+    def _relay(self, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for conn, send_lock in subscribers:
+            try:
+                with send_lock:
+                    _send_frame(conn, payload)
+            except OSError:
+                with self._lock:
+                    self._subscribers.pop(conn, None)
+
+# Published like an emit so every manager class relays it, but handled by
+# the servers (see RoomMoveMixin) instead of being sent to clients
+ROOM_MOVE_EVENT = '__room_move__'
+
+def move_local_sockets(manager, action, members_room, room, namespace='/'):
+    """Make every socket of this process in `members_room` enter or leave `room`."""
+    try:
+        participants = list(manager.get_participants(namespace, members_room))
+    except KeyError:
+        # No socket has connected to this namespace here yet
+        return
+    for sid, _ in participants:
+        if action == 'enter':
+            manager.enter_room(sid, namespace, room)
+        else:
+            manager.leave_room(sid, namespace, room)
+
+class RoomMoveMixin:
+    """Message queue managers that can move sockets between rooms on every server.
+
+    python-socketio only shares emits, disconnects and close_room through
+    the queue; joining or leaving a room is local to the server holding
+    the socket. move_sockets() publishes the change so each server applies
+    it to its own sockets.
+    """
+
+    def move_sockets(self, action, members_room, room, namespace='/'):
+        self._publish({'method': 'emit', 'event': ROOM_MOVE_EVENT, 'data': [action, room],
+                       'namespace': namespace, 'room': members_room,
+                       'skip_sid': None, 'callback': None, 'host_id': self.host_id})
+
+    def _handle_emit(self, message):
+        if message.get('event') == ROOM_MOVE_EVENT:
+            action, room = message['data']
+            move_local_sockets(self, action, message['room'], room, message.get('namespace') or '/')
+            return
+        super()._handle_emit(message)
+
+def move_sockets(server, action, members_room, room, namespace='/'):
+    """Make every socket in `members_room` (e.g. a user's own room) enter or leave `room`.
+
+    Reaches the sockets of every worker when a message queue is configured.
+    """
+    manager = server.manager
+    if isinstance(manager, RoomMoveMixin):
+        manager.move_sockets(action, members_room, room, namespace)
+    else:
+        move_local_sockets(manager, action, members_room, room, namespace)
+
+class UnixSocketManager(RoomMoveMixin, PubSubManager):
+    """Socket.IO client manager that shares emits through a UnixSocketBroker.
+
+    :param url: The broker socket, as ``unix:///path/to/broker.sock``.
+    :param channel: Messages published on other channels are ignored.
+    """
+    name = 'unix'
+
+    def __init__(self, url, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = url[len('unix://'):] if url.startswith('unix://') else url
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def _connect(self, role):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            sock.sendall(role)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _publish(self, data):
+        payload = pickle.dumps({'channel': self.channel, 'data': data})
+        with self._publish_lock:
+            # One reconnect attempt covers a broker restart since the last emit
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect(PUBLISH)
+                    _send_frame(self._publisher, payload)
+                    return
+                except OSError:
+                    if self._publisher is not None:
+                        self._publisher.close()
+                        self._publisher = None
+                    if attempt:
+                        self._get_logger().error(f"Cannot publish to broker at {self.path}")
+                        raise
+
+    def _listen(self):
+        retry_sleep = 1
+        while True:
+            try:
+                sock = self._connect(SUBSCRIBE)
+                retry_sleep = 1
+                try:
+                    while True:
+                        message = pickle.loads(_recv_frame(sock))
+                        if message.get('channel') == self.channel:
+                            yield message['data']
+                finally:
+                    sock.close()
+            except (ConnectionError, OSError):
+                self._get_logger().error(
+                    f"Cannot receive from broker at {self.path}, retrying in {retry_sleep} secs")
+                time.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+
+def socketio_queue_options(url):
+    """Return the SocketIO keyword arguments for the message queue at `url`.
+
+    ``unix://`` URLs use the built-in broker; anything else (``redis://``,
+    ``amqp://``, ...) gets the manager Flask-SocketIO would pick for its
+    message_queue, with RoomMoveMixin added. No URL means emits only
+    reach clients of the current process.
+    """
+    if not url:
+        return {}
+    if url.startswith('unix://'):
+        return {'client_manager': UnixSocketManager(url)}
+    if url.startswith(('redis://', 'rediss://')):
+        queue_class = socketio.RedisManager
+    elif url.startswith('kafka://'):
+        queue_class = socketio.KafkaManager
+    elif url.startswith('zmq'):
+        queue_class = socketio.ZmqManager
+    else:
+        queue_class = socketio.KombuManager
+    manager_class = type(f'RoomMove{queue_class.__name__}', (RoomMoveMixin, queue_class), {})
+    return {'client_manager': manager_class(url, channel='flask-socketio')}
+
+if __name__ == '__main__':
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    path = sys.argv[1] if len(sys.argv) > 1 else '/tmp/chat-socketio.sock'
+    UnixSocketBroker(path).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,54 @@
+import logging
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_installed = False
+
+def is_memory_database(uri):
+    return ':memory:' in uri or 'mode=memory' in uri or uri.rstrip('/') in ('sqlite:', 'sqlite+pysqlite:')
+
+def sqlite_pragmas(environ=os.environ):
+    """PRAGMA name/value pairs for every new SQLite connection.
+
+    - ``journal_mode=WAL``: readers never block the writer or each other,
+      so web workers keep serving history while a message is committed.
+    - ``synchronous=NORMAL``: with WAL, fsync only at checkpoints; a power
+      loss can drop the last commits but never corrupts the database.
+    - ``mmap_size``: read pages through the OS page cache instead of
+      copying them into SQLite's own cache.
+    - ``busy_timeout``: wait this many milliseconds for another
+      connection's write lock instead of failing with "database is locked".
+    """
+    return [
+        ('journal_mode', environ.get('SQLITE_JOURNAL_MODE', 'WAL')),
+        ('synchronous', environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('mmap_size', int(environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+        ('busy_timeout', int(environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+        ('temp_store', 'MEMORY'),
+    ]
+
+def install_sqlite_pragmas(environ=os.environ):
+    """Apply sqlite_pragmas() on every SQLite connection; safe to call twice."""
+    global _installed
+    if _installed:
+        return
+    pragmas = sqlite_pragmas(environ)
+
+    @event.listens_for(Engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    _installed = True
+    logger.info("SQLite connections will use %s", ', '.join(f"{name}={value}" for name, value in pragmas))
@@ -15,4 +15,5 @@ echo 'export PATH="$PATH:/opt/mssql-tools/bin"' >> ~/.bashrc
 
 # Start the Python application
 cd /home/site/wwwroot
-gunicorn --bind=0.0.0.0:8000 --timeout=600 app:app 
\ No newline at end of file
+python commands.py upgrade-db
+gunicorn --bind=0.0.0.0:8000 --timeout=600 'app:create_app()' 
\ No newline at end of file
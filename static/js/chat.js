@@ -6,6 +6,9 @@ function openPrivateChat(username) {
     }
 
     let chatWindow = document.querySelector(`#chat-${username}`);
+    if (document.visibilityState === 'visible') {
+        markConversationRead(username);
+    }
     if (!chatWindow) {
         chatWindow = document.createElement('div');
         chatWindow.id = `chat-${username}`;
@@ -40,6 +43,9 @@ function openPrivateChat(username) {
         `;
         document.body.appendChild(chatWindow);
 
+        const messageList = chatWindow.querySelector(`#private-messages-${username}`);
+        messageList.addEventListener('scroll', () => handleHistoryScroll(username));
+
         setTimeout(() => {
             loadChatHistory(username);
             forceScrollToBottom(username);
@@ -83,6 +89,26 @@ function handleMessageInputKeydown(event, username) {
 }
 
 // Message handling
+const SEND_MAX_RETRIES = 3;
+
+function newClientMessageId() {
+    if (window.crypto?.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+// Retrying is safe: the server answers a repeated client_id with the original message
+async function postMessageWithRetry(formData) {
+    for (let attempt = 0; ; attempt++) {
+        try {
+            const response = await fetch('/send_message', { method: 'POST', body: formData });
+            if (response.status < 500 || attempt >= SEND_MAX_RETRIES) return response;
+        } catch (error) {
+            if (attempt >= SEND_MAX_RETRIES) throw error;
+        }
+        await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+    }
+}
+
 function sendPrivateMessage(username) {
     const chatWindow = document.querySelector(`#chat-${username}`);
     if (!chatWindow) return;
@@ -93,9 +119,11 @@ function sendPrivateMessage(username) {
     
     if (!input.value.trim() && !file) return;
 
+    const clientId = newClientMessageId();
     let tempId;
     try {
         const tempMessage = {
+            client_id: clientId,
             content: input.value.trim(),
             sender: currentUsername,
             receiver: username,
@@ -116,14 +144,19 @@ function sendPrivateMessage(username) {
         console.error('Error creating temporary message:', error);
     }
     
-    const formData = new FormData();
-    formData.append('receiver', username);
-    if (input.value.trim()) formData.append('content', input.value.trim());
-    if (file) formData.append('media', file);
-    
-    fetch('/send_message', {
-        method: 'POST',
-        body: formData
+    // Media goes up first through the chunked upload API; the message only references it
+    const content = input.value.trim();
+    const mediaUpload = file ? uploadFileInChunks(file) : Promise.resolve(null);
+
+    mediaUpload
+    .then(upload => {
+        const formData = new FormData();
+        formData.append('receiver', username);
+        if (content) formData.append('content', content);
+        if (upload) formData.append('upload_id', upload.upload_id);
+        formData.append('client_id', clientId);
+
+        return postMessageWithRetry(formData);
     })
     .then(response => {
         if (!response.ok) throw new Error('Network response was not ok');
@@ -0,0 +1,108 @@
+// Inbox: conversation list with unread counts, kept current from socket events
+function createConversationRow(conversation) {
+    const row = document.createElement('div');
+    row.className = 'conversation-row flex items-center justify-between p-2 hover:bg-gray-50 rounded cursor-pointer';
+    row.dataset.partner = conversation.partner;
+    row.dataset.lastMessageId = conversation.last_message_id;
+    row.onclick = () => openPrivateChat(conversation.partner);
+
+    const text = document.createElement('div');
+    text.className = 'min-w-0';
+    const name = document.createElement('div');
+    name.className = 'text-gray-800 font-medium';
+    name.textContent = conversation.partner;
+    const preview = document.createElement('div');
+    preview.className = 'conversation-preview text-sm text-gray-500 truncate';
+    preview.textContent = conversation.last_preview || '';
+    text.appendChild(name);
+    text.appendChild(preview);
+
+    const badge = document.createElement('span');
+    badge.className = 'unread-badge bg-blue-500 text-white text-xs rounded-full px-2 py-0.5';
+
+    row.appendChild(text);
+    row.appendChild(badge);
+    setUnreadCount(row, conversation.unread_count);
+    return row;
+}
+
+function setUnreadCount(row, count) {
+    const badge = row.querySelector('.unread-badge');
+    row.dataset.unreadCount = count;
+    badge.textContent = count;
+    badge.classList.toggle('hidden', !count);
+}
+
+function getConversationRow(partner) {
+    return document.querySelector(`#inbox-list .conversation-row[data-partner="${CSS.escape(partner)}"]`);
+}
+
+function isChatVisible(username) {
+    const chatWindow = document.querySelector(`#chat-${username}`);
+    return Boolean(chatWindow) && !chatWindow.classList.contains('minimized')
+        && document.visibilityState === 'visible';
+}
+
+function updateInboxFromMessage(message) {
+    const inboxList = document.getElementById('inbox-list');
+    if (!inboxList) return;
+
+    const isOutgoing = message.sender === currentUsername;
+    const partner = isOutgoing ? message.receiver : message.sender;
+    let row = getConversationRow(partner);
+    if (row && Number(row.dataset.lastMessageId) >= message.id) return;
+
+    const preview = message.content || (message.media_type ? `[${message.media_type.split('/')[0]}]` : '');
+    if (!row) {
+        row = createConversationRow({ partner, last_message_id: message.id, last_preview: preview, unread_count: 0 });
+    } else {
+        row.dataset.lastMessageId = message.id;
+        row.querySelector('.conversation-preview').textContent = preview;
+    }
+    inboxList.prepend(row);
+    document.getElementById('inbox-empty')?.classList.add('hidden');
+
+    if (isOutgoing) {
+        setUnreadCount(row, 0);
+    } else if (isChatVisible(partner)) {
+        markConversationRead(partner, message.id);
+    } else {
+        setUnreadCount(row, Number(row.dataset.unreadCount || 0) + 1);
+    }
+}
+
+function markConversationRead(username, messageId) {
+    const row = getConversationRow(username);
+    if (row && !Number(row.dataset.unreadCount) && messageId === undefined) return;
+
+    fetch(`/inbox/${encodeURIComponent(username)}/read`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(messageId === undefined ? {} : { message_id: messageId })
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) applyConversationRead(data.conversation);
+        })
+        .catch(error => console.error('Error marking conversation read:', error));
+}
+
+function applyConversationRead(conversation) {
+    const row = getConversationRow(conversation.partner);
+    if (row) setUnreadCount(row, conversation.unread_count);
+}
+
+// Catch up on conversations left open while the tab was hidden
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState !== 'visible') return;
+    document.querySelectorAll('#inbox-list .conversation-row').forEach(row => {
+        if (Number(row.dataset.unreadCount) && isChatVisible(row.dataset.partner)) {
+            markConversationRead(row.dataset.partner);
+        }
+    });
+});
+
+// Export functions that need to be globally available
+window.updateInboxFromMessage = updateInboxFromMessage;
+window.markConversationRead = markConversationRead;
+window.applyConversationRead = applyConversationRead;
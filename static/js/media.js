@@ -1,3 +1,8 @@
+// Upload limits (keep in sync with MAX_UPLOAD_SIZE in app.py)
+const MAX_UPLOAD_SIZE = 512 * 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 3;
+const UPLOAD_RESUME_PREFIX = 'chat_upload_';
+
 // Image modal functions
 function openImageModal(imageUrl) {
     const modal = document.getElementById('imageModal');
@@ -26,8 +31,8 @@ function handlePrivateFileSelect(username, event) {
     const file = event.target.files[0];
     if (!file) return;
 
-    if (file.size > 10 * 1024 * 1024) { // 10MB limit
-        alert('File size must be less than 10MB');
+    if (file.size > MAX_UPLOAD_SIZE) {
+        alert('File size must be less than 512MB');
         event.target.value = '';
         return;
     }
@@ -76,6 +81,73 @@ function preloadImage(url) {
     });
 }
 
+// Chunked, resumable uploads
+function fetchJson(url, options) {
+    return fetch(url, options)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) throw new Error(data.error || 'Request failed');
+            return data;
+        });
+}
+
+function resumeUploadSession(uploadId) {
+    if (!uploadId) return Promise.resolve(null);
+    return fetchJson(`/upload-sessions/${uploadId}`).catch(() => null);
+}
+
+function startUploadSession(file) {
+    const formData = new FormData();
+    formData.append('filename', file.name);
+    formData.append('content_type', file.type);
+    formData.append('size', file.size);
+    return fetchJson('/upload-sessions', { method: 'POST', body: formData });
+}
+
+// Upload `file` chunk by chunk and resolve with the finished upload record.
+// An interrupted upload of the same file resumes where the server left off.
+async function uploadFileInChunks(file, onProgress) {
+    const resumeKey = `${UPLOAD_RESUME_PREFIX}${currentUsername}_${file.name}_${file.size}_${file.lastModified}`;
+    const session = await resumeUploadSession(localStorage.getItem(resumeKey)) || await startUploadSession(file);
+    localStorage.setItem(resumeKey, session.upload.upload_id);
+
+    let upload = session.upload;
+    let offset = upload.received_size || 0;
+    let retries = 0;
+
+    while (upload.status === 'pending' && offset < file.size) {
+        try {
+            const chunk = file.slice(offset, offset + session.chunk_size);
+            const response = await fetch(`/upload-sessions/${upload.upload_id}?offset=${offset}`, {
+                method: 'PUT',
+                body: chunk
+            });
+            const data = await response.json();
+            if (!data.success && !data.upload) throw new Error(data.error || 'Upload failed');
+
+            // On an offset mismatch the server reports where to continue from
+            offset = data.upload.received_size;
+            if (data.success) {
+                retries = 0;
+                if (onProgress) onProgress(offset / file.size);
+                continue;
+            }
+            throw new Error(data.error);
+        } catch (error) {
+            if (++retries > UPLOAD_MAX_RETRIES) throw error;
+            await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+            const status = await resumeUploadSession(upload.upload_id);
+            if (status) offset = status.upload.received_size;
+        }
+    }
+
+    if (upload.status !== 'complete') {
+        upload = (await fetchJson(`/upload-sessions/${upload.upload_id}/finalize`, { method: 'POST' })).upload;
+    }
+    localStorage.removeItem(resumeKey);
+    return upload;
+}
+
 // Initialize modal event listeners
 document.addEventListener('DOMContentLoaded', () => {
     const modal = document.getElementById('imageModal');
@@ -92,4 +164,5 @@ document.addEventListener('DOMContentLoaded', () => {
 window.openImageModal = openImageModal;
 window.closeImageModal = closeImageModal;
 window.handlePrivateFileSelect = handlePrivateFileSelect;
-window.preloadImage = preloadImage; 
\ No newline at end of file
+window.preloadImage = preloadImage;
+window.uploadFileInChunks = uploadFileInChunks; 
\ No newline at end of file
@@ -27,6 +27,9 @@ function appendPrivateMessage(username, message, isOutgoing, timestamp = getCurr
     messageDiv.className = `message ${isOutgoing ? 'outgoing' : 'incoming'}`;
     messageDiv.dataset.timestamp = parsedTimestamp.toISOString();
     messageDiv.dataset.messageId = messageId;
+    if (message.client_id) {
+        messageDiv.dataset.clientId = message.client_id;
+    }
     
     if (message.status === 'sending') {
         messageDiv.classList.add('temp-message');
@@ -42,7 +45,7 @@ function appendPrivateMessage(username, message, isOutgoing, timestamp = getCurr
             }
             
             if (message.media_type && message.media_type.startsWith('image/')) {
-                content = createImageContent(mediaUrl, username);
+                content = createImageContent(mediaUrl, username, message);
             } else if (message.media_type && message.media_type.startsWith('video/')) {
                 content = createVideoContent(mediaUrl, message.media_type, username);
             } else {
@@ -74,17 +77,30 @@ function appendPrivateMessage(username, message, isOutgoing, timestamp = getCurr
     return messageId;
 }
 
-function createImageContent(mediaUrl, username) {
-    return `
-        <div class="message-image-container">
-            <div class="image-loader"></div>
-            <img src="${mediaUrl}" 
+function createImageContent(mediaUrl, username, message = {}) {
+    // Inline previews use the server-side thumbnail; the full image only loads in the modal
+    const previewUrl = message.thumbnail_url || mediaUrl;
+    // Reserve the layout space before the image loads; the original's
+    // dimensions are known even while the thumbnail is still being made
+    const width = message.thumbnail_url ? message.thumbnail_width : message.width;
+    const height = message.thumbnail_url ? message.thumbnail_height : message.height;
+    const sizeAttributes = width && height ? `width="${width}" height="${height}"` : '';
+    const img = `<img src="${previewUrl}" 
+                ${sizeAttributes}
                 alt="Image" 
                 class="max-w-full h-auto rounded cursor-pointer hover:opacity-90" 
                 style="opacity: 0;"
                 onclick="openImageModal('${mediaUrl}')"
                 onload="handleImageLoad(this, '${username}')"
-                onerror="handleImageError(this)">
+                onerror="handleImageError(this)">`;
+    const preview = message.thumbnail_webp_url
+        ? `<picture><source srcset="${message.thumbnail_webp_url}" type="image/webp">${img}</picture>`
+        : img;
+
+    return `
+        <div class="message-image-container">
+            <div class="image-loader"></div>
+            ${preview}
         </div>`;
 }
 
@@ -102,7 +118,7 @@ function createFileContent(mediaUrl, filename) {
 }
 
 function handleImageLoad(img, username) {
-    const loader = img.parentElement.querySelector('.image-loader');
+    const loader = img.closest('.message-image-container')?.querySelector('.image-loader');
     if (loader) {
         loader.remove();
     }
@@ -176,7 +192,7 @@ function updateImageElement(imgElement, mediaUrl, username) {
     if (container && !container.querySelector('.image-loader')) {
         const loader = document.createElement('div');
         loader.className = 'image-loader';
-        container.insertBefore(loader, imgElement);
+        container.insertBefore(loader, imgElement.closest('picture') || imgElement);
     }
     
     imgElement.style.opacity = '0';
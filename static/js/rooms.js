@@ -0,0 +1,37 @@
+// Group room membership. The server moves every open socket of the user in
+// or out of the room; these handlers keep this tab's view in step and
+// re-send the subscription in case a socket reconnected meanwhile.
+
+function joinGroupRoom(roomId, password) {
+    const formData = new FormData();
+    if (password) formData.append('password', password);
+
+    return fetch(`/rooms/${roomId}/join`, { method: 'POST', body: formData })
+        .then(response => response.json())
+        .catch(error => console.error('Error joining room:', error));
+}
+
+function leaveGroupRoom(roomId) {
+    return fetch(`/rooms/${roomId}/leave`, { method: 'POST' })
+        .then(response => response.json())
+        .catch(error => console.error('Error leaving room:', error));
+}
+
+// Sent to every tab of this user, including the one that joined
+socket.on('room_joined', (data) => {
+    socket.emit('enter_room', { room_id: data.room.id });
+    document.dispatchEvent(new CustomEvent('group-room-joined', { detail: data.room }));
+});
+
+socket.on('room_left', (data) => {
+    socket.emit('exit_room', { room_id: data.room_id });
+    document.dispatchEvent(new CustomEvent('group-room-left', { detail: data }));
+});
+
+socket.on('room_message', (message) => {
+    document.dispatchEvent(new CustomEvent('group-room-message', { detail: message }));
+});
+
+// Export functions that need to be globally available
+window.joinGroupRoom = joinGroupRoom;
+window.leaveGroupRoom = leaveGroupRoom;
@@ -4,6 +4,8 @@ const socket = io();
 socket.on('connect', () => {
     console.log('Connected to server');
     socket.emit('join', { username: currentUsername });
+    // Fires again after every reconnect; pick up whatever was missed meanwhile
+    syncMissedMessages();
 });
 
 socket.on('new_message', (data) => {
@@ -24,7 +26,8 @@ socket.on('new_message', (data) => {
     
     // If this is a confirmation of our sent message, update the temporary message
     const messagesContainer = document.getElementById(`private-messages-${otherUser}`);
-    const tempMessage = messagesContainer?.querySelector('.temp-message');
+    const tempMessage = (data.client_id && messagesContainer?.querySelector(`.temp-message[data-client-id="${data.client_id}"]`))
+        || messagesContainer?.querySelector('.temp-message');
     if (tempMessage && isOutgoing) {
         tempMessage.classList.remove('temp-message');
         tempMessage.dataset.messageId = data.id;
@@ -41,9 +44,50 @@ socket.on('new_message', (data) => {
     
     // Update cache
     updateMessageCache(otherUser, data);
+    setSyncMark(data.id);
+    updateInboxFromMessage(data);
 });
 
+// Another tab or device read a conversation
+socket.on('conversation_read', applyConversationRead);
+
+// Fetch every message sent or received since the last one this client saw
+function syncMissedMessages() {
+    const since = getSyncMark();
+    const url = since === null ? '/sync' : `/sync?since=${since}`;
+
+    fetch(url)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) return;
+
+            data.messages.forEach(applySyncedMessage);
+            setSyncMark(data.high_water_mark);
+
+            if (data.has_more) {
+                syncMissedMessages();
+            }
+        })
+        .catch(error => console.error('Error syncing messages:', error));
+}
+
+function applySyncedMessage(message) {
+    const otherUser = message.sender === currentUsername ? message.receiver : message.sender;
+    const isOutgoing = message.sender === currentUsername;
+
+    if (document.getElementById(`private-messages-${otherUser}`)) {
+        appendPrivateMessage(otherUser, message, isOutgoing, message.timestamp, false);
+    }
+    // Only extend caches that already exist so a cache never starts mid-history
+    if (getCachedMessages(otherUser)) {
+        updateMessageCache(otherUser, message);
+    }
+    updateInboxFromMessage(message);
+}
+
 // Load chat history
+const HISTORY_PAGE_SIZE = 50;
+
 function loadChatHistory(username) {
     const messagesContainer = document.getElementById(`private-messages-${username}`);
     if (!messagesContainer) return;
@@ -51,38 +95,59 @@ function loadChatHistory(username) {
     // Show loading indicator
     messagesContainer.innerHTML = '<div class="text-center text-gray-500 py-2">Loading messages...</div>';
 
-    // First, try to load cached messages
+    // With a cached view only fetch what arrived after it
     const cachedMessages = getCachedMessages(username);
-    if (cachedMessages) {
+    if (cachedMessages && cachedMessages.length) {
         messagesContainer.innerHTML = '';
         cachedMessages.forEach(msg => {
             const isOutgoing = msg.sender === currentUsername;
             appendPrivateMessage(username, msg, isOutgoing, msg.timestamp, false);
         });
+        setHistoryCursor(username, cachedMessages[0].id);
         forceScrollToBottom(username);
+
+        const lastCachedId = cachedMessages[cachedMessages.length - 1].id;
+        fetch(`/messages/${username}?after_id=${lastCachedId}&limit=${HISTORY_PAGE_SIZE}`)
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success || !Array.isArray(data.messages)) return;
+
+                // Too far behind to catch up page by page; start from the newest page
+                if (data.has_more) {
+                    loadLatestHistory(username);
+                    return;
+                }
+
+                data.messages.forEach(msg => {
+                    const isOutgoing = msg.sender === currentUsername;
+                    appendPrivateMessage(username, msg, isOutgoing, msg.timestamp, false);
+                    updateMessageCache(username, msg);
+                });
+                forceScrollToBottom(username);
+            })
+            .catch(error => console.error('Error loading chat history:', error));
+        return;
     }
 
-    // Then fetch new messages from server
-    fetch(`/messages/${username}`)
+    loadLatestHistory(username);
+}
+
+// Fetch the newest page from the server; older pages load on scroll-up
+function loadLatestHistory(username) {
+    const messagesContainer = document.getElementById(`private-messages-${username}`);
+    if (!messagesContainer) return;
+
+    fetch(`/messages/${username}?limit=${HISTORY_PAGE_SIZE}`)
         .then(response => response.json())
         .then(async data => {
             if (data.success && Array.isArray(data.messages)) {
-                if (!cachedMessages) {
-                    messagesContainer.innerHTML = '';
-                }
-                
-                const sortedMessages = data.messages.sort((a, b) => 
-                    new Date(a.timestamp) - new Date(b.timestamp)
-                );
-                
-                cacheMessages(username, sortedMessages);
+                const pageMessages = data.messages;
+                messagesContainer.innerHTML = '';
 
-                const lastCachedTimestamp = cachedMessages ? getLastMessageTimestamp(username) : null;
-                const newMessages = lastCachedTimestamp 
-                    ? sortedMessages.filter(msg => new Date(msg.timestamp) > new Date(lastCachedTimestamp))
-                    : sortedMessages;
+                cacheMessages(username, pageMessages);
+                setHistoryCursor(username, data.has_more ? data.next_cursor : null);
 
-                newMessages.forEach(msg => {
+                pageMessages.forEach(msg => {
                     const isOutgoing = msg.sender === currentUsername;
                     appendPrivateMessage(username, msg, isOutgoing, msg.timestamp, false);
                 });
@@ -90,28 +155,76 @@ function loadChatHistory(username) {
                 forceScrollToBottom(username);
 
                 // Preload images
-                const imageMessages = newMessages.filter(msg => 
+                const imageMessages = pageMessages.filter(msg => 
                     msg.has_media && msg.media_type?.startsWith('image/')
                 );
 
                 for (let i = 0; i < imageMessages.length; i += 3) {
                     const batch = imageMessages.slice(i, i + 3);
                     await Promise.all(
-                        batch.map(msg => 
-                            preloadImage(msg.media_url)
-                                .catch(() => console.error('Failed to preload image:', msg.media_url))
-                        )
+                        batch.map(msg => {
+                            const previewUrl = msg.thumbnail_url || msg.media_url;
+                            return preloadImage(previewUrl)
+                                .catch(() => console.error('Failed to preload image:', previewUrl));
+                        })
                     );
                 }
             }
         })
         .catch(error => {
             console.error('Error loading chat history:', error);
-            if (!cachedMessages) {
-                messagesContainer.innerHTML = '<div class="text-center text-red-500 py-2">Failed to load messages</div>';
-            }
+            messagesContainer.innerHTML = '<div class="text-center text-red-500 py-2">Failed to load messages</div>';
         });
 }
 
+function setHistoryCursor(username, cursor) {
+    const messagesContainer = document.getElementById(`private-messages-${username}`);
+    if (messagesContainer) {
+        messagesContainer.dataset.nextCursor = cursor || '';
+    }
+}
+
+// Load the page of history preceding the oldest rendered message
+function loadOlderMessages(username) {
+    const messagesContainer = document.getElementById(`private-messages-${username}`);
+    if (!messagesContainer) return;
+
+    const cursor = messagesContainer.dataset.nextCursor;
+    if (!cursor || messagesContainer.dataset.loadingOlder === 'true') return;
+    messagesContainer.dataset.loadingOlder = 'true';
+
+    fetch(`/messages/${username}?before_id=${cursor}&limit=${HISTORY_PAGE_SIZE}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success || !Array.isArray(data.messages)) return;
+
+            // Keep the viewport anchored on the message the user was reading
+            const previousHeight = messagesContainer.scrollHeight;
+            const previousTop = messagesContainer.scrollTop;
+
+            data.messages.forEach(msg => {
+                const isOutgoing = msg.sender === currentUsername;
+                appendPrivateMessage(username, msg, isOutgoing, msg.timestamp, false);
+            });
+
+            messagesContainer.scrollTop = messagesContainer.scrollHeight - previousHeight + previousTop;
+            setHistoryCursor(username, data.has_more ? data.next_cursor : null);
+        })
+        .catch(error => console.error('Error loading older messages:', error))
+        .finally(() => {
+            messagesContainer.dataset.loadingOlder = 'false';
+        });
+}
+
+function handleHistoryScroll(username) {
+    const messagesContainer = document.getElementById(`private-messages-${username}`);
+    if (messagesContainer && messagesContainer.scrollTop < 50) {
+        loadOlderMessages(username);
+    }
+}
+
 // Export functions that need to be globally available
-window.loadChatHistory = loadChatHistory; 
\ No newline at end of file
+window.loadChatHistory = loadChatHistory;
+window.loadOlderMessages = loadOlderMessages;
+window.syncMissedMessages = syncMissedMessages;
+window.handleHistoryScroll = handleHistoryScroll; 
\ No newline at end of file
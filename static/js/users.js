@@ -0,0 +1,83 @@
+// User directory: paging and typeahead search
+const USERS_PAGE_SIZE = 50;
+const USER_SEARCH_DELAY = 200; // ms to wait after the last keystroke
+
+let userSearchTimer = null;
+let userSearchRequest = 0;
+
+function createUserRow(user) {
+    const row = document.createElement('div');
+    row.className = 'flex items-center justify-between p-2 hover:bg-gray-50 rounded';
+
+    const name = document.createElement('span');
+    name.className = 'text-gray-700';
+    name.textContent = user.username;
+
+    const button = document.createElement('button');
+    button.className = 'text-blue-500 hover:text-blue-600';
+    button.innerHTML = '<i class="fas fa-comment"></i>';
+    button.onclick = () => openPrivateChat(user.username);
+
+    row.appendChild(name);
+    row.appendChild(button);
+    return row;
+}
+
+function fetchUsers(prefix, cursor, replace) {
+    const usersList = document.getElementById('users-list');
+    const loadMoreButton = document.getElementById('users-load-more');
+    if (!usersList) return;
+
+    const requestId = ++userSearchRequest;
+    const params = new URLSearchParams({ prefix, limit: USERS_PAGE_SIZE });
+    if (cursor) params.append('cursor', cursor);
+
+    fetch(`/users?${params}`)
+        .then(response => response.json())
+        .then(data => {
+            // Ignore responses overtaken by a newer search
+            if (requestId !== userSearchRequest || !data.success) return;
+
+            if (replace) {
+                usersList.innerHTML = '';
+            }
+            data.users
+                .filter(user => user.username !== currentUsername)
+                .forEach(user => usersList.appendChild(createUserRow(user)));
+
+            usersList.dataset.nextCursor = data.next_cursor || '';
+            loadMoreButton?.classList.toggle('hidden', !data.next_cursor);
+        })
+        .catch(error => console.error('Error loading users:', error));
+}
+
+function loadMoreUsers() {
+    const usersList = document.getElementById('users-list');
+    const search = document.getElementById('users-search');
+    const cursor = usersList?.dataset.nextCursor;
+    if (!cursor) return;
+    fetchUsers(search ? search.value.trim() : '', cursor, false);
+}
+
+function handleUserSearchInput(event) {
+    const prefix = event.target.value.trim();
+    clearTimeout(userSearchTimer);
+    userSearchTimer = setTimeout(() => fetchUsers(prefix, null, true), USER_SEARCH_DELAY);
+}
+
+function toggleUsersList() {
+    const usersList = document.getElementById('users-list');
+    const icon = document.querySelector('#toggle-users i');
+    if (!usersList) return;
+
+    usersList.classList.toggle('hidden');
+    if (icon) {
+        icon.classList.toggle('fa-chevron-down');
+        icon.classList.toggle('fa-chevron-up');
+    }
+}
+
+// Export functions that need to be globally available
+window.loadMoreUsers = loadMoreUsers;
+window.handleUserSearchInput = handleUserSearchInput;
+window.toggleUsersList = toggleUsersList;
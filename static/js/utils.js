@@ -1,6 +1,8 @@
 // Constants
 const MESSAGE_CACHE_PREFIX = 'chat_messages_';
 const MESSAGE_CACHE_DURATION = 24 * 60 * 60 * 1000; // 24 hours in milliseconds
+const MESSAGE_CACHE_LIMIT = 200; // Newest messages kept per conversation
+const SYNC_MARK_PREFIX = 'chat_sync_mark_';
 
 // Time handling functions
 function getCurrentTimestamp() {
@@ -111,8 +113,25 @@ function clearOldCaches() {
 
 function updateMessageCache(username, newMessage) {
     const cachedMessages = getCachedMessages(username) || [];
+    if (newMessage.id && cachedMessages.some(msg => msg.id === newMessage.id)) {
+        return;
+    }
     cachedMessages.push(newMessage);
-    cacheMessages(username, cachedMessages);
+    cacheMessages(username, cachedMessages.slice(-MESSAGE_CACHE_LIMIT));
+}
+
+// Delta sync high-water mark: the newest message id this client has seen
+function getSyncMark() {
+    const mark = localStorage.getItem(`${SYNC_MARK_PREFIX}${currentUsername}`);
+    return mark === null ? null : parseInt(mark, 10);
+}
+
+function setSyncMark(messageId) {
+    if (typeof messageId !== 'number') return;
+    const current = getSyncMark();
+    if (current === null || messageId > current) {
+        localStorage.setItem(`${SYNC_MARK_PREFIX}${currentUsername}`, String(messageId));
+    }
 }
 
 // Export functions that need to be globally available
@@ -122,4 +141,6 @@ window.formatMessageTime = formatMessageTime;
 window.getCachedMessages = getCachedMessages;
 window.updateMessageCache = updateMessageCache;
 window.getLastMessageTimestamp = getLastMessageTimestamp;
-window.cacheMessages = cacheMessages; 
\ No newline at end of file
+window.cacheMessages = cacheMessages;
+window.getSyncMark = getSyncMark;
+window.setSyncMark = setSyncMark; 
\ No newline at end of file
@@ -1,7 +1,8 @@
-from app import app, db, Message
+from commands import create_cli_app
+from models import Message
 
 def check_messages():
-    with app.app_context():
+    with create_cli_app().app_context():
         # Get all messages
         messages = Message.query.all()
         print(f"\nTotal messages in database: {len(messages)}")
@@ -1,8 +1,10 @@
-from app import app, container_client
+from commands import create_cli_app
+from config import blob_container_client
 from azure.core.exceptions import ResourceNotFoundError
 
 def check_storage():
-    with app.app_context():
+    container_client = blob_container_client()
+    with create_cli_app().app_context():
         try:
             # Check container properties
             props = container_client.get_container_properties()
@@ -1,23 +1,37 @@
 import pytest
-from app import app, db
+from app import app, create_app, db, thumbnail_pipeline
 from models import User
 
+create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', 'SQLALCHEMY_ENGINE_OPTIONS': {}})
+
 @pytest.fixture
 def test_client():
     """Create a test client for the application."""
     app.config['TESTING'] = True
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    # Background thumbnail jobs would share the in-memory database connection
+    thumbnail_pipeline.enabled = False
     with app.test_client() as client:
         with app.app_context():
             db.create_all()
             yield client
+            db.session.remove()
             db.drop_all()
 
 @pytest.fixture
-def test_user():
+def test_user(test_client):
     """Create a test user."""
     user = User(username='testuser')
     user.set_password('testpass')
     db.session.add(user)
     db.session.commit()
-    return user 
\ No newline at end of file
+    return user
+
+@pytest.fixture
+def logged_in_client(test_client, test_user):
+    """Create a test client with `test_user` logged in."""
+    with test_client.session_transaction() as sess:
+        sess['user_id'] = test_user.id
+        sess['username'] = test_user.username
+    return test_client
@@ -0,0 +1,42 @@
+from benchmarks.local_blob import LocalContainerClient
+from benchmarks.workloads import compare, percentile, run_suite, seed
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 99) == 0.0
+
+
+def test_compare_reports_slower_and_chattier_scenarios():
+    baseline = {'history': {'p50_ms': 10.0, 'p99_ms': 40.0, 'throughput_rps': 100.0,
+                            'queries_per_request': 1.0, 'errors': 0}}
+    same = {'history': dict(baseline['history'], p50_ms=11.0)}
+    assert compare(baseline, same) == []
+
+    worse = {'history': dict(baseline['history'], p99_ms=80.0, queries_per_request=2.0)}
+    assert compare(baseline, worse) == [
+        'history: p99_ms 40.0 -> 80.0',
+        'history: queries_per_request 1.0 -> 2.0'
+    ]
+
+
+def test_local_container_stores_and_lists_blobs(tmp_path):
+    container = LocalContainerClient(str(tmp_path))
+    blob = container.get_blob_client('a.png')
+    assert not blob.exists()
+    blob.upload_blob(b'data', overwrite=True)
+    assert blob.exists()
+    assert [item.name for item in container.list_blobs()] == ['a.png']
+    assert container.uploads == 1
+
+
+def test_suite_runs_against_the_test_database(test_client):
+    users = seed(users=4, history=30)
+    results = run_suite(users, scenarios=('history', 'send', 'fanout'),
+                        concurrency=1, requests=6, sockets=2)
+
+    assert all(result['requests'] == 6 and result['errors'] == 0 for result in results.values())
+    assert results['history']['queries_per_request'] >= 1
+    assert results['fanout']['deliveries'] >= 6
@@ -0,0 +1,124 @@
+import base64
+import os
+
+import pytest
+
+import blob_replication
+from app import app, db, blob_replicator
+from blob_replication import ReplicationJournal
+from models import MediaObject, Message
+
+CONTENT_HASH = 'd' * 64
+FILENAME = f'{CONTENT_HASH}.png'
+
+
+class FakeBlobClient:
+    def __init__(self, container, name):
+        self.container = container
+        self.name = name
+
+    def exists(self):
+        return self.name in self.container.blobs
+
+    def upload_blob(self, data, **kwargs):
+        if self.container.failures:
+            self.container.failures -= 1
+            raise OSError("connection reset")
+        self.container.blobs[self.name] = (data.read(), kwargs['content_settings'].content_type)
+
+
+class FakeContainerClient:
+    account_name = 'chatstorage'
+    container_name = 'chat-media'
+    url = 'https://chatstorage.blob.core.windows.net/chat-media'
+
+    class credential:
+        account_key = base64.b64encode(b'secret').decode()
+
+    def __init__(self, failures=0):
+        self.blobs = {}
+        self.failures = failures
+
+    def get_blob_client(self, name):
+        return FakeBlobClient(self, name)
+
+
+@pytest.fixture
+def replicator(test_client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(blob_replicator, 'journal', ReplicationJournal(str(tmp_path / 'journal')))
+    monkeypatch.setattr(blob_replicator, 'retries', 1)
+    monkeypatch.setattr(blob_replicator, 'container_client', FakeContainerClient())
+    monkeypatch.setattr(blob_replicator, '_started_pid', None)
+    (tmp_path / FILENAME).write_bytes(b'png bytes')
+    db.session.add(MediaObject(content_hash=CONTENT_HASH, filename=FILENAME,
+                               content_type='image/png', size=9))
+    db.session.commit()
+    return blob_replicator
+
+
+def test_journal_tracks_pending_uploads_across_compaction(tmp_path):
+    journal = ReplicationJournal(str(tmp_path / 'journal'), compact_after=3)
+    journal.queued('a.png', 'image/png')
+    journal.queued('b.png', 'image/png')
+    journal.done('a.png')  # triggers compaction
+
+    reopened = ReplicationJournal(str(tmp_path / 'journal'))
+    assert [record['filename'] for record in reopened.pending()] == ['b.png']
+    with open(tmp_path / 'journal') as f:
+        assert len(f.readlines()) == 1
+
+
+def test_replicated_media_is_served_locally_and_redirects_only_when_missing(replicator, logged_in_client):
+    message = Message(sender_username='a', receiver_username='b', has_media=True,
+                      media_type='image/png', media_url=f'/uploads/{FILENAME}', media_filename=FILENAME)
+    db.session.add(message)
+    db.session.commit()
+    assert logged_in_client.get(f'/uploads/{FILENAME}').status_code == 200
+
+    replicator.journal.queued(FILENAME, 'image/png', CONTENT_HASH)
+    assert replicator._process(FILENAME, 'image/png', CONTENT_HASH)
+
+    assert replicator.container_client.blobs[FILENAME] == (b'png bytes', 'image/png')
+    assert replicator.journal.pending() == []
+    # Payloads keep the stable URL; only the redirect carries the expiring SAS
+    assert Message.query.one().to_dict()['media_url'] == f'/uploads/{FILENAME}'
+    # The local immutable copy still answers, including cheap revalidations
+    response = logged_in_client.get(f'/uploads/{FILENAME}')
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert logged_in_client.get(f'/uploads/{FILENAME}', headers={'If-None-Match': f'"{FILENAME}"'}).status_code == 304
+
+    # An instance without the file redirects to the blob
+    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], FILENAME))
+    response = logged_in_client.get(f'/uploads/{FILENAME}')
+    assert response.status_code == 302
+    assert response.headers['Location'].startswith(f'{FakeContainerClient.url}/{FILENAME}?')
+    assert 'sp=r' in response.headers['Location']
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+def test_forked_worker_gets_its_own_executor_and_resumes_once(replicator, monkeypatch):
+    replicator.journal.queued('gone.png', 'image/png')
+    parent_executor = replicator._get_executor()
+
+    monkeypatch.setattr(blob_replication.os, 'getpid', lambda: -1)
+    assert replicator._get_executor() is not parent_executor
+    futures = replicator.ensure_started()
+    assert [future.result(timeout=5) for future in futures] == [False]
+    assert replicator.ensure_started() == []
+    assert replicator.journal.pending() == []
+
+
+def test_failed_upload_stays_in_journal(replicator):
+    replicator.container_client.failures = 1
+    replicator.journal.queued(FILENAME, 'image/png', CONTENT_HASH)
+
+    assert not replicator._process(FILENAME, 'image/png', CONTENT_HASH)
+    assert [record['filename'] for record in replicator.journal.pending()] == [FILENAME]
+    assert MediaObject.query.get(CONTENT_HASH).blob_status is None
+
+
+def test_missing_local_file_redirects_to_blob(replicator, logged_in_client):
+    response = logged_in_client.get(f'/uploads/{"e" * 64}.png')
+    assert response.status_code == 302
+    assert response.headers['Location'].startswith(f'{FakeContainerClient.url}/{"e" * 64}.png?')
@@ -0,0 +1,34 @@
+import time
+
+from app import db, user_exists_cache
+from cache import TTLCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(maxsize=2, ttl=0.01)
+    cache.set('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_deleted_user_is_evicted_from_session_cache(logged_in_client, test_user):
+    user_exists_cache.clear()
+    assert logged_in_client.get('/users').status_code == 200
+    assert user_exists_cache.get(test_user.id) is True
+
+    db.session.delete(test_user)
+    db.session.commit()
+    assert user_exists_cache.get(test_user.id) is None
+    assert logged_in_client.get('/users').status_code == 302
@@ -0,0 +1,42 @@
+from sqlalchemy import inspect, text
+
+from commands import cli, create_cli_app
+from models import Message, conversation_key, db
+
+def test_list_blobs_without_storage(monkeypatch):
+    monkeypatch.delenv('AZURE_STORAGE_CONNECTION_STRING', raising=False)
+
+    result = create_cli_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'}).test_cli_runner().invoke(cli, ['list-blobs'])
+
+    assert result.exit_code == 0
+    assert 'Blob storage is not configured' in result.output
+
+def test_rebuild_inbox_uses_bare_app():
+    cli_app = create_cli_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'SQLALCHEMY_ENGINE_OPTIONS': {}})
+    with cli_app.app_context():
+        db.create_all()
+        db.session.add(Message(content='hi', sender_username='alice', receiver_username='bob'))
+        db.session.commit()
+
+        result = cli_app.test_cli_runner().invoke(cli, ['rebuild-inbox'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Successfully rebuilt 2 conversation summaries' in result.output
+    assert 'login' not in cli_app.view_functions
+
+def test_backfill_adds_the_key_column_to_a_legacy_database(tmp_path):
+    cli_app = create_cli_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'legacy.db'}",
+                              'SQLALCHEMY_ENGINE_OPTIONS': {}})
+    with cli_app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text("CREATE TABLE messages (id INTEGER PRIMARY KEY, sender_username VARCHAR(80), "
+                                    "receiver_username VARCHAR(80), content TEXT, client_message_id VARCHAR(64))"))
+            connection.execute(text("INSERT INTO messages (sender_username, receiver_username) VALUES ('b', 'a')"))
+
+        result = cli_app.test_cli_runner().invoke(cli, ['backfill-conversation-keys'])
+
+        assert result.exit_code == 0, result.output
+        column, = [c for c in inspect(db.engine).get_columns('messages') if c['name'] == 'conversation_key']
+        assert column['type'].length == Message.__table__.c.conversation_key.type.length
+        with db.engine.connect() as connection:
+            assert connection.execute(text("SELECT conversation_key FROM messages")).scalar() == conversation_key('a', 'b')
@@ -0,0 +1,24 @@
+import sqlite3
+
+from green import ThreadPoolProxy
+
+
+def test_proxy_routes_connection_and_cursor_calls_through_runner():
+    calls = []
+
+    def run(func, *args, **kwargs):
+        calls.append(func.__name__)
+        return func(*args, **kwargs)
+
+    connection = ThreadPoolProxy(sqlite3.connect(':memory:'), run, wrap_types=(sqlite3.Cursor,))
+    cursor = connection.cursor()
+    cursor.execute('SELECT 1')
+    assert cursor.fetchall() == [(1,)]
+    assert calls == ['cursor', 'execute', 'fetchall']
+
+
+def test_proxy_forwards_attribute_assignment():
+    raw = sqlite3.connect(':memory:')
+    connection = ThreadPoolProxy(raw, lambda func, *args, **kwargs: func(*args, **kwargs))
+    connection.isolation_level = None
+    assert raw.isolation_level is None
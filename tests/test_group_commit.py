@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+
+from app import db, group_committer
+from group_commit import GroupCommitter
+from models import Message, User
+
+
+class FakeSession:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+        self.pending = []
+        self.committed = []
+
+    def commit(self):
+        if any(item == 'bad' for item in self.pending):
+            raise ValueError("constraint failed")
+        self.committed.extend(self.pending)
+        self.pending = []
+        self.commits += 1
+
+    def rollback(self):
+        self.pending = []
+        self.rollbacks += 1
+
+
+def run_concurrently(committer, session, items):
+    barrier = threading.Barrier(len(items))
+    results, errors = {}, {}
+
+    def worker(item):
+        def job():
+            session.pending.append(item)
+            return f'saved {item}'
+        barrier.wait()
+        try:
+            results[item] = committer.run(job)
+        except Exception as e:
+            errors[item] = e
+
+    threads = [threading.Thread(target=worker, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_writes_share_one_commit():
+    session = FakeSession()
+    committer = GroupCommitter(session, enabled=True, window=0.05)
+    results, errors = run_concurrently(committer, session, list(range(10)))
+
+    assert not errors
+    assert results == {i: f'saved {i}' for i in range(10)}
+    assert sorted(session.committed) == list(range(10))
+    assert session.commits < 10
+
+
+def test_batches_are_capped_and_all_callers_finish():
+    session = FakeSession()
+    committer = GroupCommitter(session, enabled=True, window=0.05, max_batch=3)
+    results, errors = run_concurrently(committer, session, list(range(10)))
+
+    assert len(results) == 10 and not errors
+    assert session.commits >= 4
+
+
+def test_failed_batch_only_fails_the_bad_write():
+    session = FakeSession()
+    committer = GroupCommitter(session, enabled=True, window=0.05)
+    results, errors = run_concurrently(committer, session, [1, 'bad', 2])
+
+    assert set(results) == {1, 2}
+    assert isinstance(errors['bad'], ValueError)
+    assert sorted(session.committed) == [1, 2]
+
+
+class Interrupted(BaseException):
+    pass
+
+
+def test_interrupted_leader_fails_its_batch_and_hands_off():
+    session = FakeSession()
+    commit = session.commit
+
+    def interrupted_commit():
+        session.commit = commit
+        raise Interrupted()
+
+    session.commit = interrupted_commit
+    committer = GroupCommitter(session, enabled=True, window=0.05)
+    barrier = threading.Barrier(2)
+    outcomes = {}
+
+    def worker(item):
+        barrier.wait()
+        try:
+            outcomes[item] = committer.run(lambda: session.pending.append(item))
+        except BaseException as e:
+            outcomes[item] = e
+
+    threads = [threading.Thread(target=worker, args=(item,)) for item in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert sorted(type(outcome).__name__ for outcome in outcomes.values()) == ['Interrupted', 'RuntimeError']
+    assert committer.run(lambda: 'after') == 'after'
+
+
+def test_send_message_in_group_commit_mode(logged_in_client, monkeypatch):
+    monkeypatch.setattr(group_committer, 'enabled', True)
+    monkeypatch.setattr(group_committer, 'window', 0)
+    db.session.add(User(username='friend', password_hash='unused'))
+    db.session.commit()
+
+    data = logged_in_client.post('/send_message', data={'receiver': 'friend', 'content': 'hi'}).get_json()
+    assert data['success']
+    assert data['message']['id'] == Message.query.one().id
+    assert data['message']['timestamp']
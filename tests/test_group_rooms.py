@@ -0,0 +1,101 @@
+from app import app, db, socketio
+from models import Room, RoomMember, RoomMessage, User
+
+
+def login_as(client, username):
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        user = User(username=username, password_hash='unused')
+        db.session.add(user)
+        db.session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+        sess['username'] = username
+
+
+def create_room(client, name='general', **form):
+    return client.post('/rooms', data={'name': name, **form})
+
+
+def test_create_join_and_leave_room(logged_in_client):
+    room = create_room(logged_in_client).get_json()['room']
+    assert room['member_count'] == 1
+    assert create_room(logged_in_client).status_code == 409
+
+    login_as(logged_in_client, 'friend')
+    data = logged_in_client.post(f"/rooms/{room['id']}/join").get_json()
+    assert data['joined'] and data['room']['member_count'] == 2
+    assert not logged_in_client.post(f"/rooms/{room['id']}/join").get_json()['joined']
+    assert [r['name'] for r in logged_in_client.get('/rooms').get_json()['rooms']] == ['general']
+
+    assert logged_in_client.post(f"/rooms/{room['id']}/leave").get_json()['success']
+    assert Room.query.get(room['id']).member_count == 1
+    assert logged_in_client.get('/rooms').get_json()['rooms'] == []
+
+
+def test_private_room_needs_password(logged_in_client):
+    room = create_room(logged_in_client, 'secret', is_private='true', password='hunter2').get_json()['room']
+    assert logged_in_client.get('/rooms/public').get_json()['rooms'] == []
+
+    login_as(logged_in_client, 'friend')
+    assert logged_in_client.post(f"/rooms/{room['id']}/join", data={'password': 'wrong'}).status_code == 403
+    assert logged_in_client.get(f"/rooms/{room['id']}/messages").status_code == 403
+    assert logged_in_client.post(f"/rooms/{room['id']}/join", data={'password': 'hunter2'}).status_code == 200
+
+
+def test_room_message_is_stored_once_and_emitted_to_the_room(logged_in_client):
+    room_id = create_room(logged_in_client).get_json()['room']['id']
+    for name in ('amy', 'bob'):
+        login_as(logged_in_client, name)
+        logged_in_client.post(f'/rooms/{room_id}/join')
+
+    # bob's socket subscribes to his rooms on connect
+    bob_socket = socketio.test_client(app, flask_test_client=logged_in_client)
+    bob_socket.get_received()
+
+    login_as(logged_in_client, 'testuser')
+    data = logged_in_client.post(f'/rooms/{room_id}/messages', data={'content': 'hi all'}).get_json()
+    assert data['success']
+    assert RoomMessage.query.count() == 1
+
+    received = bob_socket.get_received()
+    assert [(event['name'], event['args'][0]['content']) for event in received] == [('room_message', 'hi all')]
+    bob_socket.disconnect()
+
+
+def test_non_members_cannot_post(logged_in_client):
+    room_id = create_room(logged_in_client).get_json()['room']['id']
+    login_as(logged_in_client, 'stranger')
+    response = logged_in_client.post(f'/rooms/{room_id}/messages', data={'content': 'hello?'})
+    assert response.status_code == 403
+
+
+def test_room_history_pages_backwards(logged_in_client):
+    room_id = create_room(logged_in_client).get_json()['room']['id']
+    for i in range(5):
+        logged_in_client.post(f'/rooms/{room_id}/messages', data={'content': f'm{i}'})
+
+    first = logged_in_client.get(f'/rooms/{room_id}/messages?limit=3').get_json()
+    assert [m['content'] for m in first['messages']] == ['m2', 'm3', 'm4']
+    older = logged_in_client.get(
+        f"/rooms/{room_id}/messages?limit=3&before_id={first['next_cursor']}").get_json()
+    assert [m['content'] for m in older['messages']] == ['m0', 'm1']
+    assert older['has_more'] is False
+
+
+def test_leaving_unsubscribes_open_sockets(logged_in_client):
+    room_id = create_room(logged_in_client).get_json()['room']['id']
+    login_as(logged_in_client, 'bob')
+    bob_socket = socketio.test_client(app, flask_test_client=logged_in_client)
+    bob_socket.get_received()
+
+    logged_in_client.post(f'/rooms/{room_id}/join')
+    assert [event['name'] for event in bob_socket.get_received()] == ['room_joined']
+    logged_in_client.post(f'/rooms/{room_id}/leave')
+    assert [event['name'] for event in bob_socket.get_received()] == ['room_left']
+    assert logged_in_client.post(f'/rooms/{room_id}/messages', data={'content': 'still here?'}).status_code == 403
+
+    login_as(logged_in_client, 'testuser')
+    logged_in_client.post(f'/rooms/{room_id}/messages', data={'content': 'members only'})
+    assert bob_socket.get_received() == []
+    bob_socket.disconnect()
@@ -0,0 +1,76 @@
+from app import db
+from inbox import rebuild_summaries
+from models import ConversationSummary, Message, User
+
+
+def add_user(username):
+    user = User(username=username, password_hash='unused')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def send(client, receiver, content):
+    return client.post('/send_message', data={'receiver': receiver, 'content': content}).get_json()
+
+
+def login_as(client, user):
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+        sess['username'] = user.username
+
+
+def test_send_message_updates_both_summaries(logged_in_client):
+    add_user('friend')
+    send(logged_in_client, 'friend', 'hello')
+    send(logged_in_client, 'friend', 'are you there?')
+
+    mine = logged_in_client.get('/inbox').get_json()
+    assert mine['unread_total'] == 0
+    [conversation] = mine['conversations']
+    assert conversation['partner'] == 'friend'
+    assert conversation['last_preview'] == 'are you there?'
+
+    friend = ConversationSummary.query.filter_by(username='friend').one()
+    assert friend.unread_count == 2
+    assert friend.partner_username == 'testuser'
+    assert friend.last_read_message_id == 0
+
+
+def test_inbox_is_ordered_by_latest_message_and_paged(logged_in_client):
+    for name in ('amy', 'bob', 'cat'):
+        add_user(name)
+        send(logged_in_client, name, f'hi {name}')
+    send(logged_in_client, 'amy', 'again')
+
+    first = logged_in_client.get('/inbox?limit=2').get_json()
+    assert [c['partner'] for c in first['conversations']] == ['amy', 'cat']
+    rest = logged_in_client.get(f"/inbox?limit=2&before={first['next_cursor']}").get_json()
+    assert [c['partner'] for c in rest['conversations']] == ['bob']
+    assert rest['next_cursor'] is None
+
+
+def test_mark_read_clears_unread_up_to_message(logged_in_client, test_user):
+    friend = add_user('friend')
+    ids = [send(logged_in_client, 'friend', f'm{i}')['message']['id'] for i in range(3)]
+
+    login_as(logged_in_client, friend)
+    partial = logged_in_client.post('/inbox/testuser/read', json={'message_id': ids[0]}).get_json()
+    assert partial['conversation']['unread_count'] == 2
+
+    data = logged_in_client.post('/inbox/testuser/read').get_json()
+    assert data['conversation']['unread_count'] == 0
+    assert data['conversation']['last_read_message_id'] == ids[-1]
+    assert logged_in_client.post('/inbox/nobody/read').status_code == 404
+
+
+def test_rebuild_summaries_from_history(test_client):
+    db.session.add(Message(sender_username='a', receiver_username='b', content='one'))
+    db.session.add(Message(sender_username='b', receiver_username='a', has_media=True, media_type='image/png'))
+    db.session.add(Message(sender_username='a', receiver_username='c', content='two'))
+    db.session.commit()
+
+    assert rebuild_summaries(batch_size=2) == 4
+    summary = ConversationSummary.query.filter_by(username='a', partner_username='b').one()
+    assert summary.last_preview == '[image]'
+    assert summary.unread_count == 0
@@ -0,0 +1,77 @@
+import logging
+import os
+
+import pytest
+
+import logging_config
+from logging_config import DeferredQueueHandler, SamplingFilter, configure_logging, parse_levels, stop_listener
+
+
+def record(name, level):
+    return logging.LogRecord(name, level, __file__, 1, 'message %s', ('arg',), None)
+
+
+def test_sampling_only_drops_low_level_records_of_sampled_loggers():
+    never = SamplingFilter(['app.requests', 'socketio'], 0)
+    assert not never.filter(record('app.requests', logging.DEBUG))
+    assert not never.filter(record('socketio.server', logging.INFO))
+    assert never.filter(record('app.requests', logging.WARNING))
+    assert never.filter(record('app', logging.DEBUG))
+
+
+def test_per_logger_levels_are_parsed():
+    assert parse_levels('socketio=warning, app.requests=DEBUG,bogus') == {
+        'socketio': 'WARNING', 'app.requests': 'DEBUG'
+    }
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    levels = {name: logging.getLogger(name).level for name in ('socketio', 'engineio', 'app.requests')}
+    yield
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+    for name, logger_level in levels.items():
+        logging.getLogger(name).setLevel(logger_level)
+
+
+def test_production_mode_writes_through_a_background_queue(restore_logging, capsys):
+    listener = configure_logging({'LOG_MODE': 'production', 'LOG_LEVELS': 'app.requests=ERROR'})
+    try:
+        assert logging.getLogger().level == logging.INFO
+        assert logging.getLogger('socketio').level == logging.WARNING
+        logging.getLogger('app.requests').warning('dropped by its level')
+        logging.getLogger('app').info('queued %s', 'record')
+    finally:
+        stop_listener(listener)
+    err = capsys.readouterr().err
+    assert 'app - INFO - queued record' in err
+    assert 'dropped by its level' not in err
+
+
+def test_forked_worker_gets_its_own_queue_and_listener(restore_logging, capfd):
+    listener = configure_logging({'LOG_MODE': 'production', 'LOG_SAMPLE_RATE': '0.5'})
+    try:
+        pid = os.fork()
+        if pid == 0:
+            ok = False
+            try:
+                child_listener = logging_config._listener
+                handler, = logging.getLogger().handlers
+                ok = (child_listener is not listener and handler.queue is child_listener.queue
+                      and isinstance(handler, DeferredQueueHandler)
+                      and any(isinstance(f, SamplingFilter) for f in handler.filters))
+                logging.getLogger('app').warning('written by the child')
+                stop_listener(child_listener)
+            finally:
+                os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+    finally:
+        stop_listener(listener)
+    assert 'app - WARNING - written by the child' in capfd.readouterr().err
@@ -0,0 +1,132 @@
+from app import db
+from models import Message, User, conversation_key
+
+
+def add_messages(count, sender='testuser', receiver='friend'):
+    if not User.query.filter_by(username=receiver).first():
+        friend = User(username=receiver)
+        friend.set_password('friendpass')
+        db.session.add(friend)
+    for i in range(count):
+        db.session.add(Message(sender_username=sender, receiver_username=receiver, content=f'message {i}'))
+    db.session.commit()
+
+
+def test_latest_page_is_returned_in_ascending_order(logged_in_client):
+    add_messages(5)
+    data = logged_in_client.get('/messages/friend?limit=3').get_json()
+    assert data['success']
+    assert [m['content'] for m in data['messages']] == ['message 2', 'message 3', 'message 4']
+    assert data['has_more'] is True
+    assert data['next_cursor'] == data['messages'][0]['id']
+
+
+def test_before_id_walks_back_to_the_start(logged_in_client):
+    add_messages(5)
+    first = logged_in_client.get('/messages/friend?limit=3').get_json()
+    older = logged_in_client.get(f"/messages/friend?limit=3&before_id={first['next_cursor']}").get_json()
+    assert [m['content'] for m in older['messages']] == ['message 0', 'message 1']
+    assert older['has_more'] is False
+    assert older['next_cursor'] is None
+
+
+def test_after_id_returns_newer_messages(logged_in_client):
+    add_messages(5)
+    first_id = Message.query.order_by(Message.id.asc()).first().id
+    data = logged_in_client.get(f'/messages/friend?limit=2&after_id={first_id}').get_json()
+    assert [m['content'] for m in data['messages']] == ['message 1', 'message 2']
+    assert data['next_cursor'] == data['messages'][-1]['id']
+
+
+def test_other_conversations_are_excluded(logged_in_client):
+    add_messages(2)
+    add_messages(2, sender='stranger', receiver='friend')
+    data = logged_in_client.get('/messages/friend').get_json()
+    assert len(data['messages']) == 2
+
+
+def test_conversation_key_is_order_independent(logged_in_client):
+    add_messages(1)
+    add_messages(1, sender='friend', receiver='testuser')
+    keys = {m.conversation_key for m in Message.query.all()}
+    assert keys == {conversation_key('testuser', 'friend')}
+
+
+def test_backfill_fills_missing_conversation_keys(test_client):
+    from backfill_conversation_keys import backfill_conversation_keys
+    add_messages(3, sender='alice', receiver='bob')
+    Message.query.update({Message.conversation_key: None})
+    db.session.commit()
+
+    assert backfill_conversation_keys(batch_size=2) == 3
+    assert {m.conversation_key for m in Message.query.all()} == {conversation_key('alice', 'bob')}
+
+
+def test_usernames_containing_the_old_separator_do_not_share_conversations(logged_in_client):
+    # With '|' as the separator, ('testuser|x', 'y') and ('testuser', 'x|y') had the same key
+    add_messages(1, sender='testuser|x', receiver='y')
+    assert conversation_key('testuser|x', 'y') != conversation_key('testuser', 'x|y')
+    assert logged_in_client.get('/messages/x|y').get_json()['messages'] == []
+
+    # A username registered before the separator was rejected can still
+    # collide on the key; the sender/receiver pair keeps the DMs apart
+    add_messages(1, sender='testuser\x1fx', receiver='y')
+    assert conversation_key('testuser\x1fx', 'y') == conversation_key('testuser', 'x\x1fy')
+    assert logged_in_client.get('/messages/x%1Fy').get_json()['messages'] == []
+
+
+def test_register_rejects_the_conversation_key_separator(test_client):
+    response = test_client.post('/register', data={'username': 'a\x1fb', 'password': 'pw'})
+    assert response.status_code == 302
+    assert User.query.filter_by(username='a\x1fb').first() is None
+
+
+def test_sync_returns_messages_across_conversations(logged_in_client):
+    add_messages(2, receiver='friend')
+    mark = logged_in_client.get('/sync').get_json()['high_water_mark']
+    add_messages(1, receiver='other')
+    add_messages(1, sender='friend', receiver='testuser')
+    add_messages(1, sender='stranger', receiver='friend')
+
+    data = logged_in_client.get(f'/sync?since={mark}').get_json()
+    assert [(m['sender'], m['receiver']) for m in data['messages']] == [
+        ('testuser', 'other'), ('friend', 'testuser')
+    ]
+    assert data['high_water_mark'] == data['messages'][-1]['id']
+    assert data['has_more'] is False
+
+
+def test_retried_send_returns_original_message(logged_in_client):
+    add_messages(0)
+    form = {'receiver': 'friend', 'content': 'only once', 'client_id': 'abc-123'}
+    first = logged_in_client.post('/send_message', data=form).get_json()
+    retry = logged_in_client.post('/send_message', data=form).get_json()
+
+    assert retry['duplicate'] is True
+    assert retry['message']['id'] == first['message']['id']
+    assert Message.query.filter_by(content='only once').count() == 1
+
+
+def test_duplicate_client_id_is_caught_by_unique_index(logged_in_client, monkeypatch):
+    import app as chat_app
+    add_messages(0)
+    db.session.add(Message(sender_username='testuser', receiver_username='friend',
+                           content='original', client_message_id='race-1'))
+    db.session.commit()
+
+    # Simulate a concurrent retry that passed the pre-check before the original committed
+    lookup = chat_app.find_sent_message
+    calls = []
+
+    def find_after_first_call(*args):
+        calls.append(args)
+        return lookup(*args) if len(calls) > 1 else None
+    monkeypatch.setattr(chat_app, 'find_sent_message', find_after_first_call)
+
+    form = {'receiver': 'friend', 'content': 'race', 'client_id': 'race-1'}
+    data = logged_in_client.post('/send_message', data=form).get_json()
+
+    assert len(calls) == 2
+    assert data['duplicate'] is True
+    assert data['message']['content'] == 'original'
+    assert Message.query.count() == 1
@@ -0,0 +1,78 @@
+import json
+import os
+
+import app as chat_app
+from metrics import Metrics, mark_process_dead, render_prometheus
+
+
+def test_histograms_render_cumulative_buckets():
+    metrics = Metrics()
+    metrics.observe('latency_seconds', 0.002, buckets=(0.001, 0.01), endpoint='/a')
+    metrics.observe('latency_seconds', 0.5, buckets=(0.001, 0.01), endpoint='/a')
+    metrics.inc('requests_total', endpoint='/a')
+
+    text = render_prometheus(metrics.collect())
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{endpoint="/a",le="0.001"} 0' in text
+    assert 'latency_seconds_bucket{endpoint="/a",le="0.01"} 1' in text
+    assert 'latency_seconds_bucket{endpoint="/a",le="+Inf"} 2' in text
+    assert 'latency_seconds_count{endpoint="/a"} 2' in text
+    assert 'requests_total{endpoint="/a"} 1' in text
+
+
+def test_workers_are_added_up_and_dead_workers_keep_only_totals(tmp_path):
+    metrics = Metrics(directory=str(tmp_path))
+    metrics.inc('requests_total', 2)
+    metrics.add_gauge('connected_clients', 3)
+    other_worker = {'counters': [['requests_total', {}, 5]], 'gauges': [['connected_clients', {}, 4]],
+                    'histograms': []}
+    (tmp_path / '999999.json').write_text(json.dumps(other_worker))
+
+    collected = metrics.collect()
+    assert collected['counters'] == [['requests_total', {}, 7]]
+    assert collected['gauges'] == [['connected_clients', {}, 7]]
+
+    mark_process_dead(str(tmp_path), 999999)
+    collected = metrics.collect()
+    assert collected['counters'] == [['requests_total', {}, 7]]
+    assert collected['gauges'] == [['connected_clients', {}, 3]]
+
+
+def test_forked_worker_starts_clean_and_flushes_on_first_record(tmp_path):
+    metrics = Metrics(directory=str(tmp_path), flush_interval=60)
+    metrics.inc('requests_total')
+    assert metrics._flusher_pid == os.getpid()
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            clean = metrics.snapshot()['counters'] == [] and metrics._flusher_pid is None
+            metrics.inc('requests_total')
+            started = metrics._flusher_pid == os.getpid()
+            metrics.flush()
+        finally:
+            os._exit(0 if clean and started else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    child = json.loads((tmp_path / f'{pid}.json').read_text())
+    assert child['counters'] == [['requests_total', {}, 1]]
+
+
+def test_metrics_without_token_are_only_served_to_loopback(logged_in_client, monkeypatch):
+    monkeypatch.setattr(chat_app, 'METRICS_TOKEN', None)
+    assert logged_in_client.get('/metrics').status_code == 200
+    assert logged_in_client.get('/metrics', environ_base={'REMOTE_ADDR': '::1'}).status_code == 200
+    assert logged_in_client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.7'}).status_code == 404
+
+
+def test_metrics_endpoint_reports_route_latency_and_sql(logged_in_client, monkeypatch):
+    logged_in_client.get('/messages/friend')
+
+    monkeypatch.setattr(chat_app, 'METRICS_TOKEN', 'scrape-token')
+    assert logged_in_client.get('/metrics').status_code == 401
+    response = logged_in_client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{endpoint="/messages/<username>",method="GET"}' in text
+    assert 'http_request_sql_statements_bucket{endpoint="/messages/<username>",le="1"}' in text
+    assert 'db_statements_total' in text
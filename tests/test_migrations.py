@@ -0,0 +1,102 @@
+import os
+
+from sqlalchemy import create_engine, inspect, text
+
+from migrations import MIGRATIONS, Migration, mssql_fulltext_index, schema_sql, upgrade
+from models import conversation_key
+from sqlite_tuning import install_sqlite_pragmas
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_upgrade_creates_schema_once_with_tuned_sqlite(tmp_path):
+    install_sqlite_pragmas()
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+
+    assert upgrade(engine) == [migration.version for migration in MIGRATIONS]
+    assert upgrade(engine) == []
+
+    tables = set(inspect(engine).get_table_names())
+    assert {'users', 'messages', 'rooms', 'conversation_summaries', 'schema_migrations'} <= tables
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT username FROM users")).scalars().all() == ['admin']
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == 'wal'
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    engine.dispose()
+
+def test_upgrade_adds_columns_and_indexes_to_existing_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(80) UNIQUE NOT NULL, "
+                                "password_hash VARCHAR(256) NOT NULL, created_at DATETIME)"))
+        connection.execute(text("INSERT INTO users (username, password_hash) VALUES ('alice', 'x')"))
+        connection.execute(text("CREATE TABLE rooms (id INTEGER PRIMARY KEY, name VARCHAR(100) UNIQUE NOT NULL, "
+                                "is_private BOOLEAN NOT NULL DEFAULT 0, password_hash VARCHAR(256), "
+                                "created_by VARCHAR(80), created_at DATETIME)"))
+        connection.execute(text("INSERT INTO rooms (name) VALUES ('general')"))
+        connection.execute(text("CREATE TABLE messages (id INTEGER PRIMARY KEY, sender_username VARCHAR(80) NOT NULL, "
+                                "receiver_username VARCHAR(80) NOT NULL, content TEXT, created_at DATETIME)"))
+        connection.execute(text("INSERT INTO messages (sender_username, receiver_username, content) "
+                                "VALUES ('bob', 'alice', 'hi'), ('alice', 'bob', 'hello'), ('alice', 'carol', 'hey')"))
+
+    upgrade(engine)
+
+    inspector = inspect(engine)
+    assert 'member_count' in {column['name'] for column in inspector.get_columns('rooms')}
+    assert 'ix_messages_conversation_id' in {index['name'] for index in inspector.get_indexes('messages')}
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT member_count FROM rooms")).scalar() == 0
+        # Existing users mean this is not a first deployment
+        assert connection.execute(text("SELECT username FROM users")).scalars().all() == ['alice']
+        # Old messages are keyed and summarized without a manual step
+        assert connection.execute(text("SELECT conversation_key FROM messages ORDER BY id")).scalars().all() == [
+            conversation_key('alice', 'bob'), conversation_key('alice', 'bob'), conversation_key('alice', 'carol')
+        ]
+        assert connection.execute(text(
+            "SELECT username, partner_username, last_preview, unread_count FROM conversation_summaries "
+            "ORDER BY username, partner_username"
+        )).all() == [('alice', 'bob', 'hello', 0), ('alice', 'carol', 'hey', 0), ('bob', 'alice', 'hello', 0),
+                     ('carol', 'alice', 'hey', 0)]
+        # ...and searchable, although the messages table predates the FTS5 table
+        assert connection.execute(text(
+            "SELECT rowid FROM message_search WHERE message_search MATCH 'hello'"
+        )).scalars().all() == [2]
+    engine.dispose()
+
+def test_non_transactional_migrations_run_in_autocommit(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    seen = []
+
+    def migrate(connection):
+        seen.append((connection.get_execution_options().get('isolation_level'), connection.in_transaction()))
+        connection.execute(text("CREATE TABLE ddl_outside_transaction (id INTEGER PRIMARY KEY)"))
+
+    assert upgrade(engine, [Migration(1, 'Autocommit DDL', migrate, False)]) == [1]
+
+    assert seen == [('AUTOCOMMIT', False)]
+    assert 'ddl_outside_transaction' in inspect(engine).get_table_names()
+    # The full-text DDL is one of them
+    assert [migration.transactional for migration in MIGRATIONS if migration.migrate is mssql_fulltext_index] == [False]
+    engine.dispose()
+
+def test_old_conversation_keys_are_rewritten(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    upgrade(engine, MIGRATIONS[:5])
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO messages (sender_username, receiver_username, content, conversation_key) "
+                                "VALUES ('alice', 'bob', 'hi', 'alice|bob')"))
+        connection.execute(text("INSERT INTO conversation_summaries (username, conversation_key, partner_username, "
+                                "last_message_id, unread_count) VALUES ('bob', 'alice|bob', 'alice', 1, 1)"))
+
+    assert upgrade(engine)[0] == 6
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT conversation_key FROM messages")).scalar() == conversation_key('alice', 'bob')
+        assert connection.execute(text("SELECT conversation_key, unread_count FROM conversation_summaries")).one() == (
+            conversation_key('alice', 'bob'), 1
+        )
+    engine.dispose()
+
+def test_schema_sql_matches_models():
+    with open(os.path.join(ROOT, 'schema.sql')) as f:
+        assert f.read() == schema_sql('sqlite')
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+
+import reconcile_media
+from app import db
+from models import MediaObject, Message
+from reconcile_media import MISSING_MEDIA_CONTENT, reconcile_media as run_reconcile
+
+
+class FakeContainerClient:
+    def __init__(self, names):
+        self.names = names
+        self.list_calls = 0
+
+    def list_blobs(self):
+        self.list_calls += 1
+        return [SimpleNamespace(name=name) for name in self.names]
+
+
+def add_media_message(filename, has_media=True, content=''):
+    message = Message(sender_username='a', receiver_username='b', content=content,
+                      has_media=has_media, media_filename=filename,
+                      media_url=f'/uploads/{filename}' if has_media else None)
+    db.session.add(message)
+    return message
+
+
+@pytest.fixture
+def storage(test_client, tmp_path):
+    (tmp_path / 'local.png').write_bytes(b'x')
+    add_media_message('gone.png')
+    add_media_message('blob.png', has_media=False, content=MISSING_MEDIA_CONTENT)
+    add_media_message('local.png')
+    add_media_message('blob.png')
+    db.session.add(MediaObject(content_hash='1' * 64, filename='blob.png'))
+    db.session.add(MediaObject(content_hash='2' * 64, filename='local.png', blob_status='replicated'))
+    db.session.commit()
+    return tmp_path
+
+
+def test_reconcile_fixes_messages_and_blob_status(storage):
+    container = FakeContainerClient(['blob.png'])
+    checkpoint = storage / 'checkpoint'
+
+    messages_fixed, objects_fixed = run_reconcile(container, str(storage), str(checkpoint), batch_size=2)
+
+    assert (messages_fixed, objects_fixed) == (2, 2)
+    assert container.list_calls == 1
+    gone, restored, local, _ = Message.query.order_by(Message.id).all()
+    assert (gone.has_media, gone.media_url, gone.content) == (False, None, MISSING_MEDIA_CONTENT)
+    assert (restored.has_media, restored.media_url, restored.content) == (True, '/uploads/blob.png', '')
+    assert local.has_media
+    assert MediaObject.query.get('1' * 64).blob_status == 'replicated'
+    assert MediaObject.query.get('2' * 64).blob_status is None
+    assert not checkpoint.exists()
+
+
+def test_reconcile_resumes_after_checkpoint(storage):
+    checkpoint = storage / 'checkpoint'
+    first_id = Message.query.order_by(Message.id).first().id
+    reconcile_media.save_checkpoint(str(checkpoint), {'message_id': first_id})
+
+    messages_fixed, _ = run_reconcile(FakeContainerClient(['blob.png']), str(storage), str(checkpoint))
+
+    assert messages_fixed == 1
+    assert Message.query.get(first_id).has_media
+
+
+def test_dry_run_writes_nothing(storage):
+    messages_fixed, _ = run_reconcile(FakeContainerClient([]), str(storage),
+                                      str(storage / 'checkpoint'), dry_run=True)
+    assert messages_fixed == 2
+    assert Message.query.filter_by(has_media=True).count() == 3
@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import event
+
+from app import db, favorite_rooms_cache
+from models import FavoriteRoom, Room
+
+
+@pytest.fixture(autouse=True)
+def clear_favorites_cache():
+    favorite_rooms_cache.clear()
+    yield
+    favorite_rooms_cache.clear()
+
+
+@pytest.fixture
+def rooms(test_client):
+    rooms = [Room(name=f'room {i}', is_private=i % 2 == 1) for i in range(5)]
+    db.session.add_all(rooms)
+    db.session.commit()
+    return rooms
+
+
+@pytest.fixture
+def statements(test_client):
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_toggle_favorite_adds_and_removes(logged_in_client, rooms):
+    room_id = rooms[0].id
+    data = logged_in_client.post('/favorite-room', data={'room_id': room_id}).get_json()
+    assert data['is_favorite'] is True
+    assert FavoriteRoom.query.count() == 1
+
+    data = logged_in_client.post('/favorite-room', data={'room_id': room_id}).get_json()
+    assert data['is_favorite'] is False
+    assert FavoriteRoom.query.count() == 0
+
+    assert logged_in_client.post('/favorite-room', data={'room_id': 999}).status_code == 404
+    assert logged_in_client.post('/favorite-room', data={'room_id': 'abc'}).status_code == 400
+
+
+def test_favorites_load_in_one_query_and_are_cached(logged_in_client, rooms, statements):
+    for room in rooms:
+        logged_in_client.post('/favorite-room', data={'room_id': room.id})
+
+    statements.clear()
+    data = logged_in_client.get('/favorite-rooms').get_json()
+    assert [f['room_name'] for f in data['favorites']] == [room.name for room in rooms]
+    assert data['favorites'][1]['room'] == {'is_private': True}
+    assert len([s for s in statements if 'favorite_rooms' in s]) == 1
+
+    statements.clear()
+    logged_in_client.get('/favorite-rooms')
+    assert not [s for s in statements if 'favorite_rooms' in s]
+
+
+def test_toggle_and_room_changes_invalidate_cache(logged_in_client, rooms):
+    logged_in_client.post('/favorite-room', data={'room_id': rooms[0].id})
+    assert len(logged_in_client.get('/favorite-rooms').get_json()['favorites']) == 1
+
+    logged_in_client.post('/favorite-room', data={'room_id': rooms[1].id})
+    assert len(logged_in_client.get('/favorite-rooms').get_json()['favorites']) == 2
+
+    room = Room.query.get(rooms[0].id)
+    room.name = 'renamed'
+    db.session.commit()
+    names = [f['room_name'] for f in logged_in_client.get('/favorite-rooms').get_json()['favorites']]
+    assert names == ['renamed', 'room 1']
@@ -0,0 +1,95 @@
+import pytest
+
+from app import db, search_index
+from models import User
+from search import SearchIndex, tokenize
+
+
+@pytest.fixture(params=['fts5', 'terms'])
+def backend(request, monkeypatch):
+    monkeypatch.setattr(search_index, 'forced_backend', request.param)
+    return request.param
+
+
+def send(client, receiver, content):
+    return client.post('/send_message', data={'receiver': receiver, 'content': content}).get_json()
+
+
+def test_tokenize_lowercases_and_dedupes():
+    assert tokenize('Hello, hello WORLD — café!') == ['hello', 'world', 'café']
+
+
+def test_search_matches_all_words_newest_first(logged_in_client, backend):
+    db.session.add(User(username='friend', password_hash='unused'))
+    db.session.commit()
+    send(logged_in_client, 'friend', 'Lunch at noon?')
+    send(logged_in_client, 'friend', 'lunch is cancelled')
+    send(logged_in_client, 'friend', 'Dinner at noon')
+
+    data = logged_in_client.get('/search?q=noon').get_json()
+    assert [m['content'] for m in data['messages']] == ['Dinner at noon', 'Lunch at noon?']
+
+    data = logged_in_client.get('/search?q=LUNCH+noon').get_json()
+    assert [m['content'] for m in data['messages']] == ['Lunch at noon?']
+
+    first = logged_in_client.get('/search?q=at&limit=1').get_json()
+    rest = logged_in_client.get(f"/search?q=at&limit=1&before={first['next_cursor']}").get_json()
+    assert [m['content'] for m in rest['messages']] == ['Lunch at noon?']
+    assert rest['next_cursor'] is None
+
+
+def test_search_only_sees_own_conversations(logged_in_client, backend):
+    for name in ('friend', 'other', 'stranger'):
+        db.session.add(User(username=name, password_hash='unused'))
+    db.session.commit()
+    send(logged_in_client, 'friend', 'secret plan')
+    send(logged_in_client, 'other', 'secret recipe')
+    with logged_in_client.session_transaction() as sess:
+        sess['username'] = 'stranger'
+    send(logged_in_client, 'other', 'secret stash')
+    with logged_in_client.session_transaction() as sess:
+        sess['username'] = 'testuser'
+
+    data = logged_in_client.get('/search?q=secret').get_json()
+    assert sorted(m['content'] for m in data['messages']) == ['secret plan', 'secret recipe']
+    data = logged_in_client.get('/search?q=secret&with=friend').get_json()
+    assert [m['content'] for m in data['messages']] == ['secret plan']
+
+
+def test_search_with_a_partner_never_reaches_a_colliding_conversation(logged_in_client, backend):
+    for name in ('testuser|x', 'y', 'testuser\x1fx'):
+        db.session.add(User(username=name, password_hash='unused'))
+    db.session.commit()
+    for sender in ('testuser|x', 'testuser\x1fx'):
+        with logged_in_client.session_transaction() as sess:
+            sess['username'] = sender
+        send(logged_in_client, 'y', 'private note')
+    with logged_in_client.session_transaction() as sess:
+        sess['username'] = 'testuser'
+
+    assert logged_in_client.get('/search?q=private&with=x|y').get_json()['messages'] == []
+    assert logged_in_client.get('/search?q=private&with=x%1Fy').get_json()['messages'] == []
+
+
+def test_fts_syntax_in_query_is_treated_as_words(logged_in_client, backend):
+    db.session.add(User(username='friend', password_hash='unused'))
+    db.session.commit()
+    send(logged_in_client, 'friend', 'NEAR the "end" OR not')
+    data = logged_in_client.get('/search?q="end" OR NEAR(').get_json()
+    assert data['success']
+    assert len(data['messages']) == 1
+
+
+def test_rebuild_indexes_existing_messages(logged_in_client, backend):
+    db.session.add(User(username='friend', password_hash='unused'))
+    db.session.commit()
+    send(logged_in_client, 'friend', 'first words')
+    send(logged_in_client, 'friend', 'second words')
+
+    assert search_index.rebuild(batch_size=1) == 2
+    data = logged_in_client.get('/search?q=words').get_json()
+    assert len(data['messages']) == 2
+
+
+def test_sqlite_detects_fts5(test_client):
+    assert SearchIndex().backend() == 'fts5'
@@ -0,0 +1,60 @@
+import json
+from datetime import datetime
+
+from app import app, db, socketio
+from models import MediaObject, Message
+from serializers import RawJSON, SocketJSON, dumps, json_response, message_row_dict, message_rows
+
+
+def add_media_message(thumbnail_status):
+    content_hash = f'{thumbnail_status}hash'
+    db.session.add(MediaObject(content_hash=content_hash, filename=f'{content_hash}.png',
+                               content_type='image/png', size=1, thumbnail_status=thumbnail_status,
+                               width=640, height=480, thumbnail_width=320, thumbnail_height=240))
+    message = Message(sender_username='testuser', receiver_username='friend', content='',
+                      has_media=True, media_type='image/png', media_url=f'/uploads/{content_hash}.png',
+                      media_filename=f'{content_hash}.png', client_message_id='c-1' if thumbnail_status == 'ready' else None)
+    db.session.add(message)
+    db.session.commit()
+    return message
+
+
+def test_row_serialization_matches_to_dict(test_client):
+    add_media_message('ready')
+    add_media_message('pending')
+    db.session.add(Message(sender_username='friend', receiver_username='testuser', content='plain'))
+    db.session.commit()
+
+    rows = message_rows().order_by(Message.id.asc()).all()
+    messages = Message.query.order_by(Message.id.asc()).all()
+    assert len(rows) == 3
+    for row, message in zip(rows, messages):
+        assert json.loads(dumps(message_row_dict(row))) == message.to_dict()
+
+
+def test_raw_payload_is_spliced_into_socket_packets_and_responses(test_client):
+    payload = RawJSON.encode({'content': 'héllo'})
+    assert json.loads(SocketJSON.dumps(['new_message', payload], separators=(',', ':'))) == [
+        'new_message', {'content': 'héllo'}
+    ]
+    # Other arguments of the same packet still get datetimes encoded
+    sent_at = datetime(2024, 1, 2, 3, 4, 5)
+    assert json.loads(SocketJSON.dumps(['new_message', payload, {'at': sent_at}])) == [
+        'new_message', {'content': 'héllo'}, {'at': '2024-01-02T03:04:05'}
+    ]
+    response = json_response({'success': True}, message=payload)
+    assert response.mimetype == 'application/json'
+    assert json.loads(response.get_data()) == {'success': True, 'message': {'content': 'héllo'}}
+
+
+def test_sent_message_reaches_the_sender_once_with_the_response_payload(logged_in_client):
+    sender_socket = socketio.test_client(app, flask_test_client=logged_in_client)
+    sender_socket.get_received()
+
+    data = logged_in_client.post('/send_message', data={'receiver': 'friend', 'content': 'hi'}).get_json()
+    assert data['success']
+
+    received = sender_socket.get_received()
+    assert [event['name'] for event in received] == ['new_message']
+    assert received[0]['args'][0] == data['message']
+    sender_socket.disconnect()
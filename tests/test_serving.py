@@ -0,0 +1,46 @@
+import pytest
+
+import app as chat_app
+
+CONTENT = bytes(range(256)) * 4
+HASHED_NAME = 'c' * 64 + '.mp4'
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.setitem(chat_app.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    (tmp_path / HASHED_NAME).write_bytes(CONTENT)
+    (tmp_path / '20250417_011320_clip.mp4').write_bytes(CONTENT)
+    return tmp_path
+
+
+def test_content_addressed_upload_is_immutable(logged_in_client, uploads):
+    response = logged_in_client.get(f'/uploads/{HASHED_NAME}')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == f'private, max-age={chat_app.IMMUTABLE_MAX_AGE}, immutable'
+    assert response.headers['ETag'] == f'"{HASHED_NAME}"'
+
+    cached = logged_in_client.get(f'/uploads/{HASHED_NAME}', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+
+def test_legacy_upload_gets_validators_without_immutable(logged_in_client, uploads):
+    response = logged_in_client.get('/uploads/20250417_011320_clip.mp4')
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers['Cache-Control']
+    assert response.headers['ETag']
+
+
+def test_range_request_returns_partial_content(logged_in_client, uploads):
+    response = logged_in_client.get(f'/uploads/{HASHED_NAME}', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == CONTENT[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(CONTENT)}'
+
+
+def test_accel_redirect_offloads_body(logged_in_client, uploads, monkeypatch):
+    monkeypatch.setattr(chat_app, 'MEDIA_OFFLOAD', 'x-accel-redirect')
+    response = logged_in_client.get(f'/uploads/{HASHED_NAME}')
+    assert response.headers['X-Accel-Redirect'] == f'/protected-uploads/{HASHED_NAME}'
+    assert response.data == b''
+    assert response.headers['Content-Type'] == 'video/mp4'
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+
+import pytest
+import socketio
+
+from socket_queue import UnixSocketBroker, UnixSocketManager, move_sockets
+
+
+def run_worker(broker_path, username, commands, received):
+    """A stand-in for one gunicorn worker with a single client in room `username`."""
+    server = socketio.Server(async_mode='threading', client_manager=UnixSocketManager(f'unix://{broker_path}'))
+    server._send_packet = lambda eio_sid, pkt: received.put((username, pkt.data))
+    server.manager_initialized = True
+    server.manager.initialize()
+    sid = server.manager.connect(f'eio-{username}', '/')
+    server.manager.enter_room(sid, '/', username)
+    server.manager.enter_room(sid, '/', 'room:1')
+
+    while True:
+        command = commands.get()
+        if command is None:
+            break
+        if command[0] == 'move':
+            move_sockets(server, *command[1:])
+            continue
+        event, data, room = command
+        server.emit(event, data, room=room)
+    # The manager's listener thread is not a daemon thread
+    os._exit(0)
+
+
+@pytest.fixture
+def broker():
+    with tempfile.TemporaryDirectory() as tmp:
+        broker = UnixSocketBroker(os.path.join(tmp, 'broker.sock')).start()
+        yield broker
+        broker.stop()
+
+
+def start_workers(broker):
+    ctx = multiprocessing.get_context('fork')
+    received = ctx.Queue()
+    commands = {name: ctx.Queue() for name in ('alice', 'bob')}
+    workers = [
+        ctx.Process(target=run_worker, args=(broker.path, name, commands[name], received), daemon=True)
+        for name in commands
+    ]
+    for worker in workers:
+        worker.start()
+    return received, commands, workers
+
+
+def stop_workers(commands, workers):
+    for name in commands:
+        commands[name].put(None)
+    for worker in workers:
+        worker.join(timeout=5)
+        if worker.is_alive():
+            worker.terminate()
+
+
+def wait_for_subscribers(broker, count):
+    deadline = time.monotonic() + 10
+    while broker.subscriber_count < count:
+        assert time.monotonic() < deadline, "workers did not subscribe to the broker"
+        time.sleep(0.01)
+
+
+def test_emit_reaches_client_on_another_worker(broker):
+    received, commands, workers = start_workers(broker)
+    try:
+        wait_for_subscribers(broker, 2)
+
+        # alice's worker emits to bob's room, which only exists on bob's worker
+        commands['alice'].put(('new_message', {'id': 1, 'content': 'hi'}, 'bob'))
+        assert received.get(timeout=10) == ('bob', ['new_message', {'id': 1, 'content': 'hi'}])
+        with pytest.raises(queue.Empty):
+            received.get(timeout=0.2)
+    finally:
+        stop_workers(commands, workers)
+
+
+def test_leaving_a_room_reaches_sockets_on_another_worker(broker):
+    received, commands, workers = start_workers(broker)
+    try:
+        wait_for_subscribers(broker, 2)
+
+        # alice's worker takes bob's sockets out of the shared room
+        commands['alice'].put(('move', 'leave', 'bob', 'room:1'))
+        commands['alice'].put(('room_message', {'id': 2}, 'room:1'))
+        assert received.get(timeout=10) == ('alice', ['room_message', {'id': 2}])
+        with pytest.raises(queue.Empty):
+            received.get(timeout=0.5)
+    finally:
+        stop_workers(commands, workers)
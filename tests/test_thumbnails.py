@@ -0,0 +1,65 @@
+import io
+import os
+
+import pytest
+
+from app import app, db, thumbnail_pipeline
+from models import MediaObject, Message
+from thumbnails import Image, thumbnail_filenames
+
+pytestmark = pytest.mark.skipif(Image is None, reason="Pillow is not installed")
+
+
+def test_thumbnails_are_generated_and_exposed(test_client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    content_hash = 'a' * 64
+    Image.new('RGBA', (1280, 640), (255, 0, 0, 128)).save(tmp_path / f'{content_hash}.png')
+    db.session.add(MediaObject(content_hash=content_hash, filename=f'{content_hash}.png',
+                               content_type='image/png', size=1))
+    db.session.commit()
+
+    thumbnail_pipeline._process(content_hash)
+
+    jpeg_name, webp_name = thumbnail_filenames(content_hash)
+    with Image.open(tmp_path / jpeg_name) as thumb:
+        assert thumb.size == (320, 160)
+    assert os.path.exists(tmp_path / webp_name)
+
+    db.session.add(Message(sender_username='a', receiver_username='b', has_media=True,
+                           media_type='image/png', media_filename=f'{content_hash}.png'))
+    db.session.commit()
+    data = Message.query.one().to_dict()
+    assert data['thumbnail_url'] == f'/uploads/{jpeg_name}'
+    assert data['thumbnail_webp_url'] == f'/uploads/{webp_name}'
+    assert (data['width'], data['height']) == (1280, 640)
+    assert (data['thumbnail_width'], data['thumbnail_height']) == (320, 160)
+
+
+def test_unreadable_image_is_marked_failed(test_client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    content_hash = 'b' * 64
+    (tmp_path / f'{content_hash}.png').write_bytes(b'not an image')
+    db.session.add(MediaObject(content_hash=content_hash, filename=f'{content_hash}.png',
+                               content_type='image/png', size=12))
+    db.session.commit()
+
+    thumbnail_pipeline._process(content_hash)
+    assert MediaObject.query.get(content_hash).thumbnail_status == 'failed'
+
+
+def test_sent_image_carries_its_dimensions_before_the_thumbnail_exists(logged_in_client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    image = io.BytesIO()
+    Image.new('RGB', (800, 600), (0, 128, 255)).save(image, 'PNG')
+    image.seek(0)
+
+    # The test fixture keeps the pipeline off, as if the job had not run yet
+    sent = logged_in_client.post('/send_message', data={
+        'receiver': 'friend', 'media': (image, 'photo.png', 'image/png')
+    }, content_type='multipart/form-data').get_json()
+
+    assert sent['success']
+    assert (sent['message']['width'], sent['message']['height']) == (800, 600)
+    assert 'thumbnail_url' not in sent['message']
+    history = logged_in_client.get('/messages/friend').get_json()['messages']
+    assert (history[0]['width'], history[0]['height']) == (800, 600)
@@ -0,0 +1,126 @@
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as chat_app
+from models import MediaObject, MediaUpload, Message, db
+from upload_sessions import expire_upload_sessions
+
+
+@pytest.fixture(autouse=True)
+def upload_folders(tmp_path, monkeypatch):
+    monkeypatch.setitem(chat_app.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(chat_app, 'PARTIAL_UPLOAD_FOLDER', str(tmp_path / '.partial'))
+    os.makedirs(tmp_path / '.partial')
+    return tmp_path
+
+
+def start_upload(client, data):
+    response = client.post('/upload-sessions', data={
+        'filename': 'clip.mp4', 'content_type': 'video/mp4', 'size': len(data)
+    })
+    return response.get_json()['upload']['upload_id']
+
+
+def test_chunks_are_assembled_and_referenced_by_a_message(logged_in_client, upload_folders):
+    data = os.urandom(1000)
+    upload_id = start_upload(logged_in_client, data)
+
+    for offset in range(0, len(data), 400):
+        response = logged_in_client.put(f'/upload-sessions/{upload_id}?offset={offset}', data=data[offset:offset + 400])
+        assert response.status_code == 200
+
+    upload = logged_in_client.post(f'/upload-sessions/{upload_id}/finalize').get_json()['upload']
+    assert upload['status'] == 'complete'
+    assert (upload_folders / upload['media_filename']).read_bytes() == data
+
+    sent = logged_in_client.post('/send_message', data={'receiver': 'friend', 'upload_id': upload_id}).get_json()
+    assert sent['success']
+    assert sent['message']['media_url'] == upload['media_url']
+    assert Message.query.one().media_type == 'video/mp4'
+
+
+def test_upload_resumes_from_reported_offset(logged_in_client):
+    data = os.urandom(100)
+    upload_id = start_upload(logged_in_client, data)
+    logged_in_client.put(f'/upload-sessions/{upload_id}?offset=0', data=data[:60])
+
+    # A chunk past the received size is refused with the offset to resume from
+    gap = logged_in_client.put(f'/upload-sessions/{upload_id}?offset=80', data=data[80:])
+    assert gap.status_code == 409
+    assert gap.get_json()['upload']['received_size'] == 60
+
+    status = logged_in_client.get(f'/upload-sessions/{upload_id}').get_json()['upload']
+    logged_in_client.put(f"/upload-sessions/{upload_id}?offset={status['received_size']}", data=data[60:])
+    assert logged_in_client.post(f'/upload-sessions/{upload_id}/finalize').status_code == 200
+
+
+def test_incomplete_upload_cannot_be_finalized(logged_in_client):
+    upload_id = start_upload(logged_in_client, b'x' * 10)
+    logged_in_client.put(f'/upload-sessions/{upload_id}?offset=0', data=b'x' * 5)
+    assert logged_in_client.post(f'/upload-sessions/{upload_id}/finalize').status_code == 409
+
+
+def test_chunk_beyond_declared_size_is_rejected(logged_in_client):
+    upload_id = start_upload(logged_in_client, b'x' * 10)
+    response = logged_in_client.put(f'/upload-sessions/{upload_id}?offset=0', data=b'x' * 11)
+    assert response.status_code == 413
+    status = logged_in_client.get(f'/upload-sessions/{upload_id}').get_json()['upload']
+    assert status['received_size'] == 0
+
+
+def test_identical_media_is_stored_once(logged_in_client, upload_folders):
+    data = os.urandom(500)
+    for _ in range(2):
+        response = logged_in_client.post('/send_message', data={
+            'receiver': 'friend', 'media': (io.BytesIO(data), 'shot.png', 'image/png')
+        }, content_type='multipart/form-data')
+        assert response.get_json()['success']
+
+    upload_id = start_upload(logged_in_client, data)
+    logged_in_client.put(f'/upload-sessions/{upload_id}?offset=0', data=data)
+    upload = logged_in_client.post(f'/upload-sessions/{upload_id}/finalize').get_json()['upload']
+    logged_in_client.post('/send_message', data={'receiver': 'friend', 'upload_id': upload_id})
+
+    media_object = MediaObject.query.one()
+    assert media_object.content_hash == hashlib.sha256(data).hexdigest()
+    assert media_object.ref_count == 3
+    assert upload['media_filename'] == media_object.filename == f'{media_object.content_hash}.png'
+    assert sorted(p.name for p in upload_folders.iterdir() if p.is_file()) == [media_object.filename]
+    assert {m.media_filename for m in Message.query.all()} == {media_object.filename}
+
+
+def test_open_uploads_are_capped_per_user(logged_in_client, monkeypatch):
+    monkeypatch.setattr(chat_app, 'MAX_PENDING_UPLOADS', 2)
+    first = start_upload(logged_in_client, b'x' * 10)
+    start_upload(logged_in_client, b'x' * 10)
+
+    response = logged_in_client.post('/upload-sessions', data={'filename': 'clip.mp4', 'size': 10})
+    assert response.status_code == 429
+
+    # Finishing one frees a slot
+    logged_in_client.put(f'/upload-sessions/{first}?offset=0', data=b'x' * 10)
+    logged_in_client.post(f'/upload-sessions/{first}/finalize')
+    assert logged_in_client.post('/upload-sessions', data={'filename': 'clip.mp4', 'size': 10}).status_code == 200
+
+
+def test_abandoned_uploads_and_stray_partial_files_expire(logged_in_client, upload_folders):
+    stale = start_upload(logged_in_client, b'x' * 10)
+    fresh = start_upload(logged_in_client, b'x' * 10)
+    MediaUpload.query.get(stale).created_at = datetime.utcnow() - timedelta(days=2)
+    db.session.commit()
+    stray = upload_folders / '.partial' / 'interrupted-direct-upload'
+    stray.write_bytes(b'x')
+    two_days_ago = (datetime.now() - timedelta(days=2)).timestamp()
+    os.utime(stray, (two_days_ago, two_days_ago))
+
+    assert expire_upload_sessions(str(upload_folders), dry_run=True) == (1, 2)
+    assert MediaUpload.query.get(stale) is not None
+
+    assert expire_upload_sessions(str(upload_folders)) == (1, 2)
+    assert [upload.id for upload in MediaUpload.query.all()] == [fresh]
+    assert sorted(p.name for p in (upload_folders / '.partial').iterdir()) == [fresh]
+    assert logged_in_client.get(f'/upload-sessions/{stale}').status_code == 404
@@ -0,0 +1,44 @@
+from app import db, user_directory
+from models import User
+
+
+def add_users(*usernames):
+    for username in usernames:
+        user = User(username=username, password_hash='unused')
+        db.session.add(user)
+    db.session.commit()
+
+
+def reset_directory():
+    user_directory.replace_all([])
+    user_directory.max_id = 0
+    user_directory.loaded_at = None
+
+
+def test_users_are_paged_by_username(logged_in_client):
+    reset_directory()
+    add_users('carol', 'alice', 'bob')
+    first = logged_in_client.get('/users?limit=2').get_json()
+    assert [u['username'] for u in first['users']] == ['alice', 'bob']
+    assert first['next_cursor'] == 'bob'
+
+    rest = logged_in_client.get(f"/users?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [u['username'] for u in rest['users']] == ['carol', 'testuser']
+    assert rest['next_cursor'] is None
+
+
+def test_prefix_search_is_case_insensitive(logged_in_client):
+    reset_directory()
+    add_users('Anna', 'andrew', 'bob')
+    data = logged_in_client.get('/users?prefix=AN').get_json()
+    assert [u['username'] for u in data['users']] == ['andrew', 'Anna']
+
+
+def test_index_renders_first_page_and_total(logged_in_client):
+    reset_directory()
+    add_users(*[f'user{i:03d}' for i in range(60)])
+    html = logged_in_client.get('/').get_data(as_text=True)
+    assert '61 users' in html
+    # 'testuser' sorts first, so the page ends at user048
+    assert 'user048' in html
+    assert 'user049' not in html
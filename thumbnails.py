@@ -0,0 +1,114 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from models import db, MediaObject
+
+try:
+    from PIL import Image
+except ImportError:  # Thumbnails are skipped without Pillow
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_CONTENT_TYPES = {'image/png', 'image/jpeg', 'image/gif'}
+
+def thumbnail_filenames(content_hash):
+    """Return the (JPEG, WebP) thumbnail filenames stored next to the original."""
+    return f"{content_hash}_thumb.jpg", f"{content_hash}_thumb.webp"
+
+def image_dimensions(path, content_type):
+    """(width, height) of an image, read from its header; None when unknown.
+
+    Cheap enough to run while the upload request is open, so the first
+    payload of a message already lets clients reserve its layout space;
+    only the resize waits for the pipeline.
+    """
+    if Image is None or content_type not in THUMBNAIL_CONTENT_TYPES:
+        return None
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except Exception as e:
+        logger.warning(f"Could not read image dimensions of {path}: {str(e)}")
+        return None
+
+def generate_thumbnails(source_path, folder, content_hash):
+    """Write a JPEG and a WebP thumbnail of the image at `source_path`.
+
+    Returns the original and thumbnail dimensions.
+    """
+    jpeg_name, webp_name = thumbnail_filenames(content_hash)
+    with Image.open(source_path) as image:
+        width, height = image.size
+        # Animated GIFs are previewed by their first frame
+        image.seek(0)
+        thumb = image.convert('RGBA')
+        thumb.thumbnail(THUMBNAIL_SIZE)
+
+        thumb.save(os.path.join(folder, webp_name), 'WEBP', quality=80)
+
+        # JPEG has no alpha channel; flatten transparent images onto white
+        flat = Image.new('RGB', thumb.size, (255, 255, 255))
+        flat.paste(thumb, mask=thumb.split()[3])
+        flat.save(os.path.join(folder, jpeg_name), 'JPEG', quality=80, optimize=True)
+
+    return {
+        'width': width,
+        'height': height,
+        'thumbnail_width': thumb.width,
+        'thumbnail_height': thumb.height
+    }
+
+class ThumbnailPipeline:
+    """Generate thumbnails for newly stored images on a background thread pool."""
+
+    def __init__(self, app, max_workers=2, on_ready=None):
+        self.app = app
+        # Called with the thumbnail filenames once they are written
+        self.on_ready = on_ready
+        self.enabled = Image is not None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='thumbnails')
+        if not self.enabled:
+            logger.warning("Pillow is not installed; image thumbnails are disabled")
+
+    def wants(self, media_object):
+        return (
+            self.enabled
+            and media_object.content_type in THUMBNAIL_CONTENT_TYPES
+            and media_object.thumbnail_status is None
+        )
+
+    def submit(self, media_object):
+        """Queue thumbnail generation for `media_object` if it is an image without one."""
+        if not self.wants(media_object):
+            return None
+        return self._executor.submit(self._process, media_object.content_hash)
+
+    def _process(self, content_hash):
+        with self.app.app_context():
+            try:
+                media_object = MediaObject.query.get(content_hash)
+                if media_object is None or media_object.thumbnail_status is not None:
+                    return
+                folder = self.app.config['UPLOAD_FOLDER']
+                try:
+                    dimensions = generate_thumbnails(
+                        os.path.join(folder, media_object.filename), folder, content_hash
+                    )
+                except Exception as e:
+                    logger.error(f"Error generating thumbnails for {media_object.filename}: {str(e)}")
+                    media_object.thumbnail_status = 'failed'
+                else:
+                    for field, value in dimensions.items():
+                        setattr(media_object, field, value)
+                    media_object.thumbnail_status = 'ready'
+                db.session.commit()
+                if self.on_ready and media_object.thumbnail_status == 'ready':
+                    self.on_ready(thumbnail_filenames(content_hash))
+            except Exception as e:
+                logger.error(f"Error in thumbnail pipeline for {content_hash}: {str(e)}")
+                db.session.rollback()
+            finally:
+                db.session.remove()
@@ -0,0 +1,83 @@
+"""Limits and cleanup for chunked uploads (POST /upload-sessions).
+
+    FLASK_APP=commands flask expire-uploads --dry-run
+
+Each pending upload keeps a file in <UPLOAD_FOLDER>/.partial until it is
+finalized. Uploads that are never finished are expired after
+UPLOAD_SESSION_TTL_HOURS, and a user can only have MAX_PENDING_UPLOADS
+open at once.
+"""
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+
+from models import db, MediaUpload
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_SESSION_TTL = timedelta(hours=float(os.getenv('UPLOAD_SESSION_TTL_HOURS', 24)))
+MAX_PENDING_UPLOADS = int(os.getenv('MAX_PENDING_UPLOADS', 10))
+BATCH_SIZE = 500
+
+def partial_upload_folder(upload_folder):
+    return os.path.join(upload_folder, '.partial')
+
+def open_upload_count(username, max_age=UPLOAD_SESSION_TTL, now=None):
+    """Pending uploads `username` started within `max_age`; older ones count as expired."""
+    cutoff = (now or datetime.utcnow()) - max_age
+    return MediaUpload.query.filter(
+        MediaUpload.owner_username == username,
+        MediaUpload.status == 'pending',
+        MediaUpload.created_at >= cutoff
+    ).count()
+
+def fresh_pending_ids(ids, cutoff, batch_size=BATCH_SIZE):
+    """The ids among `ids` of pending uploads started at or after `cutoff`."""
+    ids = list(ids)
+    fresh = set()
+    for start in range(0, len(ids), batch_size):
+        fresh.update(row.id for row in db.session.query(MediaUpload.id).filter(
+            MediaUpload.id.in_(ids[start:start + batch_size]),
+            MediaUpload.status == 'pending',
+            MediaUpload.created_at >= cutoff
+        ))
+    return fresh
+
+def expire_upload_sessions(upload_folder, max_age=UPLOAD_SESSION_TTL, batch_size=BATCH_SIZE, dry_run=False,
+                           now=None):
+    """Delete pending uploads started more than `max_age` ago, and their partial files.
+
+    Partial files older than `max_age` that no pending upload owns (left by
+    interrupted direct uploads, or by an earlier run that stopped between
+    the commit and the file removal) are removed too. Returns the number of
+    (sessions, files) expired.
+    """
+    cutoff = (now or datetime.utcnow()) - max_age
+    folder = partial_upload_folder(upload_folder)
+
+    stale_ids = [row.id for row in db.session.query(MediaUpload.id).filter(
+        MediaUpload.status == 'pending',
+        MediaUpload.created_at < cutoff
+    )]
+    if not dry_run:
+        for start in range(0, len(stale_ids), batch_size):
+            MediaUpload.query.filter(
+                MediaUpload.id.in_(stale_ids[start:start + batch_size]),
+                MediaUpload.status == 'pending'
+            ).delete(synchronize_session=False)
+            db.session.commit()
+
+    names = set(os.listdir(folder)) if os.path.isdir(folder) else set()
+    cutoff_timestamp = cutoff.replace(tzinfo=timezone.utc).timestamp()
+    old_names = {name for name in names if os.path.getmtime(os.path.join(folder, name)) < cutoff_timestamp}
+    expired_files = (names & set(stale_ids)) | (old_names - fresh_pending_ids(old_names, cutoff, batch_size))
+
+    if not dry_run:
+        for name in expired_files:
+            try:
+                os.remove(os.path.join(folder, name))
+            except FileNotFoundError:
+                pass
+    logger.info(f"{'Would expire' if dry_run else 'Expired'} {len(stale_ids)} upload sessions "
+                f"and {len(expired_files)} partial files")
+    return len(stale_ids), len(expired_files)
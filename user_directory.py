@@ -0,0 +1,69 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+class UserDirectory:
+    """In-memory, case-insensitively sorted index of users for prefix lookups.
+
+    Entries are plain dicts as returned by the /users API. The directory is
+    filled once from the database and then extended with users created since
+    the highest id it has seen (`max_id`), so a refresh only reads new rows.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self.max_id = 0
+        self.loaded_at = None
+        self._keys = []
+        self._users = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(username):
+        return (username.lower(), username)
+
+    def is_stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    def mark_loaded(self):
+        self.loaded_at = time.monotonic()
+
+    def add(self, user):
+        with self._lock:
+            key = self._key(user['username'])
+            if key not in self._users:
+                insort(self._keys, key)
+            self._users[key] = user
+
+    def replace_all(self, users):
+        with self._lock:
+            self._users = {self._key(user['username']): user for user in users}
+            self._keys = sorted(self._users)
+
+    def remove(self, username):
+        with self._lock:
+            key = self._key(username)
+            if self._users.pop(key, None) is not None:
+                del self._keys[bisect_left(self._keys, key)]
+
+    def page(self, prefix='', cursor=None, limit=50):
+        """Return up to `limit` users whose name starts with `prefix`, after `cursor`.
+
+        `cursor` is the last username of the previous page. Returns the users
+        and the cursor for the next page, or None when there are no more.
+        """
+        prefix = prefix.lower()
+        with self._lock:
+            start = bisect_left(self._keys, (prefix, ''))
+            if cursor:
+                start = max(start, bisect_right(self._keys, self._key(cursor)))
+            end = bisect_left(self._keys, (prefix + '\uffff', ''), lo=start)
+            keys = self._keys[start:min(end, start + limit)]
+            users = [self._users[key] for key in keys]
+            has_more = start + limit < end
+        next_cursor = users[-1]['username'] if has_more and users else None
+        return users, next_cursor
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)